@@ -3,9 +3,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Optional
 from backend.db.session import get_db
-from backend.llm.orchestrator import Orchestrator
+from backend.llm.orchestrator import get_orchestrator
+from backend.llm.router import get_router
+from backend.llm.response_cache import get_response_cache
 from backend.memory.memory_controller import MemoryController
-from backend.skills.registry import SkillRegistry
+from backend.skills.cache import get_skill_cache
 
 router = APIRouter()
 
@@ -17,35 +19,44 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     action: Optional[dict] = None
+    actions: List[dict] = []
 
 @router.post("/message", response_model=ChatResponse)
 async def send_message(request: ChatRequest, db: AsyncSession = Depends(get_db)):
-    orchestrator = Orchestrator()
+    orchestrator = get_orchestrator()
     memory_controller = MemoryController(db)
     
-    # 1. Get Context
-    context = await memory_controller.get_context(request.user_id, request.session_id, request.message)
+    # 1. Get memories, history and preferences concurrently
+    context = await memory_controller.assemble_context(request.user_id, request.session_id, request.message)
     
-    # 2. Get History
-    history = await memory_controller.short_term.get_history(request.session_id)
-    
-    # 3. Get Skills
-    skills = SkillRegistry.get_skill_names()
-    
-    # 4. Get Preferences
-    prefs = await memory_controller.profile.get_preferences(request.user_id)
-    
-    # 5. Process
+    # 2. Process
     result = await orchestrator.process(
         user_input=request.message,
-        history=history,
-        preferences=prefs,
-        memory_context=context,
-        available_skills=skills
+        history=context.history,
+        preferences=context.preferences,
+        memory_context=context.memories,
+        available_skills=context.skills
     )
     
-    # 6. Save to History
-    await memory_controller.short_term.add_message(request.session_id, "user", request.message)
-    await memory_controller.short_term.add_message(request.session_id, "assistant", result["message"])
+    # 3. Save to History
+    await memory_controller.save_turn(request.session_id, request.message, result["message"])
     
-    return ChatResponse(response=result["message"], action=result.get("action"))
+    return ChatResponse(response=result["message"], action=result.get("action"), actions=result.get("actions", []))
+
+@router.get("/providers")
+async def provider_stats():
+    """
+    Per-provider circuit state, latency percentiles and error rate.
+    """
+    return get_router().stats()
+
+@router.get("/cache")
+async def response_cache_stats():
+    return get_response_cache().stats()
+
+@router.get("/skills")
+async def skill_cache_stats():
+    """
+    Per-skill result cache hits, coalesced calls and hit rate.
+    """
+    return get_skill_cache().stats()
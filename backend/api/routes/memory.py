@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.db.session import get_db
 from backend.memory.memory_controller import MemoryController
+from backend.memory.long_term import get_long_term_memory
+from backend.memory.short_term import get_short_term_memory
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -15,3 +17,19 @@ async def search_memory(query: MemoryQuery, db: AsyncSession = Depends(get_db)):
     controller = MemoryController(db)
     results = await controller.long_term.search(str(query.user_id), query.query)
     return {"results": results}
+
+@router.get("/stats")
+async def memory_stats():
+    long_term = get_long_term_memory()
+    return {
+        "items": len(long_term.store),
+        "embedding_cache": long_term.embedding_cache.stats(),
+        "short_term": await get_short_term_memory().stats()
+    }
+
+@router.post("/compact")
+async def compact_memory(user_id: int):
+    long_term = get_long_term_memory()
+    if not long_term.writable:
+        raise HTTPException(status_code=409, detail="Compaction runs in the memory writer worker.")
+    return await long_term.compact(str(user_id))
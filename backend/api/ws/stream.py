@@ -2,9 +2,8 @@ import json
 from fastapi import WebSocket, WebSocketDisconnect, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.db.session import get_db
-from backend.llm.orchestrator import Orchestrator
+from backend.llm.orchestrator import get_orchestrator
 from backend.memory.memory_controller import MemoryController
-from backend.skills.registry import SkillRegistry
 from backend.utils.logger import logger
 
 # Note: In a real app, we would need a way to inject the DB session into the WS handler
@@ -30,7 +29,7 @@ async def websocket_endpoint(websocket: WebSocket):
     try:
         async with SessionLocal() as db:
             logger.info("Database session created")
-            orchestrator = Orchestrator()
+            orchestrator = get_orchestrator()
             memory_controller = MemoryController(db)
             
             try:
@@ -52,30 +51,30 @@ async def websocket_endpoint(websocket: WebSocket):
                         user_input = message.get("content")
                         logger.info(f"Processing text input: {user_input}")
                         
-                        # 1. Get Context & History
-                        context = await memory_controller.get_context(user_id, session_id, user_input)
-                        history = await memory_controller.short_term.get_history(session_id)
-                        skills = SkillRegistry.get_skill_names()
-                        prefs = await memory_controller.profile.get_preferences(user_id)
+                        # 1. Get memories, history and preferences concurrently
+                        context = await memory_controller.assemble_context(user_id, session_id, user_input)
                         
-                        # 2. Process
+                        # 2. Process, streaming the message as it is generated
                         logger.info("Orchestrator processing...")
-                        result = await orchestrator.process(
+                        result = None
+                        async for event in orchestrator.process_stream(
                             user_input=user_input,
-                            history=history,
-                            preferences=prefs,
-                            memory_context=context,
-                            available_skills=skills
-                        )
+                            history=context.history,
+                            preferences=context.preferences,
+                            memory_context=context.memories,
+                            available_skills=context.skills
+                        ):
+                            if event["type"] == "done":
+                                result = {"message": event["message"], "actions": event["actions"]}
+                                # Clients act on any frame's "action" and every action
+                                # already went out in its own frame
+                                event = {"type": "done", "message": event["message"], "action": None}
+                            # 3. Send Response: deltas, early actions, then the final message
+                            await websocket.send_text(json.dumps(event))
                         logger.info(f"Orchestrator result: {result}")
                         
-                        # 3. Send Response
-                        await websocket.send_text(json.dumps(result))
-                        logger.info("Response sent to client")
-                        
                         # 4. Save History
-                        await memory_controller.short_term.add_message(session_id, "user", user_input)
-                        await memory_controller.short_term.add_message(session_id, "assistant", result["message"])
+                        await memory_controller.save_turn(session_id, user_input, result["message"])
                         
                     elif message.get("type") == "audio":
                         # STT Placeholder
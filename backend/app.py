@@ -35,6 +35,39 @@ def create_app() -> FastAPI:
         from backend.db.session import init_db_engine
         await init_db_engine()
 
+        import asyncio
+        from backend.memory.long_term import get_long_term_memory
+        from backend.llm.providers.registry import get_providers, warm_up_providers
+        from backend.llm.router import get_router
+        # Create providers and their pooled clients once, before the first request
+        get_providers()
+        asyncio.create_task(get_router().run_probes(settings.ROUTER_PROBE_INTERVAL))
+        if settings.LLM_WARMUP:
+            asyncio.create_task(warm_up_providers())
+            asyncio.create_task(_warm_up_embeddings())
+        asyncio.create_task(get_long_term_memory().load_indexes())
+        if settings.MEMORY_COMPACTION_INTERVAL > 0:
+            asyncio.create_task(get_long_term_memory().run_compaction(settings.MEMORY_COMPACTION_INTERVAL))
+        if settings.MEMORY_SHARED_INDEX:
+            asyncio.create_task(get_long_term_memory().run_sync(settings.MEMORY_SYNC_INTERVAL))
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        from backend.llm.providers.registry import close_providers
+        from backend.utils.http import close_http_client
+        from backend.memory.long_term import close_long_term_memory
+        await close_providers()
+        await close_http_client()
+        await close_long_term_memory()
+
     return app
 
+async def _warm_up_embeddings():
+    from backend.memory.long_term import get_long_term_memory
+    from backend.utils.logger import logger
+    try:
+        await get_long_term_memory().warm_up()
+    except Exception as e:
+        logger.warning(f"Warm-up of embedding model failed: {e}")
+
 app = create_app()
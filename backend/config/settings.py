@@ -9,6 +9,7 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "YOUR_SECRET_KEY_HERE_PLEASE_CHANGE_IN_PROD"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    WORKERS: int = int(os.getenv("WORKERS", "1"))
 
     # CORS
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
@@ -23,10 +24,82 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+    # Short-term memory
+    SHORT_TERM_BACKEND: str = os.getenv("SHORT_TERM_BACKEND", "memory") # memory (per process) or redis (REDIS_URL)
+    SHORT_TERM_MAX_SESSIONS: int = 10000 # least recently used sessions are evicted beyond this
+    SHORT_TERM_MAX_MESSAGES: int = 50 # per session
+    SHORT_TERM_SESSION_TTL: int = 3600 # seconds a session may sit idle
+    SUMMARY_ENABLED: bool = True # fold older turns into a running summary in the background
+    SUMMARY_TRIGGER_MESSAGES: int = 20 # session length that triggers a summary
+    SUMMARY_KEEP_RECENT: int = 8 # messages kept verbatim after folding
+    SUMMARY_DEBOUNCE_SECONDS: float = 5.0 # quiet period before summarizing
+    SUMMARY_MAX_WORDS: int = 200
+
     # Vector DB
     VECTOR_DB_TYPE: str = "milvus" # or pinecone
     VECTOR_DB_URL: str = os.getenv("VECTOR_DB_URL", "http://localhost:19530")
+
+    # Long-term memory
+    MEMORY_STORE_DIR: str = os.getenv("MEMORY_STORE_DIR", "memory_store")
+    MEMORY_VECTOR_DTYPE: str = "float32" # float32, float16 or int8 (per-row scale)
+    MEMORY_EXACT_RERANK: bool = True # re-score top candidates at float32 when quantized
+    MEMORY_RERANK_FACTOR: int = 4
+    HYBRID_SEARCH: bool = True # fuse BM25 with vector results
+    HYBRID_SEARCH_DEPTH: int = 4 # candidates per ranking = limit * depth
+    MEMORY_DEDUP_THRESHOLD: float = 0.85 # estimated Jaccard similarity for near-duplicates
+    MEMORY_COMPACTION_INTERVAL: int = 3600 # seconds; 0 disables the background job
+    MEMORY_SHARED_INDEX: bool = False # required with WORKERS > 1: one writer, read-only mapped store elsewhere
+    MEMORY_SYNC_INTERVAL: float = 1.0 # seconds between workers picking up each other's writes
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = 4096
+    EMBEDDING_CACHE_DISK_ITEMS: int = 200000
+    INGEST_BATCH_SIZE: int = 32
+    INGEST_CONCURRENCY: int = 4
+    INGEST_MAX_RETRIES: int = 2
+
+    # Approximate nearest neighbour search (IVF-flat) for large partitions
+    ANN_ENABLED: bool = False
+    ANN_MIN_ROWS: int = 50000
+    ANN_NLIST: int = 0 # 0 = sqrt(rows)
+    ANN_NPROBE: int = 8
+    ANN_REBUILD_RATIO: float = 0.5
     
+    # Prompt token budget, split by share between instructions, memories and history
+    PROMPT_TOKEN_BUDGET: int = 4096
+    PROMPT_SHARE_INSTRUCTIONS: float = 0.4
+    PROMPT_SHARE_MEMORIES: float = 0.35
+    PROMPT_SHARE_HISTORY: float = 0.25
+    PROMPT_MEMORY_CANDIDATES: int = 8 # retrieved per request before trimming to budget
+
+    # LLM providers
+    LLM_WARMUP: bool = True # connect to providers and load the local model at startup
+    OLLAMA_KEEP_ALIVE: str = "30m" # how long Ollama keeps models loaded after a request
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    ROUTER_WINDOW: int = 50 # recent calls per provider kept for latency/error stats
+    ROUTER_FAILURE_THRESHOLD: int = 3 # consecutive failures that open a provider's circuit
+    ROUTER_COOLDOWN_SECONDS: float = 30.0 # before an open circuit is probed
+    ROUTER_PROBE_INTERVAL: float = 10.0
+    ROUTER_TIMEOUT_SECONDS: float = 30.0 # per provider call before falling through
+    ROUTER_EXPLORE_RATE: float = 0.05 # share of calls sent to a lower-ranked provider
+    SKILL_TIMEOUT_SECONDS: float = 15.0 # per server-side skill within a ReAct turn
+    SKILL_CACHE_ENABLED: bool = True # reuse results of skills that declare a cache_ttl
+    SKILL_CACHE_MAX_ENTRIES: int = 1024
+    LLM_HEDGING: bool = False # also ask the runner-up provider when the best one is slow
+    LLM_TOOL_CALLING: bool = False # send skill schemas as native tools instead of asking for JSON replies
+    HEDGE_QUANTILE: float = 0.9 # the primary's latency quantile used as hedge delay
+    HEDGE_DEFAULT_DELAY: float = 2.0 # seconds, until the primary has latency samples
+    HEDGE_MIN_DELAY: float = 0.25
+    HEDGE_MAX_RATE: float = 0.1 # at most this share of requests is hedged
+
+    # Cache of orchestrator replies for repeated inputs in the same context
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL: int = 600 # seconds
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2048
+    RESPONSE_CACHE_SEMANTIC: bool = False # also match similar inputs by embedding
+    RESPONSE_CACHE_SIMILARITY: float = 0.95 # minimum cosine similarity for a semantic hit
+
     # LLM Keys
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     GEMINI_API_KEY: Optional[str] = os.getenv("GEMINI_API_KEY")
@@ -1,4 +1,4 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from backend.utils.parsers import extract_json_from_text
 from backend.utils.logger import logger
 
@@ -6,27 +6,68 @@ class ActionRouter:
     def parse_action(self, llm_response: str) -> Dict[str, Any]:
         """
         Parses the LLM response to check for structured actions.
-        Returns a dictionary with 'message' and optional 'action'.
+        Returns a dictionary with 'message', 'actions' (every valid action,
+        from either an "action" object or an "actions" list) and 'action'
+        (the first of them, for single-action clients).
         """
         data = extract_json_from_text(llm_response)
-        
-        if data and "action" in data:
-            action_name = data['action']['name']
-            
+
+        if isinstance(data, dict) and (data.get("action") or data.get("actions")):
+            candidates = [data["action"]] if isinstance(data.get("action"), dict) else []
+            if isinstance(data.get("actions"), list):
+                candidates.extend(data["actions"])
+
             # Validate against registry
             from backend.skills.registry import SkillRegistry
-            if not SkillRegistry.get_skill(action_name):
-                logger.warning(f"LLM hallucinated unknown action: {action_name}. Ignoring.")
-                return {
-                    "message": data.get("message", llm_response),
-                    "action": None
-                }
-
-            logger.info(f"Action detected: {action_name}")
-            return data
+            actions: List[Dict[str, Any]] = []
+            for action in candidates:
+                action_name = action.get("name") if isinstance(action, dict) else None
+                if not action_name or not SkillRegistry.get_skill(action_name):
+                    logger.warning(f"LLM hallucinated unknown action: {action_name}. Ignoring.")
+                    continue
+                if action not in actions:
+                    logger.info(f"Action detected: {action_name}")
+                    actions.append(action)
+
+            return self._result(data.get("message", llm_response), actions)
         
+        # A JSON reply without an action still carries its message
+        if isinstance(data, dict) and isinstance(data.get("message"), str):
+            return self._result(data["message"], [])
+
         # If no JSON found or no action, treat entire response as message
+        return self._result(llm_response, [])
+
+    def tool_action(self, call: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Turn a provider's native tool call into an action, or None if it
+        names an unknown skill.
+        """
+        from backend.skills.registry import SkillRegistry
+        action_name = call.get("name")
+        if not action_name or not SkillRegistry.get_skill(action_name):
+            logger.warning(f"LLM called unknown tool: {action_name}. Ignoring.")
+            return None
+        params = dict(call.get("arguments") or {})
+        needs_confirmation = bool(params.pop("needs_confirmation", False))
+        return {"name": action_name, "params": params, "needs_confirmation": needs_confirmation}
+
+    def parse_tool_calls(self, reply: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Same result as `parse_action`, from a reply with native tool calls.
+        """
+        actions: List[Dict[str, Any]] = []
+        for call in reply["tool_calls"]:
+            action = self.tool_action(call)
+            if action is not None and action not in actions:
+                logger.info(f"Action detected: {action['name']}")
+                actions.append(action)
+        return self._result(reply["message"], actions)
+
+    @staticmethod
+    def _result(message: str, actions: List[Dict[str, Any]]) -> Dict[str, Any]:
         return {
-            "message": llm_response,
-            "action": None
+            "message": message,
+            "action": actions[0] if actions else None,
+            "actions": actions
         }
@@ -1,83 +1,288 @@
-from typing import List, Dict, Any
-from backend.llm.providers.openai_provider import OpenAIProvider
-from backend.llm.providers.gemini_provider import GeminiProvider
-from backend.llm.providers.local_llama import LocalLlamaProvider
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple, Union
+from backend.llm.providers.registry import get_providers
+from backend.llm.router import STREAM, get_router
 from backend.llm.prompt_builder import PromptBuilder
 from backend.llm.action_router import ActionRouter
+from backend.llm.token_budget import PromptBudget
+from backend.llm.response_cache import context_fingerprint, get_response_cache
 from backend.config.settings import settings
 from backend.db.models.preferences import Preferences
+from backend.skills.base import BaseSkill
+from backend.utils.parsers import StreamingActionParser
 from backend.utils.logger import logger
 
+# Skills the orchestrator runs itself, feeding the result back to the LLM
+SERVER_SIDE_SKILLS = ["search", "weather", "ingest"]
+MAX_TURNS = 3
+
 class Orchestrator:
     def __init__(self):
-        self.providers = {
-            "openai": OpenAIProvider(),
-            "gemini": GeminiProvider(),
-            "local": LocalLlamaProvider()
-        }
-        self.default_provider = "openai" if settings.OPENAI_API_KEY else "gemini"
+        # Shared, application-scoped providers with pooled connections
+        self.providers = get_providers()
+        self.router = get_router()
         self.prompt_builder = PromptBuilder()
         self.action_router = ActionRouter()
+        self.response_cache = get_response_cache() if settings.RESPONSE_CACHE_ENABLED else None
+        self._tools: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
 
-    async def process(self, user_input: str, history: List[Dict[str, str]], preferences: Preferences, memory_context: str, available_skills: List[str]) -> Dict[str, Any]:
-        # 1. Build System Prompt
-        system_prompt = self.prompt_builder.build(user_input, preferences, memory_context, available_skills)
-        
-        # 2. Select Provider
-        provider_name = "openai" if settings.OPENAI_API_KEY and not settings.OPENAI_API_KEY.startswith("sk-...") else "gemini"
-        if provider_name == "gemini" and (not settings.GEMINI_API_KEY or settings.GEMINI_API_KEY == "..."):
-            provider_name = "local"
-            
+    @staticmethod
+    def _skill(action: Optional[Dict[str, Any]]) -> Optional[BaseSkill]:
+        if not action or not action.get("name"):
+            return None
+        from backend.skills.registry import SkillRegistry
+        return SkillRegistry.get_skill(action["name"])
+
+    def _server_skill(self, action: Optional[Dict[str, Any]]) -> Optional[BaseSkill]:
+        skill = self._skill(action)
+        return skill if skill is not None and skill.name in SERVER_SIDE_SKILLS else None
+
+    def _tool_definitions(self, available_skills: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Skill schemas to send as native tools, or None in JSON mode.
+        """
+        if not settings.LLM_TOOL_CALLING:
+            return None
+        key = tuple(available_skills)
+        tools = self._tools.get(key)
+        if tools is None:
+            from backend.skills.registry import SkillRegistry
+            tools = self._tools[key] = SkillRegistry.get_tools(available_skills)
+        return tools
+
+    def _fingerprint(self, preferences: Preferences, history: List[Dict[str, str]], memory_context: Union[str, List[str]], available_skills: List[str]) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        return context_fingerprint(preferences.user_id, (preferences.persona_name, preferences.persona_style), available_skills, self._memories(memory_context), history)
+
+    @staticmethod
+    def _memories(memory_context: Union[str, List[str]]) -> List[str]:
+        memories = [memory_context] if isinstance(memory_context, str) else list(memory_context)
+        return [memory for memory in memories if memory]
+
+    def _build_prompt(self, provider_name: str, user_input: str, history: List[Dict[str, str]], preferences: Preferences, memory_context: Union[str, List[str]], available_skills: List[str], tools: bool = False) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Fit ranked memories and recent history into the provider's token
+        budget. Returns the system prompt and the history to send.
+        """
+        memories = self._memories(memory_context)
+        model = getattr(self.providers.get(provider_name), "model", None)
+        budget = PromptBudget.for_provider(provider_name, model if isinstance(model, str) else None)
+        instructions = self.prompt_builder.build(user_input, preferences, "", available_skills, tools)
+        plan = budget.allocate(instructions, user_input, memories, history)
+
+        usage = plan["usage"]
+        logger.info(
+            f"Prompt tokens ({provider_name}): {usage['total']}/{usage['budget']} - "
+            f"instructions {usage['instructions']}, input {usage['input']}, "
+            f"memories {usage['memories']} ({usage['memories_kept']}/{usage['memories_total']} kept), "
+            f"history {usage['history']} ({usage['history_kept']}/{usage['history_total']} kept)"
+        )
+        system_prompt = self.prompt_builder.build(user_input, preferences, "\n".join(plan["memories"]), available_skills, tools)
+        return system_prompt, plan["history"]
+
+    async def process(self, user_input: str, history: List[Dict[str, str]], preferences: Preferences, memory_context: Union[str, List[str]], available_skills: List[str]) -> Dict[str, Any]:
+        # 0. Serve near-repeats from the response cache
+        fingerprint = self._fingerprint(preferences, history, memory_context, available_skills)
+        if fingerprint is not None:
+            cached = await self.response_cache.get(fingerprint, user_input)
+            if cached is not None:
+                logger.info("Response cache hit.")
+                return cached
+        # The fingerprint covers the user and the conversation so far, and a
+        # replayed client-side action still runs on the client; only replies
+        # built on server-side skill results (search, weather, ...) go stale
+        cacheable = True
+
+        # 1. Rank providers by health and latency
+        order = self.router.ranked()
+        provider_name = order[0]
         logger.info(f"Selected LLM Provider: {provider_name.upper()}")
-        provider = self.providers.get(provider_name, self.providers["local"])
+
+        # 2. Build System Prompt within the token budget
+        tools = self._tool_definitions(available_skills)
+        system_prompt, history = self._build_prompt(provider_name, user_input, history, preferences, memory_context, available_skills, tools is not None)
         
         # 3. Generate Response (Re-Act Loop)
-        max_turns = 3
         current_turn = 0
+        client_actions: List[Dict[str, Any]] = []
         
-        while current_turn < max_turns:
+        while current_turn < MAX_TURNS:
             current_turn += 1
+            # Re-rank every turn so a provider whose circuit just opened is skipped
+            if current_turn > 1:
+                order = self.router.ranked()
+
+            provider_name, raw_response, ok = await self.router.route(user_input, system_prompt, history, order, hedge=settings.LLM_HEDGING, tools=tools)
             
-            try:
-                raw_response = await provider.generate_response(user_input, system_prompt, history)
-            except Exception as e:
-                logger.error(f"Provider {provider_name} failed: {e}. Falling back to Local.")
-                raw_response = await self.providers["local"].generate_response(user_input, system_prompt, history)
-            
-            # 4. Parse Action
-            result = self.action_router.parse_action(raw_response)
+            # 4. Parse Actions (tool calls arrive structured)
+            result = self.action_router.parse_action(raw_response) if tools is None else self.action_router.parse_tool_calls(raw_response)
+            cacheable = cacheable and ok and not any(self._server_skill(action) for action in result["actions"])
             
-            # Check if it's a server-side action (like search or weather)
-            if result.get("action") and result["action"]["name"] in ["search", "weather", "ingest"]:
-                logger.info(f"Executing server-side action: {result['action']['name']}")
-                
-                # Execute the skill
-                from backend.skills.registry import SkillRegistry
-                skill = SkillRegistry.get_skill(result["action"]["name"])
-                if skill:
-                    skill_result = await skill.execute(result["action"]["params"])
-                    
-                    # Add observation to history/context for the next turn
-                    observation = f"SYSTEM OBSERVATION: {skill_result['message']}"
-                    history.append({"role": "system", "content": observation})
-                    
-                    # Continue the loop to let LLM answer based on observation
-                    continue
+            # Run server-side actions (like search or weather) concurrently
+            observations = []
+            for action in result["actions"]:
+                skill = self._server_skill(action)
+                if skill is not None:
+                    logger.info(f"Executing server-side action: {skill.name}")
+                    observations.append(self._observe(skill, action.get("params", {})))
+            if observations:
+                # Client-side actions from this turn still go back with the final reply
+                client_actions.extend(action for action in result["actions"] if not self._server_skill(action) and action not in client_actions)
+                # Add every observation to history and let the LLM answer in one follow-up turn
+                history.extend({"role": "system", "content": observation} for observation in await asyncio.gather(*observations))
+                continue
             
             # If not a server-side action, or if we're done, return the result
+            result = self._merge_actions(client_actions, result)
+            if cacheable and fingerprint is not None:
+                await self.response_cache.put(fingerprint, user_input, result)
             return result
             
-        return result
+        return self._merge_actions(client_actions, result)
 
-    async def process_stream(self, user_input: str, history: List[Dict[str, str]], preferences: Preferences, memory_context: str, available_skills: List[str]):
-        # Streaming is trickier with JSON actions. 
-        # Strategy: Stream text until we detect JSON start, then buffer? 
-        # Or just stream everything and let frontend handle it?
-        # For now, we'll stream raw chunks.
-        
-        system_prompt = self.prompt_builder.build(user_input, preferences, memory_context, available_skills)
-        provider_name = "openai"
-        provider = self.providers.get(provider_name, self.providers[self.default_provider])
-        
-        async for chunk in provider.generate_stream(user_input, system_prompt, history):
-            yield chunk
+    async def _observe(self, skill: BaseSkill, params: Dict[str, Any]) -> str:
+        """
+        Run a server-side skill within SKILL_TIMEOUT_SECONDS and phrase the
+        outcome as an observation for the next turn.
+        """
+        try:
+            skill_result = await asyncio.wait_for(skill.run(params), settings.SKILL_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Skill {skill.name} timed out after {settings.SKILL_TIMEOUT_SECONDS}s")
+            return f"SYSTEM OBSERVATION ({skill.name}): no result, the skill timed out."
+        except Exception as e:
+            logger.error(f"Skill {skill.name} failed: {e}")
+            return f"SYSTEM OBSERVATION ({skill.name}): the skill failed."
+        # Skills report failures as {"error": ...} as well as with a message
+        message = skill_result.get("message") or skill_result.get("error", "no result")
+        return f"SYSTEM OBSERVATION ({skill.name}): {message}"
+
+    def _tool_events(self, event: Tuple[str, Any], calls: List[Dict[str, Any]]) -> List[Tuple[str, Any]]:
+        """
+        A streamed tool-calling event in the form `StreamingActionParser`
+        emits; calls to unknown skills are dropped.
+        """
+        kind, value = event
+        if kind != "tool_call":
+            return [event]
+        action = self.action_router.tool_action(value)
+        if action is None:
+            return []
+        calls.append(value)
+        return [("action", action)]
+
+    @staticmethod
+    def _merge_actions(earlier: List[Dict[str, Any]], result: Dict[str, Any]) -> Dict[str, Any]:
+        actions = earlier + [action for action in result["actions"] if action not in earlier]
+        return {**result, "action": actions[0] if actions else None, "actions": actions}
+
+    async def process_stream(self, user_input: str, history: List[Dict[str, str]], preferences: Preferences, memory_context: Union[str, List[str]], available_skills: List[str]):
+        """
+        Streaming counterpart of `process`. Yields events:
+
+            {"type": "delta", "content": str}   - more of the spoken message
+            {"type": "action", "action": dict}  - a client-side action, once parsed
+            {"type": "done", "message": str, "action": dict | None, "actions": list}
+
+        The message is streamed as its characters arrive. Each server-side
+        skill starts as soon as its action object is complete, while the rest
+        of the reply is still generating; their observations feed the next
+        turn together.
+        """
+        fingerprint = self._fingerprint(preferences, history, memory_context, available_skills)
+        if fingerprint is not None:
+            cached = await self.response_cache.get(fingerprint, user_input)
+            if cached is not None:
+                logger.info("Response cache hit.")
+                yield {"type": "delta", "content": cached["message"]}
+                for action in cached["actions"]:
+                    yield {"type": "action", "action": action}
+                yield {"type": "done", **cached}
+                return
+        # As in `process`: replies that used server-side skills aren't cached
+        cacheable = True
+
+        order = self.router.ranked(STREAM)
+        logger.info(f"Selected LLM Provider: {order[0].upper()} (streaming)")
+        tools = self._tool_definitions(available_skills)
+        system_prompt, history = self._build_prompt(order[0], user_input, history, preferences, memory_context, available_skills, tools is not None)
+        # Client-side actions already yielded, over all turns
+        client_actions: List[Dict[str, Any]] = []
+
+        for turn in range(MAX_TURNS):
+            if turn > 0:
+                order = self.router.ranked(STREAM)
+            parser = StreamingActionParser()
+            streamed = ""
+            calls: List[Dict[str, Any]] = []
+            started: List[Dict[str, Any]] = []
+            tasks: List[asyncio.Task] = []
+            try:
+                async for chunk in self.router.generate_stream(user_input, system_prompt, history, order, hedge=settings.LLM_HEDGING, tools=tools):
+                    for kind, value in parser.feed(chunk) if tools is None else self._tool_events(chunk, calls):
+                        if kind == "message":
+                            streamed += value
+                            yield {"type": "delta", "content": value}
+                            continue
+                        skill = self._skill(value)
+                        # Unknown actions are dropped by parse_action below
+                        if skill is None or value in started or value in client_actions:
+                            continue
+                        if skill.name in SERVER_SIDE_SKILLS:
+                            logger.info(f"Executing server-side action mid-stream: {skill.name}")
+                            started.append(value)
+                            tasks.append(asyncio.create_task(self._observe(skill, value.get("params", {}))))
+                        else:
+                            client_actions.append(value)
+                            yield {"type": "action", "action": value}
+
+                if tools is None:
+                    raw = parser.text
+                    result = self.action_router.parse_action(raw)
+                else:
+                    raw = streamed
+                    result = self.action_router.parse_tool_calls({"message": streamed, "tool_calls": calls})
+                # Whatever the parser held back (e.g. text after a stray "{") goes out now
+                if result["message"] and result["message"].startswith(streamed) and len(result["message"]) > len(streamed):
+                    yield {"type": "delta", "content": result["message"][len(streamed):]}
+                cacheable = cacheable and raw != self.router.stream_error_message and not started and not any(self._server_skill(action) for action in result["actions"])
+
+                # Actions the incremental parser could not see (e.g. JSON after prose)
+                for action in result["actions"]:
+                    skill = self._server_skill(action)
+                    if skill is not None and action not in started:
+                        logger.info(f"Executing server-side action: {skill.name}")
+                        started.append(action)
+                        tasks.append(asyncio.create_task(self._observe(skill, action.get("params", {}))))
+                    elif skill is None and action not in client_actions:
+                        client_actions.append(action)
+                        yield {"type": "action", "action": action}
+
+                if tasks:
+                    history.extend({"role": "system", "content": observation} for observation in await asyncio.gather(*tasks))
+                    continue
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+
+            result = self._merge_actions(client_actions, result)
+            if cacheable and fingerprint is not None:
+                await self.response_cache.put(fingerprint, user_input, result)
+            yield {"type": "done", **result}
+            return
+
+        yield {"type": "done", **self._merge_actions(client_actions, result)}
+
+
+_orchestrator: Optional[Orchestrator] = None
+
+def get_orchestrator() -> Orchestrator:
+    """
+    Return the process-wide Orchestrator.
+    """
+    global _orchestrator
+    if _orchestrator is None:
+        _orchestrator = Orchestrator()
+    return _orchestrator
@@ -1,6 +1,28 @@
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
 from backend.db.models.preferences import Preferences
 
+# Compiled prompt prefixes kept, one per (persona, skill set) in use
+MAX_CACHED_PREFIXES = 256
+
+# How the model should express actions: as a JSON reply, or as native tool calls
+JSON_ACTION_FORMAT = """2. If the user asks to perform an action that matches an available skill, you MUST output a JSON object with the action details.
+3. The JSON format for actions is:
+{
+  "message": "Spoken response to the user.",
+  "action": {
+    "name": "skill_name",
+    "params": { "param1": "value1" },
+    "needs_confirmation": boolean
+  }
+}
+   For several independent actions in one request (e.g. the weather AND a search), use "actions": [...] with one such object per action instead of "action". Their results come back together.
+4. If no action is needed, just provide the spoken response."""
+
+TOOL_ACTION_FORMAT = """2. If the user asks to perform an action that matches an available skill, call the matching tool, and always also reply with a short spoken response.
+3. For several independent actions in one request (e.g. the weather AND a search), call all of the tools at once. Their results come back together.
+4. If no action is needed, just provide the spoken response."""
+
 class PromptBuilder:
     def __init__(self):
         self.base_system_prompt = """
@@ -8,30 +30,13 @@ You are JARVIS, a highly advanced, witty, and capable AI assistant.
 Your goal is to assist the user with precision, efficiency, and a touch of dry humor.
 
 PERSONALITY:
-{persona}
 - You are concise but thorough.
 - You address the user as "Sir" (unless instructed otherwise).
 - You are proactive and intelligent.
 
-AVAILABLE SKILLS:
-{skills}
-
-MEMORY:
-{memory_context}
-
 INSTRUCTIONS:
 1. Respond naturally and concisely.
-2. If the user asks to perform an action that matches an available skill, you MUST output a JSON object with the action details.
-3. The JSON format for actions is:
-{{
-  "message": "Spoken response to the user.",
-  "action": {{
-    "name": "skill_name",
-    "params": {{ "param1": "value1" }},
-    "needs_confirmation": boolean
-  }}
-}}
-4. If no action is needed, just provide the spoken response.
+{action_format}
 5. Use the provided memory context to personalize your response.
 6. **LEARNING**: If the user corrects you or provides a new fact (e.g., "My name is actually..."), use the `learn` skill immediately to save it.
 7. **SEARCHING**: If the user asks a question about current events, facts you don't know, or specific data (weather, news, etc.), use the `search` skill. DO NOT GUESS.
@@ -40,14 +45,47 @@ INSTRUCTIONS:
 RESTRICTIONS:
 - You may ONLY call the following actions: call, sms, navigate, open_app, calendar, search, media, system, iot, weather, timer, learn, ingest.
 - Do NOT invent new action names. If a user asks for something not covered by these actions, reply normally using text.
+
+AVAILABLE SKILLS:
+{skills}
+
+PERSONA:
+{persona}
 """
+        # Per-request content goes last so everything above stays a byte-identical
+        # prefix that providers can cache (OpenAI/Gemini cached input, Ollama KV reuse)
+        self.memory_section = """
+MEMORY:
+{memory_context}
+"""
+        self._prefixes: "OrderedDict[Tuple[str, str, Tuple[str, ...], bool], str]" = OrderedDict()
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+
+    def prefix(self, preferences: Preferences, available_skills: List[str], tools: bool = False) -> str:
+        """
+        The stable part of the system prompt: instructions, skills and
+        persona. Compiled once per (persona, skill set, action format) and
+        memoized.
+        """
+        key = (preferences.persona_name, preferences.persona_style, tuple(available_skills), tools)
+        prefix = self._prefixes.get(key)
+        if prefix is not None:
+            self._prefixes.move_to_end(key)
+            self.prefix_hits += 1
+            return prefix
 
-    def build(self, user_input: str, preferences: Preferences, memory_context: str, available_skills: List[str]) -> str:
+        self.prefix_misses += 1
         persona_desc = f"Name: {preferences.persona_name}\nStyle: {preferences.persona_style}"
         skills_desc = "\n".join([f"- {skill}" for skill in available_skills])
-        
-        return self.base_system_prompt.format(
+        prefix = self._prefixes[key] = self.base_system_prompt.format(
+            action_format=TOOL_ACTION_FORMAT if tools else JSON_ACTION_FORMAT,
             persona=persona_desc,
-            skills=skills_desc,
-            memory_context=memory_context
+            skills=skills_desc
         )
+        if len(self._prefixes) > MAX_CACHED_PREFIXES:
+            self._prefixes.popitem(last=False)
+        return prefix
+
+    def build(self, user_input: str, preferences: Preferences, memory_context: str, available_skills: List[str], tools: bool = False) -> str:
+        return self.prefix(preferences, available_skills, tools) + self.memory_section.format(memory_context=memory_context)
@@ -2,6 +2,14 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 
 class LLMProvider(ABC):
+    # Returned by generate_response in place of raising
+    error_message: str = "Error generating response."
+    # Yielded by generate_stream in place of raising
+    stream_error_message: str = "Error generating response."
+    # Prompt tokens sent, and how many of them the provider served from its prompt cache
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+
     @abstractmethod
     async def generate_response(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None) -> str:
         """
@@ -15,3 +23,36 @@ class LLMProvider(ABC):
         Stream the response from the LLM.
         """
         pass
+
+    async def generate_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Generate a reply that may call `tools` (skill definitions with
+        JSON-schema parameters) natively. Returns {"message": str,
+        "tool_calls": [{"name": str, "arguments": dict}]}; on failure the
+        message is `error_message`.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support tool calling")
+
+    async def stream_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None):
+        """
+        Streaming counterpart of `generate_tool_calls`. Yields ("message", text)
+        and ("tool_call", call) events; on failure ("message", stream_error_message).
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support tool calling")
+        yield
+
+    def record_usage(self, prompt_tokens: int, cached_tokens: int = 0):
+        self.prompt_tokens += prompt_tokens or 0
+        self.cached_prompt_tokens += cached_tokens or 0
+
+    async def warm_up(self):
+        """
+        Optional: open connections or load the model before the first request.
+        """
+        pass
+
+    async def close(self):
+        """
+        Release clients and pooled connections.
+        """
+        pass
@@ -1,11 +1,30 @@
+import asyncio
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from backend.llm.providers.base import LLMProvider
 from backend.config.settings import settings
 from backend.utils.logger import logger
 
+
+def _gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The subset of a JSON schema Gemini function declarations accept.
+    """
+    converted = {"type": schema.get("type", "string").upper()}
+    for key in ("description", "enum", "required"):
+        if key in schema:
+            converted[key] = schema[key]
+    if schema.get("properties"):
+        converted["properties"] = {name: _gemini_schema(value) for name, value in schema["properties"].items()}
+    if "items" in schema:
+        converted["items"] = _gemini_schema(schema["items"])
+    return converted
+
+
 class GeminiProvider(LLMProvider):
     def __init__(self):
+        self._tool_models: Dict[Tuple[str, ...], genai.GenerativeModel] = {}
         if settings.GEMINI_API_KEY:
             genai.configure(api_key=settings.GEMINI_API_KEY)
             self.model = genai.GenerativeModel('gemini-2.0-flash')
@@ -23,10 +42,11 @@ class GeminiProvider(LLMProvider):
             
         try:
             response = await chat.send_message_async(full_prompt)
+            self._record_usage(response)
             return response.text
         except Exception as e:
             logger.error(f"Gemini generation error: {e}")
-            return "Error generating response."
+            return self.error_message
 
     async def generate_stream(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None):
         chat = self.model.start_chat(history=self._convert_history(history))
@@ -41,7 +61,75 @@ class GeminiProvider(LLMProvider):
                 yield chunk.text
         except Exception as e:
             logger.error(f"Gemini streaming error: {e}")
-            yield "Error generating response."
+            yield self.stream_error_message
+
+    async def generate_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        chat = self._tool_model(tools).start_chat(history=self._convert_history(history))
+
+        full_prompt = prompt
+        if system_prompt:
+            full_prompt = f"System Instruction: {system_prompt}\n\nUser: {prompt}"
+
+        try:
+            response = await chat.send_message_async(full_prompt)
+            self._record_usage(response)
+            message, calls = "", []
+            for kind, value in self._tool_events(response.parts):
+                if kind == "message":
+                    message += value
+                else:
+                    calls.append(value)
+            return {"message": message, "tool_calls": calls}
+        except Exception as e:
+            logger.error(f"Gemini tool calling error: {e}")
+            return {"message": self.error_message, "tool_calls": []}
+
+    async def stream_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None):
+        chat = self._tool_model(tools).start_chat(history=self._convert_history(history))
+
+        full_prompt = prompt
+        if system_prompt:
+            full_prompt = f"System Instruction: {system_prompt}\n\nUser: {prompt}"
+
+        try:
+            response = await chat.send_message_async(full_prompt, stream=True)
+            async for chunk in response:
+                for event in self._tool_events(chunk.parts):
+                    yield event
+        except Exception as e:
+            logger.error(f"Gemini tool streaming error: {e}")
+            yield ("message", self.stream_error_message)
+
+    def _tool_model(self, tools: List[Dict[str, Any]]) -> genai.GenerativeModel:
+        # Tools are fixed per model object, so one is kept per skill set
+        key = tuple(tool["name"] for tool in tools)
+        model = self._tool_models.get(key)
+        if model is None:
+            declarations = [{"name": tool["name"], "description": tool["description"], "parameters": _gemini_schema(tool["parameters"])} for tool in tools]
+            model = self._tool_models[key] = genai.GenerativeModel(self.model.model_name, tools=[glm.Tool(function_declarations=declarations)])
+        return model
+
+    @staticmethod
+    def _tool_events(parts) -> List[Tuple[str, Any]]:
+        events = []
+        for part in parts:
+            if "function_call" in part:
+                call = type(part.function_call).to_dict(part.function_call)
+                events.append(("tool_call", {"name": call["name"], "arguments": call.get("args") or {}}))
+            elif part.text:
+                events.append(("message", part.text))
+        return events
+
+    def _record_usage(self, response):
+        # Reported by newer SDK versions only
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.record_usage(getattr(usage, "prompt_token_count", 0), getattr(usage, "cached_content_token_count", 0))
+
+    async def warm_up(self):
+        # Model metadata lookup: checks the key and reachability without spending tokens
+        if settings.GEMINI_API_KEY:
+            await asyncio.to_thread(genai.get_model, self.model.model_name)
 
     def _convert_history(self, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
         # Convert standard format to Gemini format if needed
@@ -1,13 +1,19 @@
-import httpx
 import json
 from typing import List, Dict, Any, AsyncGenerator
 from backend.llm.providers.base import LLMProvider
+from backend.config.settings import settings
+from backend.llm.token_budget import TokenCounter, MESSAGE_OVERHEAD
+from backend.utils.http import get_http_client
 from backend.utils.logger import logger
 
 class LocalLlamaProvider(LLMProvider):
+    error_message = "I am unable to reach my local brain (Ollama). Please ensure Ollama is running and you have pulled the 'mistral' model."
+    stream_error_message = "Error connecting to local brain."
+
     def __init__(self):
         self.base_url = "http://localhost:11434/api"
         self.model = "mistral" # Default to mistral, user can pull others
+        self.token_counter = TokenCounter("local")
         logger.info(f"Initializing Local LLaMA Provider (Ollama) with model: {self.model}")
 
     async def generate_response(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None) -> str:
@@ -20,63 +26,147 @@ class LocalLlamaProvider(LLMProvider):
         
         url = f"{self.base_url}/chat"
         
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-            
-        if history:
-            for msg in history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
-                
-        messages.append({"role": "user", "content": prompt})
+        messages = self._build_messages(prompt, system_prompt, history)
         
         payload = {
             "model": self.model,
             "messages": messages,
-            "stream": False
+            "stream": False,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, timeout=60.0)
-                response.raise_for_status()
-                result = response.json()
-                return result.get("message", {}).get("content", "")
+            response = await get_http_client().post(url, json=payload, timeout=60.0)
+            response.raise_for_status()
+            result = response.json()
+            self._record_usage(messages, result)
+            return result.get("message", {}).get("content", "")
         except Exception as e:
             logger.error(f"Ollama connection failed: {e}")
-            return "I am unable to reach my local brain (Ollama). Please ensure Ollama is running and you have pulled the 'mistral' model."
+            return self.error_message
 
     async def generate_stream(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None) -> AsyncGenerator[str, None]:
         url = f"{self.base_url}/chat"
         
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-            
-        if history:
-            for msg in history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
-                
-        messages.append({"role": "user", "content": prompt})
+        messages = self._build_messages(prompt, system_prompt, history)
         
         payload = {
             "model": self.model,
             "messages": messages,
-            "stream": True
+            "stream": True,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                async with client.stream("POST", url, json=payload, timeout=60.0) as response:
-                    async for line in response.aiter_lines():
-                        if line:
-                            try:
-                                chunk = json.loads(line)
-                                content = chunk.get("message", {}).get("content", "")
-                                if content:
-                                    yield content
-                            except json.JSONDecodeError:
-                                continue
+            async with get_http_client().stream("POST", url, json=payload, timeout=60.0) as response:
+                async for line in response.aiter_lines():
+                    if line:
+                        try:
+                            chunk = json.loads(line)
+                            if chunk.get("done"):
+                                self._record_usage(messages, chunk)
+                            content = chunk.get("message", {}).get("content", "")
+                            if content:
+                                yield content
+                        except json.JSONDecodeError:
+                            continue
         except Exception as e:
             logger.error(f"Ollama streaming failed: {e}")
-            yield "Error connecting to local brain."
+            yield self.stream_error_message
+
+    async def generate_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        messages = self._build_messages(prompt, system_prompt, history)
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "tools": [{"type": "function", "function": tool} for tool in tools],
+            "stream": False,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE
+        }
+
+        try:
+            response = await get_http_client().post(f"{self.base_url}/chat", json=payload, timeout=60.0)
+            response.raise_for_status()
+            result = response.json()
+            self._record_usage(messages, result)
+            message = result.get("message", {})
+            return {"message": message.get("content", ""), "tool_calls": self._tool_calls(message)}
+        except Exception as e:
+            logger.error(f"Ollama tool calling failed: {e}")
+            return {"message": self.error_message, "tool_calls": []}
+
+    async def stream_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None):
+        messages = self._build_messages(prompt, system_prompt, history)
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "tools": [{"type": "function", "function": tool} for tool in tools],
+            "stream": True,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE
+        }
+
+        try:
+            async with get_http_client().stream("POST", f"{self.base_url}/chat", json=payload, timeout=60.0) as response:
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if chunk.get("done"):
+                        self._record_usage(messages, chunk)
+                    message = chunk.get("message", {})
+                    if message.get("content"):
+                        yield ("message", message["content"])
+                    # Ollama sends each call whole
+                    for call in self._tool_calls(message):
+                        yield ("tool_call", call)
+        except Exception as e:
+            logger.error(f"Ollama tool streaming failed: {e}")
+            yield ("message", self.stream_error_message)
+
+    @staticmethod
+    def _tool_calls(message: Dict[str, Any]) -> List[Dict[str, Any]]:
+        calls = []
+        for call in message.get("tool_calls") or []:
+            function = call.get("function", {})
+            arguments = function.get("arguments") or {}
+            if isinstance(arguments, str):
+                try:
+                    arguments = json.loads(arguments)
+                except json.JSONDecodeError:
+                    logger.warning(f"Dropping tool call {function.get('name')} with malformed arguments: {arguments!r}")
+                    continue
+            calls.append({"name": function.get("name"), "arguments": arguments if isinstance(arguments, dict) else {}})
+        return calls
+
+    def _build_messages(self, prompt: str, system_prompt: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+
+        if history:
+            for msg in history:
+                messages.append({"role": msg["role"], "content": msg["content"]})
+
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def _record_usage(self, messages: List[Dict[str, str]], result: Dict[str, Any]):
+        # Ollama reports only the prompt tokens it had to evaluate; the rest came
+        # from the KV cache kept since the previous request. The total is estimated.
+        evaluated = result.get("prompt_eval_count")
+        if evaluated is None:
+            return
+        total = max(evaluated, sum(self.token_counter.count(message["content"]) + MESSAGE_OVERHEAD for message in messages))
+        self.record_usage(total, total - evaluated)
+
+    async def warm_up(self):
+        # A request without a prompt just loads the model and keeps it resident
+        response = await get_http_client().post(
+            f"{self.base_url}/generate",
+            json={"model": self.model, "keep_alive": settings.OLLAMA_KEEP_ALIVE},
+            timeout=120.0
+        )
+        response.raise_for_status()
@@ -1,10 +1,13 @@
+import json
 import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from backend.llm.providers.base import LLMProvider
 from backend.config.settings import settings
 from backend.utils.logger import logger
 
 class OpenAIProvider(LLMProvider):
+    error_message = "I'm sorry, I encountered an error processing your request."
+
     def __init__(self):
         self.client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = "gpt-4-turbo-preview" # Default model
@@ -17,10 +20,11 @@ class OpenAIProvider(LLMProvider):
                 messages=messages,
                 temperature=0.7
             )
+            self._record_usage(response.usage)
             return response.choices[0].message.content
         except Exception as e:
             logger.error(f"OpenAI generation error: {e}")
-            return "I'm sorry, I encountered an error processing your request."
+            return self.error_message
 
     async def generate_stream(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None):
         messages = self._build_messages(prompt, system_prompt, history)
@@ -28,14 +32,98 @@ class OpenAIProvider(LLMProvider):
             stream = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
-                stream=True
+                stream=True,
+                # The last chunk then carries token usage (and no choices)
+                extra_body={"stream_options": {"include_usage": True}}
             )
             async for chunk in stream:
-                if chunk.choices[0].delta.content:
+                self._record_usage(getattr(chunk, "usage", None))
+                if chunk.choices and chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
         except Exception as e:
             logger.error(f"OpenAI streaming error: {e}")
-            yield "Error generating response."
+            yield self.stream_error_message
+
+    async def generate_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        messages = self._build_messages(prompt, system_prompt, history)
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                tools=[{"type": "function", "function": tool} for tool in tools],
+                temperature=0.7
+            )
+            self._record_usage(response.usage)
+            message = response.choices[0].message
+            calls = [self._tool_call(call.function.name, call.function.arguments) for call in message.tool_calls or []]
+            return {"message": message.content or "", "tool_calls": [call for call in calls if call is not None]}
+        except Exception as e:
+            logger.error(f"OpenAI tool calling error: {e}")
+            return {"message": self.error_message, "tool_calls": []}
+
+    async def stream_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None):
+        messages = self._build_messages(prompt, system_prompt, history)
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                tools=[{"type": "function", "function": tool} for tool in tools],
+                stream=True,
+                extra_body={"stream_options": {"include_usage": True}}
+            )
+            # Calls arrive one after another as name and argument fragments
+            index, name, arguments = None, None, ""
+            async for chunk in stream:
+                self._record_usage(getattr(chunk, "usage", None))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    yield ("message", delta.content)
+                for fragment in delta.tool_calls or []:
+                    if fragment.index != index:
+                        # A call is complete once the next one starts
+                        call = self._tool_call(name, arguments) if index is not None else None
+                        if call is not None:
+                            yield ("tool_call", call)
+                        index, name, arguments = fragment.index, None, ""
+                    if fragment.function and fragment.function.name:
+                        name = fragment.function.name
+                    if fragment.function and fragment.function.arguments:
+                        arguments += fragment.function.arguments
+            call = self._tool_call(name, arguments) if index is not None else None
+            if call is not None:
+                yield ("tool_call", call)
+        except Exception as e:
+            logger.error(f"OpenAI tool streaming error: {e}")
+            yield ("message", self.stream_error_message)
+
+    @staticmethod
+    def _tool_call(name: Optional[str], arguments: str) -> Optional[Dict[str, Any]]:
+        try:
+            parsed = json.loads(arguments or "{}")
+        except json.JSONDecodeError:
+            logger.warning(f"Dropping tool call {name} with malformed arguments: {arguments!r}")
+            return None
+        return {"name": name, "arguments": parsed if isinstance(parsed, dict) else {}}
+
+    def _record_usage(self, usage):
+        # Fields newer than the SDK arrive as plain dicts
+        def field(obj, name):
+            return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+        if usage is None:
+            return
+        details = field(usage, "prompt_tokens_details")
+        self.record_usage(field(usage, "prompt_tokens"), field(details, "cached_tokens") if details else 0)
+
+    async def warm_up(self):
+        # Establishes a pooled TLS connection and checks the key
+        if settings.OPENAI_API_KEY:
+            await self.client.models.retrieve(self.model)
+
+    async def close(self):
+        await self.client.close()
 
     def _build_messages(self, prompt: str, system_prompt: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
         messages = []
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Dict, Optional
+from backend.llm.providers.base import LLMProvider
+from backend.llm.providers.openai_provider import OpenAIProvider
+from backend.llm.providers.gemini_provider import GeminiProvider
+from backend.llm.providers.local_llama import LocalLlamaProvider
+from backend.utils.logger import logger
+
+_providers: Optional[Dict[str, LLMProvider]] = None
+
+def get_providers() -> Dict[str, LLMProvider]:
+    """
+    Return the application-scoped providers, creating them (and their
+    pooled clients) on first use.
+    """
+    global _providers
+    if _providers is None:
+        _providers = {
+            "openai": OpenAIProvider(),
+            "gemini": GeminiProvider(),
+            "local": LocalLlamaProvider()
+        }
+    return _providers
+
+async def warm_up_providers():
+    """
+    Open connections / load models ahead of the first request. Failures are
+    logged and otherwise ignored.
+    """
+    providers = get_providers()
+    results = await asyncio.gather(*[provider.warm_up() for provider in providers.values()], return_exceptions=True)
+    for name, result in zip(providers, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Warm-up of provider {name} failed: {result}")
+
+async def close_providers():
+    global _providers
+    if _providers is None:
+        return
+    for provider in _providers.values():
+        try:
+            await provider.close()
+        except Exception as e:
+            logger.warning(f"Closing provider failed: {e}")
+    _providers = None
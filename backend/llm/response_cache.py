@@ -0,0 +1,179 @@
+import copy
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+from backend.memory.compaction import content_hash
+from backend.config.settings import settings
+from backend.utils.logger import logger
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize(text: str) -> str:
+    """
+    Case, punctuation and whitespace insensitive form of a user input.
+    """
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+def context_fingerprint(user_id: Any, persona: Tuple[str, str], skills: List[str], memories: List[str], history: List[Dict[str, str]]) -> str:
+    """
+    Everything besides the input that shapes a reply: whose conversation it
+    is, persona, the skill set, which memories were retrieved (by content
+    hash) and the recent history (by digest).
+    """
+    turns = [[message.get("role"), content_hash(message.get("content") or "")] for message in history]
+    payload = json.dumps([str(user_id), list(persona), sorted(skills), [content_hash(memory) for memory in memories], turns])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("result", "expires", "embedding")
+
+    def __init__(self, result: Dict[str, Any], expires: float, embedding: Optional[np.ndarray]):
+        self.result = result
+        self.expires = expires
+        self.embedding = embedding
+
+
+class ResponseCache:
+    """
+    Orchestrator replies keyed by (context fingerprint, normalized input).
+    Lookups match exactly first; with an `embed` function, an input whose
+    embedding is within `similarity` (cosine) of a cached input under the
+    same fingerprint also hits. Entries expire after `ttl` seconds and the
+    least recently used are evicted beyond `max_entries`.
+
+    Fingerprints are per user and per conversation state, so a reply is
+    only served back into the context it was produced in.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 600, similarity: float = 0.95, embed: Optional[Callable[[str], Awaitable[List[float]]]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embed = embed
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._by_fingerprint: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: Tuple[str, str]):
+        del self._entries[key]
+        fingerprint, text = key
+        texts = self._by_fingerprint[fingerprint]
+        texts.discard(text)
+        if not texts:
+            del self._by_fingerprint[fingerprint]
+
+    async def _embedding(self, user_input: str) -> Optional[np.ndarray]:
+        if self.embed is None:
+            return None
+        try:
+            embedding = np.asarray(await self.embed(user_input), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Response cache embedding failed: {e}")
+            return None
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if embedding.size and norm > 0 else None
+
+    async def get(self, fingerprint: str, user_input: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        key = (fingerprint, normalize(user_input))
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= now:
+            self._drop(key)
+            entry = None
+
+        if entry is None and self.embed is not None and fingerprint in self._by_fingerprint:
+            key, entry = await self._nearest(fingerprint, user_input, now)
+
+        if entry is None:
+            self.misses += 1
+            return None
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry.result)
+
+    async def _nearest(self, fingerprint: str, user_input: str, now: float) -> Tuple[Optional[Tuple[str, str]], Optional[_Entry]]:
+        embedding = await self._embedding(user_input)
+        if embedding is None:
+            return None, None
+        candidates = []
+        for text in list(self._by_fingerprint.get(fingerprint, ())):
+            key = (fingerprint, text)
+            entry = self._entries[key]
+            if entry.expires <= now:
+                self._drop(key)
+            elif entry.embedding is not None and entry.embedding.shape == embedding.shape:
+                candidates.append((key, entry))
+        if not candidates:
+            return None, None
+
+        scores = np.stack([entry.embedding for _, entry in candidates]) @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None, None
+        self.semantic_hits += 1
+        return candidates[best]
+
+    async def put(self, fingerprint: str, user_input: str, result: Dict[str, Any]):
+        key = (fingerprint, normalize(user_input))
+        embedding = await self._embedding(user_input)
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = _Entry(copy.deepcopy(result), time.monotonic() + self.ttl, embedding)
+        self._by_fingerprint.setdefault(fingerprint, set()).add(key[1])
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._by_fingerprint.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    """
+    Return the process-wide response cache.
+    """
+    global _response_cache
+    if _response_cache is None:
+        embed = None
+        if settings.RESPONSE_CACHE_SEMANTIC:
+            from backend.memory.long_term import get_long_term_memory
+            # The memory search already embedded the same input, so this is an embedding-cache hit
+            embed = get_long_term_memory().get_embedding
+        _response_cache = ResponseCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=settings.RESPONSE_CACHE_TTL,
+            similarity=settings.RESPONSE_CACHE_SIMILARITY,
+            embed=embed
+        )
+    return _response_cache
@@ -0,0 +1,444 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from backend.llm.providers.base import LLMProvider
+from backend.config.settings import settings
+from backend.utils.logger import logger
+
+# Static preference, used to break ties and to order providers without samples
+PRIORITY = ["openai", "gemini", "local"]
+# An error rate of 1.0 makes a provider look this many times slower
+ERROR_PENALTY = 4.0
+# Unused hedge budget saved up for bursts, in hedges
+HEDGE_BURST = 5.0
+
+CLOSED = "closed"
+OPEN = "open"
+
+# Call modes with separate latency windows: a completion is timed to the
+# whole reply, a stream only to its first chunk
+COMPLETION = "completion"
+STREAM = "stream"
+MODES = (COMPLETION, STREAM)
+
+
+def provider_configured(name: str) -> bool:
+    """
+    Whether a provider has credentials; the local model needs none.
+    """
+    if name == "openai":
+        return bool(settings.OPENAI_API_KEY) and not settings.OPENAI_API_KEY.startswith("sk-...")
+    if name == "gemini":
+        return bool(settings.GEMINI_API_KEY) and settings.GEMINI_API_KEY != "..."
+    return True
+
+
+class ProviderHealth:
+    """
+    Rolling latency/error windows (one per call mode) and circuit breaker
+    state for one provider. Failures of either mode count towards the
+    breaker.
+    """
+
+    def __init__(self, window: int):
+        self.samples: Dict[str, Deque[Tuple[float, bool]]] = {mode: deque(maxlen=window) for mode in MODES}
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def record(self, latency: float, ok: bool, mode: str = COMPLETION):
+        self.samples[mode].append((latency, ok))
+        self.requests += 1
+        if ok:
+            self.consecutive_failures = 0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+
+    def latency(self, quantile: float, mode: str = COMPLETION) -> Optional[float]:
+        """
+        Latency quantile over successful calls in the mode's window.
+        """
+        latencies = sorted(latency for latency, ok in self.samples[mode] if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+    def error_rate(self, mode: str = COMPLETION) -> float:
+        samples = self.samples[mode]
+        if not samples:
+            return 0.0
+        return sum(1 for _, ok in samples if not ok) / len(samples)
+
+    def score(self, mode: str = COMPLETION) -> Optional[float]:
+        p50 = self.latency(0.5, mode)
+        if p50 is None:
+            return None
+        return p50 * (1 + ERROR_PENALTY * self.error_rate(mode))
+
+    def clear(self):
+        for samples in self.samples.values():
+            samples.clear()
+
+
+class ProviderRouter(LLMProvider):
+    """
+    Routes each call to the healthiest, fastest configured provider and
+    falls through to the next on failure. Failures are exceptions,
+    timeouts and providers' `error_message` replies.
+
+    After `failure_threshold` consecutive failures a provider's circuit
+    opens and it gets no traffic; `run_probes` checks open providers in
+    the background once `cooldown` has passed and closes the circuit
+    when a probe succeeds. Providers are ranked by p50 latency, penalized
+    by error rate, over calls of the same mode: streams are ranked by time
+    to first chunk and completions by time to the whole reply. A small `explore_rate` of calls goes to a lesser
+    ranked provider so its stats stay current.
+
+    Hedging (`hedge=True`): if the best provider has not answered (or
+    streamed its first chunk) within its `hedge_quantile` latency, the
+    same request also goes to the runner-up; the first success wins and
+    the other call is cancelled. Each hedged request earns
+    `hedge_max_rate` of a hedge, so at most that share of requests is
+    hedged beyond a small burst.
+
+    With `tools` (skill definitions), calls go to the providers' native
+    tool calling instead and responses are tool-call replies, streams
+    (kind, value) events; see `LLMProvider.generate_tool_calls`.
+    """
+
+    def __init__(self, providers: Dict[str, LLMProvider], window: int = 50, failure_threshold: int = 3, cooldown: float = 30.0, timeout: float = 30.0, explore_rate: float = 0.05,
+                 hedge_quantile: float = 0.9, hedge_default_delay: float = 2.0, hedge_min_delay: float = 0.25, hedge_max_rate: float = 0.1):
+        self.providers = providers
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.timeout = timeout
+        self.explore_rate = explore_rate
+        self.health: Dict[str, ProviderHealth] = {name: ProviderHealth(window) for name in providers}
+        self.hedge_quantile = hedge_quantile
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_rate = hedge_max_rate
+        self.hedge_tokens = HEDGE_BURST
+        self.hedge_requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_throttled = 0
+
+    def eligible(self) -> List[str]:
+        return [name for name in self.providers if provider_configured(name)]
+
+    def ranked(self, mode: str = COMPLETION) -> List[str]:
+        """
+        Eligible providers with closed circuits, best first for calls of
+        `mode`, followed by the open ones (a last resort when everything
+        else fails).
+        """
+        def key(name: str):
+            health = self.health[name]
+            score = health.score(mode)
+            priority = PRIORITY.index(name) if name in PRIORITY else len(PRIORITY)
+            # Providers without a successful call rank behind measured ones,
+            # untried before failing, then in their static order
+            return (score is None, score or 0.0, health.error_rate(mode), priority)
+
+        eligible = sorted(self.eligible(), key=key)
+        closed = [name for name in eligible if self.health[name].state == CLOSED]
+        if len(closed) > 1 and random.random() < self.explore_rate:
+            explored = random.choice(closed[1:])
+            closed.remove(explored)
+            closed.insert(0, explored)
+        return closed + [name for name in eligible if self.health[name].state == OPEN]
+
+    def record(self, name: str, latency: float, ok: bool, mode: str = COMPLETION):
+        health = self.health[name]
+        health.record(latency, ok, mode)
+        if not ok and health.state == CLOSED and health.consecutive_failures >= self.failure_threshold:
+            health.state = OPEN
+            health.opened_at = time.monotonic()
+            logger.warning(f"Circuit opened for provider {name} after {health.consecutive_failures} consecutive failures.")
+        elif ok and health.state == OPEN:
+            self._close(name)
+
+    def _close(self, name: str):
+        health = self.health[name]
+        if health.state == OPEN:
+            # Samples from the outage would keep it ranked last
+            health.clear()
+        health.state = CLOSED
+        health.consecutive_failures = 0
+        logger.info(f"Circuit closed for provider {name}.")
+
+    @staticmethod
+    def _failure(provider: LLMProvider, tools: Optional[List[Dict[str, Any]]]) -> Any:
+        return provider.error_message if tools is None else {"message": provider.error_message, "tool_calls": []}
+
+    async def call(self, name: str, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None) -> Tuple[Any, bool]:
+        """
+        One timed call to `name`. Returns (response, ok) and records it.
+        """
+        provider = self.providers[name]
+        started = time.monotonic()
+        try:
+            if tools is None:
+                response = await asyncio.wait_for(provider.generate_response(prompt, system_prompt, history), self.timeout)
+                ok = response != provider.error_message
+            else:
+                response = await asyncio.wait_for(provider.generate_tool_calls(prompt, system_prompt, history, tools), self.timeout)
+                ok = response["message"] != provider.error_message
+        except asyncio.TimeoutError:
+            logger.error(f"Provider {name} timed out after {self.timeout}s")
+            response, ok = self._failure(provider, tools), False
+        except Exception as e:
+            logger.error(f"Provider {name} failed: {e}")
+            response, ok = self._failure(provider, tools), False
+        self.record(name, time.monotonic() - started, ok)
+        return response, ok
+
+    async def _answer(self, name: str, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None) -> Any:
+        response, ok = await self.call(name, prompt, system_prompt, history, tools)
+        if not ok:
+            raise RuntimeError(response)
+        return response
+
+    async def route(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, order: List[str] = None, hedge: bool = False, tools: List[Dict[str, Any]] = None) -> Tuple[str, Any, bool]:
+        """
+        Try providers best first until one answers. Returns
+        (provider name, response, ok); when all fail, the last provider's
+        error message.
+        """
+        order = self.ranked() if order is None else order
+        tried: List[str] = []
+        if hedge and order:
+            name, response, tried = await self._hedged(order, lambda name: self._answer(name, prompt, system_prompt, history, tools), COMPLETION)
+            if name is not None:
+                return name, response, True
+
+        name, response, ok = "local", self._failure(self.providers["local"], tools), False
+        for name in order:
+            if name in tried:
+                continue
+            response, ok = await self.call(name, prompt, system_prompt, history, tools)
+            if ok:
+                break
+            logger.warning(f"Provider {name} failed, trying the next one.")
+        return name, response, ok
+
+    async def generate_response(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None) -> str:
+        _, response, ok = await self.route(prompt, system_prompt, history)
+        return response if ok else self.error_message
+
+    async def generate_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        _, response, ok = await self.route(prompt, system_prompt, history, tools=tools)
+        return response if ok else self._failure(self, tools)
+
+    async def _open_stream(self, name: str, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None) -> Tuple[AsyncIterator[Any], Any]:
+        """
+        Start `name`'s stream and wait for its first chunk. Returns
+        (stream, first chunk) and raises if the provider fails before it.
+        Streams are timed to their first chunk.
+        """
+        provider = self.providers[name]
+        started = time.monotonic()
+        if tools is None:
+            stream, failed = provider.generate_stream(prompt, system_prompt, history), provider.stream_error_message
+        else:
+            stream, failed = provider.stream_tool_calls(prompt, system_prompt, history, tools), ("message", provider.stream_error_message)
+        try:
+            first = await asyncio.wait_for(stream.__anext__(), self.timeout)
+            if first == failed:
+                raise RuntimeError(first)
+        except asyncio.CancelledError:
+            await stream.aclose()
+            raise
+        except Exception as e:
+            await stream.aclose()
+            self.record(name, time.monotonic() - started, False, STREAM)
+            logger.error(f"Provider {name} stream failed: {e!r}")
+            raise
+        self.record(name, time.monotonic() - started, True, STREAM)
+        return stream, first
+
+    async def generate_stream(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, order: List[str] = None, hedge: bool = False, tools: List[Dict[str, Any]] = None):
+        """
+        Stream from the best provider. Providers that fail before their
+        first chunk are skipped; once text has been sent there is no
+        switching.
+        """
+        order = self.ranked(STREAM) if order is None else order
+        opened, tried = None, []
+        if hedge and order:
+            name, opened, tried = await self._hedged(order, lambda name: self._open_stream(name, prompt, system_prompt, history, tools), STREAM, discard=lambda opened: opened[0].aclose())
+        for candidate in order:
+            if opened is not None:
+                break
+            if candidate in tried:
+                continue
+            try:
+                name, opened = candidate, await self._open_stream(candidate, prompt, system_prompt, history, tools)
+            except Exception:
+                logger.warning(f"Provider {candidate} stream failed, trying the next one.")
+        if opened is None:
+            yield self.stream_error_message if tools is None else ("message", self.stream_error_message)
+            return
+
+        stream, first = opened
+        yield first
+        try:
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            logger.error(f"Provider {name} stream failed mid-response: {e}")
+
+    async def stream_tool_calls(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None, tools: List[Dict[str, Any]] = None):
+        async for event in self.generate_stream(prompt, system_prompt, history, tools=tools):
+            yield event
+
+    def hedge_delay(self, name: str, mode: str = COMPLETION) -> float:
+        latency = self.health[name].latency(self.hedge_quantile, mode)
+        return max(self.hedge_min_delay, latency if latency is not None else self.hedge_default_delay)
+
+    async def _hedged(self, order: List[str], attempt: Callable[[str], Awaitable[Any]], mode: str, discard: Callable[[Any], Awaitable[Any]] = None) -> Tuple[Optional[str], Any, List[str]]:
+        """
+        Run `attempt(order[0])`, racing `attempt(order[1])` against it once
+        the hedge delay passes. Attempts are calls of `mode`. Returns
+        (winner, result, providers tried); the winner is None if every
+        attempt failed. A losing attempt that succeeded anyway (e.g. in the
+        same round as the winner) has its result passed to `discard`.
+        """
+        self.hedge_requests += 1
+        self.hedge_tokens = min(HEDGE_BURST, self.hedge_tokens + self.hedge_max_rate)
+        primary = order[0]
+        backup = order[1] if len(order) > 1 and self.health[order[1]].state == CLOSED else None
+
+        tasks: Dict[asyncio.Task, str] = {asyncio.create_task(attempt(primary)): primary}
+        started = time.monotonic()
+        delay = self.hedge_delay(primary, mode)
+        done, pending = await asyncio.wait(tasks, timeout=delay)
+        if pending and backup is not None:
+            if self.hedge_tokens >= 1:
+                self.hedge_tokens -= 1
+                self.hedges += 1
+                logger.info(f"Provider {primary} slower than {delay:.2f}s, hedging with {backup}.")
+                tasks[asyncio.create_task(attempt(backup))] = backup
+            else:
+                self.hedges_throttled += 1
+
+        pending, won = set(tasks), None
+        try:
+            while pending and won is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    if won is None:
+                        won = task
+                    elif discard is not None:
+                        await discard(task.result())
+        finally:
+            for task in pending:
+                task.cancel()
+            # Wait for cancelled attempts to clean up; one may have succeeded
+            # before the cancellation reached it
+            for result in await asyncio.gather(*pending, return_exceptions=True):
+                if discard is not None and not isinstance(result, BaseException):
+                    await discard(result)
+
+        if won is None:
+            return None, None, list(tasks.values())
+        winner = tasks[won]
+        if len(tasks) > 1 and winner == backup:
+            self.hedge_wins += 1
+            # The cancelled primary never reports its latency; what it has
+            # taken so far is a lower bound worth keeping
+            self.health[primary].samples[mode].append((time.monotonic() - started, True))
+        return winner, won.result(), list(tasks.values())
+
+    async def probe(self, name: str) -> bool:
+        """
+        Recovery check via the provider's cheap warm-up call.
+        """
+        try:
+            await asyncio.wait_for(self.providers[name].warm_up(), self.timeout)
+        except Exception as e:
+            logger.info(f"Recovery probe of provider {name} failed: {e}")
+            self.health[name].opened_at = time.monotonic()
+            return False
+        self._close(name)
+        return True
+
+    async def run_probes(self, interval: float):
+        """
+        Background loop: probe providers whose circuit has been open for
+        at least `cooldown` seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            due = [name for name, health in self.health.items() if health.state == OPEN and now - health.opened_at >= self.cooldown]
+            if due:
+                await asyncio.gather(*[self.probe(name) for name in due])
+
+    def stats(self) -> Dict[str, Any]:
+        providers = {}
+        for name, health in self.health.items():
+            provider = self.providers[name]
+            latency = {}
+            for mode in MODES:
+                p50, p90 = health.latency(0.5, mode), health.latency(0.9, mode)
+                latency[mode] = {
+                    "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                    "p90_ms": round(p90 * 1000, 1) if p90 is not None else None,
+                    "error_rate": round(health.error_rate(mode), 3)
+                }
+            providers[name] = {
+                "configured": provider_configured(name),
+                "state": health.state,
+                # Streams are timed to their first chunk
+                "latency": latency,
+                "requests": health.requests,
+                "failures": health.failures,
+                # As reported by the provider (estimated for Ollama)
+                "prompt_tokens": provider.prompt_tokens,
+                "cached_prompt_tokens": provider.cached_prompt_tokens,
+                "prompt_cache_rate": round(provider.cached_prompt_tokens / provider.prompt_tokens, 3) if provider.prompt_tokens else 0.0
+            }
+        return {
+            "providers": providers,
+            "hedging": {
+                "requests": self.hedge_requests,
+                "hedged": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "throttled": self.hedges_throttled,
+                "hedge_rate": round(self.hedges / self.hedge_requests, 3) if self.hedge_requests else 0.0,
+                "win_rate": round(self.hedge_wins / self.hedges, 3) if self.hedges else 0.0
+            }
+        }
+
+
+_router: Optional[ProviderRouter] = None
+
+def get_router() -> ProviderRouter:
+    """
+    Return the process-wide router over the shared providers.
+    """
+    global _router
+    if _router is None:
+        from backend.llm.providers.registry import get_providers
+        _router = ProviderRouter(
+            get_providers(),
+            window=settings.ROUTER_WINDOW,
+            failure_threshold=settings.ROUTER_FAILURE_THRESHOLD,
+            cooldown=settings.ROUTER_COOLDOWN_SECONDS,
+            timeout=settings.ROUTER_TIMEOUT_SECONDS,
+            explore_rate=settings.ROUTER_EXPLORE_RATE,
+            hedge_quantile=settings.HEDGE_QUANTILE,
+            hedge_default_delay=settings.HEDGE_DEFAULT_DELAY,
+            hedge_min_delay=settings.HEDGE_MIN_DELAY,
+            hedge_max_rate=settings.HEDGE_MAX_RATE
+        )
+    return _router
@@ -0,0 +1,147 @@
+import math
+from typing import Dict, List, Optional
+from backend.config.settings import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Rough characters per token for providers without a local tokenizer
+CHARS_PER_TOKEN = {
+    "openai": 4.0,
+    "gemini": 4.0,
+    "local": 3.5,
+}
+# Per-message framing (role markers etc.) added by chat APIs
+MESSAGE_OVERHEAD = 4
+# A memory is only cut down to fit if at least this many tokens remain
+MIN_TRIMMED_TOKENS = 32
+
+
+class TokenCounter:
+    """
+    Counts tokens the way a provider would: with tiktoken for OpenAI when it
+    is installed, otherwise by a per-provider characters-per-token estimate.
+    """
+
+    def __init__(self, provider: str, model: Optional[str] = None):
+        self.provider = provider
+        self.chars_per_token = CHARS_PER_TOKEN.get(provider, 4.0)
+        self._encoding = None
+        if provider == "openai" and tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def truncate(self, text: str, tokens: int) -> str:
+        """
+        Cut `text` to at most `tokens` tokens, preferring a word boundary.
+        One token is left for the ellipsis marking the cut.
+        """
+        if tokens <= 1:
+            return ""
+        if self._encoding is not None:
+            encoded = self._encoding.encode(text, disallowed_special=())
+            if len(encoded) <= tokens:
+                return text
+            return self._encoding.decode(encoded[:tokens - 1]).rstrip() + "…"
+        limit = int((tokens - 1) * self.chars_per_token)
+        if len(text) <= limit:
+            return text
+        cut = text.rfind(" ", 0, limit)
+        return text[:cut if cut > 0 else limit].rstrip() + "…"
+
+
+class PromptBudget:
+    """
+    Splits a prompt token budget between instructions, retrieved memories and
+    recent history using fixed shares. Instructions are always kept; whatever
+    they leave of their share goes to memories and history. Memories arrive
+    best first and the lowest-ranked are dropped (or the last one trimmed);
+    history keeps the most recent turns.
+    """
+
+    def __init__(self, counter: TokenCounter, total: int = 4096, instructions_share: float = 0.4, memories_share: float = 0.35, history_share: float = 0.25):
+        self.counter = counter
+        self.total = total
+        self.instructions_share = instructions_share
+        self.memories_share = memories_share
+        self.history_share = history_share
+
+    @classmethod
+    def for_provider(cls, provider: str, model: Optional[str] = None) -> "PromptBudget":
+        return cls(
+            TokenCounter(provider, model),
+            total=settings.PROMPT_TOKEN_BUDGET,
+            instructions_share=settings.PROMPT_SHARE_INSTRUCTIONS,
+            memories_share=settings.PROMPT_SHARE_MEMORIES,
+            history_share=settings.PROMPT_SHARE_HISTORY
+        )
+
+    def allocate(self, instructions: str, user_input: str, memories: List[str], history: List[Dict[str, str]]) -> Dict[str, object]:
+        """
+        Fit memories and history around the instructions and user input.
+        Returns the kept `memories` and `history` plus a `usage` breakdown.
+        """
+        count = self.counter.count
+        instructions_tokens = count(instructions)
+        input_tokens = count(user_input) + MESSAGE_OVERHEAD
+
+        # Slack from the instructions' share is split between the other two;
+        # an overrun is taken out of them so the total still holds
+        available = max(0, self.total - instructions_tokens - input_tokens)
+        slack = max(0, int(self.total * self.instructions_share) - instructions_tokens - input_tokens)
+        flexible = self.memories_share + self.history_share or 1.0
+        memory_budget = min(available, int(self.total * self.memories_share + slack * self.memories_share / flexible))
+        history_budget = int(self.total * self.history_share + slack * self.history_share / flexible)
+
+        kept_memories, memory_tokens = [], 0
+        for memory in memories:
+            tokens = count(memory) + 1
+            if memory_tokens + tokens <= memory_budget:
+                kept_memories.append(memory)
+                memory_tokens += tokens
+                continue
+            room = memory_budget - memory_tokens - 1
+            if room >= MIN_TRIMMED_TOKENS:
+                trimmed = self.counter.truncate(memory, room)
+                kept_memories.append(trimmed)
+                memory_tokens += count(trimmed) + 1
+            break
+
+        # Memories' leftover lets history reach further back
+        history_budget = min(available - memory_tokens, history_budget + memory_budget - memory_tokens)
+        kept_history, history_tokens = [], 0
+        for message in reversed(history):
+            tokens = count(message["content"]) + MESSAGE_OVERHEAD
+            if history_tokens + tokens > history_budget:
+                break
+            kept_history.append(message)
+            history_tokens += tokens
+        kept_history.reverse()
+
+        return {
+            "memories": kept_memories,
+            "history": kept_history,
+            "usage": {
+                "instructions": instructions_tokens,
+                "input": input_tokens,
+                "memories": memory_tokens,
+                "memories_kept": len(kept_memories),
+                "memories_total": len(memories),
+                "history": history_tokens,
+                "history_kept": len(kept_history),
+                "history_total": len(history),
+                "total": instructions_tokens + input_tokens + memory_tokens + history_tokens,
+                "budget": self.total
+            }
+        }
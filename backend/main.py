@@ -7,5 +7,7 @@ if __name__ == "__main__":
         "backend.app:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        workers=settings.WORKERS,
+        # Reload mode only supports a single worker
+        reload=settings.WORKERS == 1
     )
@@ -0,0 +1,112 @@
+import math
+import numpy as np
+from typing import List, Optional
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Cluster unit-norm rows by cosine similarity. Returns unit-norm centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = np.array(vectors[rng.choice(len(vectors), k, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        nonempty = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums[nonempty] = np.add.reduceat(vectors[order], starts, axis=0)
+
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        if empty.any():
+            # Reseed empty clusters from random rows
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+            norms[empty] = np.linalg.norm(sums[empty], axis=1)
+        centroids = sums / norms[:, None]
+
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    IVF-flat approximate nearest neighbour index over unit-norm vectors.
+
+    Rows are bucketed by their closest k-means centroid; a query only scores
+    the rows in its `nprobe` closest buckets. Covers positions [0, size) of
+    the owning partition, and rows added later can be assigned incrementally.
+    """
+
+    def __init__(self, centroids: np.ndarray, nprobe: int):
+        self.centroids = centroids
+        self.nprobe = nprobe
+        self.size = 0
+        self.trained_size = 0
+        self._lists: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(len(centroids))]
+        self._appended: List[List[int]] = [[] for _ in range(len(centroids))]
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int = 0, nprobe: int = 8, train_size: int = 256, block_size: int = 65536, seed: int = 0) -> "IVFIndex":
+        """
+        Train centroids on a sample of `vectors` and bucket every row.
+        `nlist` defaults to sqrt(n); at most `train_size` rows per list are
+        used for training. `vectors` may be any row source supporting len(),
+        slicing and index arrays (e.g. a lazy view); it is only read in
+        blocks of `block_size` rows plus the training sample.
+        """
+        n = len(vectors)
+        nlist = min(nlist or max(1, int(math.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, nlist * train_size)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+
+        index = cls(spherical_kmeans(sample, nlist, seed=seed), nprobe)
+
+        assignment = np.empty(n, dtype=np.int64)
+        for start in range(0, n, block_size):
+            block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+            assignment[start:start + len(block)] = index.assign(block)
+
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        index._lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+        index.size = index.trained_size = n
+        return index
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def add(self, position: int, vector: np.ndarray) -> bool:
+        """
+        Bucket the row at `position`. Only the next contiguous position can be
+        added; anything else is left for the caller to scan exactly.
+        """
+        if position != self.size:
+            return False
+        self._appended[int(np.argmax(self.centroids @ vector))].append(position)
+        self.size += 1
+        return True
+
+    def probe(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """
+        Return candidate positions from the buckets closest to `query`.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        scores = self.centroids @ query
+        if nprobe < self.nlist:
+            closest = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        else:
+            closest = np.arange(self.nlist)
+
+        parts = []
+        for c in closest:
+            parts.append(self._lists[c])
+            if self._appended[c]:
+                parts.append(np.asarray(self._appended[c], dtype=np.int64))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
@@ -0,0 +1,95 @@
+import hashlib
+import zlib
+from typing import Any, Dict, List
+import numpy as np
+from backend.memory.lexical import tokenize
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def content_hash(content: str) -> str:
+    """
+    Hash used for exact de-duplication; insensitive to whitespace changes.
+    """
+    return hashlib.sha256(" ".join(content.split()).encode("utf-8")).hexdigest()
+
+
+def _shingles(text: str, size: int = 3) -> np.ndarray:
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        grams = [" ".join(tokens)] if tokens else [text]
+    else:
+        grams = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64))
+
+
+def minhash_signatures(texts: List[str], num_perm: int = 64, seed: int = 1) -> np.ndarray:
+    """
+    MinHash signature (num_perm values) of each text's word 3-gram set.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MAX_HASH, num_perm, dtype=np.uint64)
+    b = rng.integers(0, MAX_HASH, num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        shingles = _shingles(text)
+        signatures[i] = ((a[:, None] * shingles[None, :] + b[:, None]) % MERSENNE_PRIME).min(axis=1)
+    return signatures
+
+
+def near_duplicate_groups(texts: List[str], threshold: float = 0.85, num_perm: int = 64, bands: int = 16) -> List[List[int]]:
+    """
+    Group indices of texts whose estimated Jaccard similarity is at least
+    `threshold`. LSH banding finds candidate pairs in O(n); each candidate is
+    checked against its group's first (oldest) member. Only groups with more
+    than one member are returned, each sorted ascending.
+    """
+    if len(texts) < 2:
+        return []
+    signatures = minhash_signatures(texts, num_perm)
+    rows = num_perm // bands
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets: Dict[bytes, int] = {}
+        for i, key in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            key = key.tobytes()
+            first = buckets.setdefault(key, i)
+            if first == i:
+                continue
+            root_a, root_b = find(first), find(i)
+            if root_a == root_b:
+                continue
+            if np.mean(signatures[root_a] == signatures[i]) >= threshold:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        groups.setdefault(find(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def merge_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Keep the first record and fold the others' metadata into `merged_from`
+    so their provenance survives compaction.
+    """
+    survivor = dict(records[0])
+    metadata = dict(survivor.get("metadata") or {})
+    provenance = list(metadata.get("merged_from", []))
+    for record in records[1:]:
+        other = dict(record.get("metadata") or {})
+        nested = other.pop("merged_from", [])
+        provenance.append({"metadata": other, "timestamp": record.get("timestamp", 0)})
+        provenance.extend(nested)
+    metadata["merged_from"] = provenance
+    survivor["metadata"] = metadata
+    return survivor
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+from backend.db.models.preferences import Preferences
+from backend.skills.registry import SkillRegistry
+from backend.utils.logger import logger
+
+
+class RequestContext:
+    """
+    Everything a turn needs besides the user input, fetched once per request.
+    """
+
+    def __init__(self, query: str, memories: List[str], history: List[Dict[str, str]], preferences: Preferences, skills: List[str], elapsed: float):
+        self.query = query
+        self.memories = memories
+        self.history = history
+        self.preferences = preferences
+        self.skills = skills
+        self.elapsed = elapsed
+
+
+class ContextAssembler:
+    """
+    Request-scoped: history, long-term search and the profile lookup are
+    started together and each is memoized, so asking twice (or from two
+    places) costs one lookup. `assemble` waits only as long as the slowest.
+    """
+
+    def __init__(self, controller, user_id: int, session_id: str, query: str):
+        self.controller = controller
+        self.user_id = user_id
+        self.session_id = session_id
+        self.query = query
+        self._lookups: Dict[str, asyncio.Task] = {}
+
+    def _lookup(self, name: str, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._lookups.get(name)
+        if task is None:
+            task = self._lookups[name] = asyncio.create_task(fetch())
+        return task
+
+    def memories(self) -> Awaitable[List[str]]:
+        return self._lookup("memories", lambda: self.controller.get_context(self.user_id, self.session_id, self.query))
+
+    def history(self) -> Awaitable[List[Dict[str, str]]]:
+        return self._lookup("history", lambda: self.controller.get_history(self.session_id))
+
+    def preferences(self) -> Awaitable[Preferences]:
+        return self._lookup("preferences", lambda: self.controller.profile.get_preferences(self.user_id))
+
+    async def assemble(self) -> RequestContext:
+        started = time.monotonic()
+        lookups = [self.memories(), self.history(), self.preferences()]
+        try:
+            memories, history, preferences = await asyncio.gather(*lookups)
+        except BaseException:
+            for task in lookups:
+                task.cancel()
+            raise
+        elapsed = time.monotonic() - started
+        logger.info(f"Context assembled in {elapsed * 1000:.0f} ms ({len(memories)} memories, {len(history)} messages).")
+        return RequestContext(self.query, memories, history, preferences, SkillRegistry.get_skill_names(), elapsed)
@@ -0,0 +1,193 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from backend.utils.logger import logger
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model, sha256(text)).
+    An in-memory LRU sits in front of a SQLite table on disk; both tiers are
+    bounded and evict least-recently-used entries.
+
+    Lookups never write: new embeddings and disk hits' access times are
+    queued in memory and written in one transaction by `flush`. `get_cached`
+    only consults memory; `get` and `flush` touch SQLite and are meant for a
+    worker thread. The database is in WAL mode so lookups are not blocked
+    by another process' flush. The disk row count is counted once on open
+    and then kept up to date by this process' flushes.
+    """
+
+    def __init__(self, path: str, max_memory_items: int = 4096, max_disk_items: int = 200000, timeout: float = 1.0):
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self._memory: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._pending: Dict[Tuple[str, str], bytes] = {}
+        self._touched: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.flushes = 0
+
+        # Lookups and flushes use separate connections so a flush in a worker
+        # thread never shares a connection with the event loop
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        try:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache could not enable WAL: {e}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, digest TEXT NOT NULL, vector BLOB NOT NULL, accessed REAL NOT NULL, "
+            "PRIMARY KEY (model, digest))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+        self._db.commit()
+        self._disk_items = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._writer = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+
+    @staticmethod
+    def key(model: str, text: str) -> Tuple[str, str]:
+        return model, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_cached(self, model: str, text: str) -> Optional[List[float]]:
+        """
+        Look the embedding up in memory only (the LRU and writes not yet
+        flushed). A miss is not counted; follow up with `get`.
+        """
+        key = self.key(model, text)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+            blob = self._pending.get(key)
+            if blob is None:
+                return None
+            embedding = np.frombuffer(blob, dtype=np.float32).tolist()
+            self._remember(key, embedding)
+            self.hits += 1
+            return embedding
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """
+        Look the embedding up in memory, then on disk. Blocking; run it in a
+        worker thread.
+        """
+        embedding = self.get_cached(model, text)
+        if embedding is not None:
+            return embedding
+
+        key = self.key(model, text)
+        try:
+            # The memory lock is not held here, so puts never wait on disk
+            with self._read_lock:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND digest = ?", key
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+            self._touched[key] = time.time()
+            self._remember(key, embedding)
+            self.disk_hits += 1
+            self.hits += 1
+            return embedding
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        if not embedding:
+            return
+        key = self.key(model, text)
+        with self._lock:
+            self._remember(key, embedding)
+            self._pending[key] = np.asarray(embedding, dtype=np.float32).tobytes()
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending or self._touched)
+
+    def flush(self) -> bool:
+        """
+        Write queued embeddings and access times in one transaction and
+        evict beyond `max_disk_items`. Blocking; run it in a worker thread.
+        A failed flush is re-queued for the next one. Returns whether
+        anything was written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                touched, self._touched = self._touched, {}
+            if not pending and not touched:
+                return False
+            now = time.time()
+            try:
+                with self._writer:
+                    # An embedding is a function of (model, text), so a row
+                    # another process wrote meanwhile is kept, and only
+                    # inserted rows change the count
+                    inserted = self._writer.executemany(
+                        "INSERT OR IGNORE INTO embeddings (model, digest, vector, accessed) VALUES (?, ?, ?, ?)",
+                        [(*key, blob, now) for key, blob in pending.items()]
+                    ).rowcount
+                    self._writer.executemany(
+                        "UPDATE embeddings SET accessed = ? WHERE model = ? AND digest = ?",
+                        [(accessed, *key) for key, accessed in touched.items()]
+                    )
+                    evicted = self._evict_disk(self._disk_items + max(inserted, 0))
+                self._disk_items += max(inserted, 0) - evicted
+                self.flushes += 1
+                return True
+            except sqlite3.Error as e:
+                logger.error(f"Embedding cache write failed: {e}")
+                with self._lock:
+                    self._pending = {**pending, **self._pending}
+                    self._touched = {**touched, **self._touched}
+                return False
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        self._db.close()
+
+    def _remember(self, key: Tuple[str, str], embedding: List[float]):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, disk_items: int) -> int:
+        excess = disk_items - self.max_disk_items
+        if excess <= 0:
+            return 0
+        return max(self._writer.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY accessed LIMIT ?)",
+            (excess,)
+        ).rowcount, 0)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_items": self._disk_items,
+            "pending_writes": len(self._pending),
+            "flushes": self.flushes
+        }
@@ -1,9 +1,22 @@
-from typing import List, Dict
+import asyncio
+from typing import List, Dict, Optional, Set
 from backend.llm.providers.base import LLMProvider
+from backend.config.settings import settings
+from backend.utils.logger import logger
+
+SUMMARY_SYSTEM_PROMPT = """
+You maintain a running summary of a conversation between a user and their voice assistant.
+Merge the new turns into the existing summary. Keep names, facts about the user, preferences,
+decisions, open tasks and anything the assistant promised; drop greetings and small talk.
+Reply with the updated summary only, in at most {max_words} words.
+"""
 
 class MemoryExtractor:
-    def __init__(self, llm_provider: LLMProvider):
+    def __init__(self, llm_provider: LLMProvider, short_term=None):
         self.llm = llm_provider
+        self.short_term = short_term
+        self._timers: Dict[str, asyncio.Task] = {}
+        self._summarizing: Set[str] = set()
 
     async def extract_facts(self, conversation_history: List[Dict[str, str]]) -> List[str]:
         """
@@ -12,3 +25,84 @@ class MemoryExtractor:
         # This would typically be a background job or a separate LLM call
         # For now, we return empty
         return []
+
+    async def summarize(self, summary: Optional[str], turns: List[Dict[str, str]]) -> str:
+        """
+        Fold `turns` into the running `summary` with one LLM call.
+        """
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        prompt = f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+        system_prompt = SUMMARY_SYSTEM_PROMPT.format(max_words=settings.SUMMARY_MAX_WORDS)
+        response = await self.llm.generate_response(prompt, system_prompt)
+        if response == self.llm.error_message:
+            raise RuntimeError("LLM provider failed to summarize")
+        return response.strip()
+
+    def schedule_summary(self, session_id: str):
+        """
+        Debounce: (re)start the session's timer; the session is summarized
+        once no new turn has arrived for SUMMARY_DEBOUNCE_SECONDS. Runs off the
+        request path, so callers never wait on the LLM.
+        """
+        timer = self._timers.get(session_id)
+        if timer is not None and not timer.done():
+            timer.cancel()
+        self._timers[session_id] = asyncio.create_task(self._debounced(session_id))
+
+    async def _debounced(self, session_id: str):
+        await asyncio.sleep(settings.SUMMARY_DEBOUNCE_SECONDS)
+        # From here on a new turn must not cancel the LLM call midway
+        if self._timers.get(session_id) is asyncio.current_task():
+            del self._timers[session_id]
+        if session_id in self._summarizing:
+            self.schedule_summary(session_id)
+            return
+
+        self._summarizing.add(session_id)
+        try:
+            await self.summarize_session(session_id)
+        except Exception as e:
+            logger.error(f"Summarizing session {session_id} failed: {e}")
+        finally:
+            self._summarizing.discard(session_id)
+
+    async def summarize_session(self, session_id: str) -> bool:
+        """
+        Once a session holds SUMMARY_TRIGGER_MESSAGES messages, fold all but
+        the last SUMMARY_KEEP_RECENT into its running summary.
+        """
+        length = await self.short_term.length(session_id)
+        if length < settings.SUMMARY_TRIGGER_MESSAGES:
+            return False
+
+        summary, messages = await self.short_term.get_conversation(session_id, length)
+        older = messages[:max(0, len(messages) - settings.SUMMARY_KEEP_RECENT)]
+        if not older:
+            return False
+
+        new_summary = await self.summarize(summary, older)
+        if not new_summary:
+            return False
+        # Turns may have been added (and the oldest trimmed) during the LLM
+        # call; fold only if `older` is still at the head. Whatever changed
+        # the session also scheduled another pass.
+        if not await self.short_term.fold(session_id, len(older), new_summary, head=older):
+            logger.info(f"Session {session_id} changed while it was summarized; not folding.")
+            return False
+        logger.info(f"Folded {len(older)} messages of session {session_id} into its summary ({len(new_summary)} chars).")
+        return True
+
+
+_extractor: Optional[MemoryExtractor] = None
+
+def get_memory_extractor() -> MemoryExtractor:
+    """
+    Return the process-wide MemoryExtractor, which owns the summary timers.
+    """
+    global _extractor
+    if _extractor is None:
+        from backend.llm.router import get_router
+        from backend.memory.short_term import get_short_term_memory
+
+        _extractor = MemoryExtractor(get_router(), get_short_term_memory())
+    return _extractor
@@ -0,0 +1,133 @@
+import math
+import re
+from array import array
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from backend.memory.vector_index import top_k
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "i", "in", "is", "it",
+    "my", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "who",
+    "with", "you", "your"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class _LexicalPartition:
+    """
+    Inverted index for one user. Record ids are dense per user, so document
+    lengths live in a flat array indexed by record id.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_len = array("I")
+        self.total_len = 0
+        self.docs = 0
+
+    def add(self, record_id: int, text: str):
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            ids, tfs = self.postings.setdefault(token, (array("q"), array("I")))
+            ids.append(record_id)
+            tfs.append(tf)
+
+        if record_id >= len(self.doc_len):
+            self.doc_len.extend([0] * (record_id + 1 - len(self.doc_len)))
+        self.doc_len[record_id] = len(tokens)
+        self.total_len += len(tokens)
+        self.docs += 1
+
+
+class BM25Index:
+    """
+    Incrementally maintained BM25 index over memory content, partitioned by
+    user like the vector index.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._partitions: Dict[str, _LexicalPartition] = {}
+
+    def has_user(self, user_id: str) -> bool:
+        return user_id in self._partitions
+
+    def build(self, user_id: str, records: Iterable[Tuple[int, str]]):
+        """
+        Index a user's existing (record_id, content) pairs in one pass.
+        """
+        self.install(user_id, self.prepare(records))
+
+    @staticmethod
+    def prepare(records: Iterable[Tuple[int, str]]) -> _LexicalPartition:
+        """
+        Index (record_id, content) pairs into a partition that is not yet
+        searchable. Safe to run in a worker thread; swap the result in with
+        `install`.
+        """
+        partition = _LexicalPartition()
+        for record_id, content in records:
+            partition.add(record_id, content)
+        return partition
+
+    def install(self, user_id: str, partition: _LexicalPartition, records: Iterable[Tuple[int, str]] = ()):
+        """
+        Catch a prepared partition up with `records` written since it was
+        prepared, then make it the user's partition.
+        """
+        for record_id, content in records:
+            partition.add(record_id, content)
+        self._partitions[user_id] = partition
+
+    def drop(self, user_id: str):
+        self._partitions.pop(user_id, None)
+
+    def add(self, user_id: str, record_id: int, content: str):
+        partition = self._partitions.get(user_id)
+        if partition is not None:
+            partition.add(record_id, content)
+
+    def search(self, user_id: str, query: str, limit: int = 3) -> List[Tuple[int, float]]:
+        """
+        Return up to `limit` (record_id, BM25 score) pairs, best first.
+        """
+        partition = self._partitions.get(user_id)
+        if partition is None or partition.docs == 0:
+            return []
+
+        doc_len = np.frombuffer(partition.doc_len, dtype=np.uint32).astype(np.float32)
+        avg_len = partition.total_len / partition.docs or 1.0
+        scores = np.zeros(len(doc_len), dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            posting = partition.postings.get(term)
+            if posting is None:
+                continue
+            ids = np.frombuffer(posting[0], dtype=np.int64)
+            tfs = np.frombuffer(posting[1], dtype=np.uint32).astype(np.float32)
+            idf = math.log(1 + (partition.docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_len[ids] / avg_len)
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        candidates = np.flatnonzero(scores > 0)
+        return top_k(scores[candidates], candidates, limit)
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[int]:
+    """
+    Fuse ranked id lists by summing 1 / (k + rank). Ties keep the order in
+    which ids were first seen.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=lambda item: fused[item], reverse=True)
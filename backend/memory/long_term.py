@@ -1,105 +1,661 @@
-import json
+import asyncio
 import os
-import httpx
-import numpy as np
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Set, Tuple
 from backend.config.settings import settings
+from backend.utils.http import get_http_client
 from backend.utils.logger import logger
+from backend.memory.store import MemoryStore
+from backend.memory.shared import WorkerCoordinator
+from backend.memory.embedding_cache import EmbeddingCache
+from backend.memory.lexical import BM25Index, reciprocal_rank_fusion
+from backend.memory.compaction import content_hash, merge_records, near_duplicate_groups
+from backend.memory.vector_index import VectorIndex, normalize
 
 class LongTermMemory:
     def __init__(self):
-        self.memory_file = "local_memory.json"
+        self.legacy_memory_file = "local_memory.json"
         self.ollama_url = "http://localhost:11434/api/embeddings"
+        self.ollama_batch_url = "http://localhost:11434/api/embed"
         self.model = "mistral" # Must match the model used for generation usually, or use a specific embed model
         
-        # Load existing memory
-        if os.path.exists(self.memory_file):
-            try:
-                with open(self.memory_file, "r") as f:
-                    self.memories = json.load(f)
-            except:
-                self.memories = []
-        else:
-            self.memories = []
+        self.embedding_cache = EmbeddingCache(
+            settings.EMBEDDING_CACHE_PATH,
+            max_memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+            max_disk_items=settings.EMBEDDING_CACHE_DISK_ITEMS
+        )
+        self._pending_embeddings: Dict[str, asyncio.Task] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # With several workers, one process writes and the others map the
+        # store read-only and hand their writes over to it
+        self.shared = WorkerCoordinator(settings.MEMORY_STORE_DIR) if settings.MEMORY_SHARED_INDEX else None
+
+        # Open the append-only store, importing the legacy JSON file once
+        self.store = MemoryStore(settings.MEMORY_STORE_DIR, vector_dtype=settings.MEMORY_VECTOR_DTYPE, read_only=not self.writable)
+        if self.writable:
+            self.store.migrate_json(self.legacy_memory_file)
+
+        # Memory-mapped vectors become the base of each user's index partition
+        self.index = VectorIndex(
+            dtype=settings.MEMORY_VECTOR_DTYPE,
+            exact_source=self.store.exact_vectors if settings.MEMORY_EXACT_RERANK else None,
+            rerank_factor=settings.MEMORY_RERANK_FACTOR,
+            ann_enabled=settings.ANN_ENABLED,
+            ann_min_rows=settings.ANN_MIN_ROWS,
+            ann_nlist=settings.ANN_NLIST,
+            ann_nprobe=settings.ANN_NPROBE,
+            ann_rebuild_ratio=settings.ANN_REBUILD_RATIO
+        )
+        for user_id in self.store.users():
+            self.index.attach(user_id, *self.store.vectors(user_id))
+
+        # BM25 partitions and content-hash sets are loaded per user in the
+        # background, then kept up to date. A user's epoch is bumped
+        # whenever their files are swapped, so a build started before that
+        # is thrown away.
+        self.lexical = BM25Index()
+        self._lexical_builds: Dict[str, asyncio.Task] = {}
+        self._epochs: Dict[str, int] = {}
+        self._hashes: Dict[str, Set[str]] = {}
+        self._hash_loads: Dict[str, asyncio.Task] = {}
+
+        # Record count of each user as of their last compaction, so the
+        # periodic job skips users with nothing new
+        self._compacted: Dict[str, int] = {}
+        self._compaction_lock = asyncio.Lock()
+
+        # Serializes writers; readers only see records once they are on disk
+        self._write_lock = asyncio.Lock()
+        self._index_task: Optional[asyncio.Task] = None
             
-        logger.info(f"Initialized Local Vector Store with {len(self.memories)} items.")
+        logger.info(f"Initialized Local Vector Store with {len(self.store)} items.")
+
+    @property
+    def writable(self) -> bool:
+        return self.shared is None or self.shared.is_writer
 
     async def get_embedding(self, text: str) -> List[float]:
+        """
+        Embed text, serving repeats from the cache and sharing a single
+        Ollama call between concurrent requests for the same text.
+        """
+        cached = self.embedding_cache.get_cached(self.model, text)
+        if cached is None:
+            cached = await asyncio.to_thread(self.embedding_cache.get, self.model, text)
+        if cached is not None:
+            return cached
+
+        # The fetch is its own task, so a caller that is cancelled does not
+        # cancel it for the others waiting on the same text
+        pending = self._pending_embeddings.get(text)
+        if pending is None:
+            pending = self._pending_embeddings[text] = asyncio.create_task(self._fetch_and_cache(text))
+            pending.add_done_callback(lambda _: self._pending_embeddings.pop(text, None))
+        return await asyncio.shield(pending)
+
+    async def _fetch_and_cache(self, text: str) -> List[float]:
+        embedding = await self._fetch_embedding(text)
+        self.embedding_cache.put(self.model, text, embedding)
+        self._flush_embeddings()
+        return embedding
+
+    def _flush_embeddings(self):
+        """
+        Write new cache entries to disk in a worker thread. Entries queued
+        while a flush runs go out with the next one; after a failed flush,
+        the next call retries.
+        """
+        if not self.embedding_cache.dirty or (self._flush_task is not None and not self._flush_task.done()):
+            return
+        self._flush_task = asyncio.create_task(asyncio.to_thread(self.embedding_cache.flush))
+        self._flush_task.add_done_callback(self._flushed)
+
+    def _flushed(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is None and task.result():
+            self._flush_embeddings()
+
+    async def close(self):
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await asyncio.to_thread(self.embedding_cache.close)
+
+    async def _fetch_embedding(self, text: str) -> List[float]:
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.ollama_url, 
-                    json={"model": self.model, "prompt": text},
-                    timeout=30.0
-                )
-                if response.status_code == 200:
-                    return response.json().get("embedding", [])
-                else:
-                    logger.error(f"Ollama embedding failed: {response.text}")
-                    return []
+            response = await get_http_client().post(
+                self.ollama_url, 
+                json={"model": self.model, "prompt": text, "keep_alive": settings.OLLAMA_KEEP_ALIVE},
+                timeout=30.0
+            )
+            if response.status_code == 200:
+                return response.json().get("embedding", [])
+            else:
+                logger.error(f"Ollama embedding failed: {response.text}")
+                return []
         except Exception as e:
             logger.error(f"Ollama embedding error: {e}")
             return []
 
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a batch of texts with one Ollama call for the cache misses.
+        Raises on failure so callers can retry the batch.
+        """
+        embeddings = [self.embedding_cache.get_cached(self.model, text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            from_disk = await asyncio.to_thread(lambda: [self.embedding_cache.get(self.model, texts[i]) for i in missing])
+            for i, embedding in zip(missing, from_disk):
+                embeddings[i] = embedding
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            self._flush_embeddings()
+            return embeddings
+
+        response = await get_http_client().post(
+            self.ollama_batch_url,
+            json={"model": self.model, "input": [texts[i] for i in missing], "keep_alive": settings.OLLAMA_KEEP_ALIVE},
+            timeout=120.0
+        )
+        response.raise_for_status()
+        fetched = response.json().get("embeddings", [])
+
+        if len(fetched) != len(missing):
+            raise ValueError(f"Ollama returned {len(fetched)} embeddings for {len(missing)} inputs")
+        for i, embedding in zip(missing, fetched):
+            self.embedding_cache.put(self.model, texts[i], embedding)
+            embeddings[i] = embedding
+        self._flush_embeddings()
+        return embeddings
+
+    async def warm_up(self):
+        """
+        Load the embedding model in Ollama ahead of the first search.
+        """
+        response = await get_http_client().post(
+            self.ollama_batch_url,
+            json={"model": self.model, "input": [], "keep_alive": settings.OLLAMA_KEEP_ALIVE},
+            timeout=120.0
+        )
+        response.raise_for_status()
+
     async def save(self, user_id: str, content: str, metadata: Dict[str, Any] = None):
         """
-        Embed and save a memory snippet.
+        Embed and save a memory snippet. Exact duplicates of an existing
+        memory are skipped before embedding.
         """
+        user_id = str(user_id)
+        await self._ensure_hashes(user_id)
+        if content_hash(content) in self._hashes[user_id]:
+            logger.info(f"Skipping duplicate memory: {content[:50]}...")
+            return
+
         embedding = await self.get_embedding(content)
         if not embedding:
             logger.warning("Could not generate embedding, saving without vector.")
             
-        memory_item = {
-            "user_id": user_id,
-            "content": content,
-            "metadata": metadata or {},
-            "embedding": embedding,
-            "timestamp": 0 # TODO: Add timestamp
-        }
-        
-        self.memories.append(memory_item)
-        self._save_to_disk()
+        if not await self._commit(user_id, [(content, metadata)], [embedding]):
+            # Saved by a concurrent call while this one was embedding
+            logger.info(f"Skipping duplicate memory: {content[:50]}...")
+            return
         logger.info(f"Saved to long-term memory: {content[:50]}...")
 
+    async def _embed_batch(self, batch: List[Tuple[str, Dict[str, Any]]], max_retries: int) -> Optional[List[List[float]]]:
+        for attempt in range(max_retries + 1):
+            try:
+                return await self.get_embeddings([content for content, _ in batch])
+            except Exception as e:
+                logger.warning(f"Embedding batch failed (attempt {attempt + 1}/{max_retries + 1}): {e}")
+                if attempt < max_retries:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        return None
+
+    async def _ensure_hashes(self, user_id: str):
+        """
+        Load the user's stored content digests if they aren't loaded yet.
+        Concurrent callers share one load.
+        """
+        if user_id in self._hashes:
+            return
+        task = self._hash_loads.get(user_id)
+        if task is None:
+            task = self._hash_loads[user_id] = asyncio.create_task(self._load_hashes(user_id))
+            task.add_done_callback(lambda done: self._hash_loads.pop(user_id, None))
+        await asyncio.shield(task)
+
+    async def _load_hashes(self, user_id: str):
+        # Read the persisted digests without the write lock, then take it only
+        # to add digests of records saved meanwhile
+        while user_id not in self._hashes:
+            epoch, upto = self._epochs.get(user_id, 0), self.store.count(user_id)
+            hashes = await asyncio.to_thread(self._stored_hashes, user_id, upto)
+            async with self._write_lock:
+                if self._epochs.get(user_id, 0) != epoch:
+                    continue
+                hashes.update(await asyncio.to_thread(self.store.hashes, user_id, upto))
+                self._hashes[user_id] = hashes
+
+    def _stored_hashes(self, user_id: str, upto: int) -> Set[str]:
+        return {*self.store.retired_hashes(user_id), *self.store.hashes(user_id, 0, upto)}
+
+    def _unseen(self, user_id: str, items: List[Tuple[str, Dict[str, Any]]], seen: Set[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Drop items already stored for the user or already in `seen`, which is
+        updated with the hashes of the items kept.
+        """
+        stored = self._hashes.get(user_id, set())
+        kept = []
+        for content, metadata in items:
+            digest = content_hash(content)
+            if digest in stored or digest in seen:
+                continue
+            seen.add(digest)
+            kept.append((content, metadata))
+        return kept
+
+    async def _commit(self, user_id: str, items: List[Tuple[str, Dict[str, Any]]], embeddings: List[List[float]]) -> int:
+        """
+        Append embedded items to the store in one write and index them.
+        Items whose content is already stored are skipped; returns how many
+        were written. A read-only worker spools them for the writer instead.
+        """
+        await self._ensure_hashes(user_id)
+        async with self._write_lock:
+            hashes = self._hashes[user_id]
+            records, vectors, fresh = [], [], set()
+            for (content, metadata), embedding in zip(items, embeddings):
+                digest = content_hash(content)
+                if digest in hashes or digest in fresh:
+                    continue
+                fresh.add(digest)
+                records.append({"content": content, "metadata": metadata or {}, "timestamp": time.time(), "hash": digest})
+                vectors.append(normalize(embedding))
+
+            # Digests count as seen only once the write went through
+            if not self.writable:
+                spooled = [vector.tolist() if vector is not None else None for vector in vectors]
+                await asyncio.to_thread(self.shared.submit, user_id, records, spooled)
+                hashes.update(fresh)
+                return len(records)
+            await self._append(user_id, records, vectors)
+            hashes.update(fresh)
+        self._maintain_index()
+        return len(records)
+
+    async def _append(self, user_id: str, records: List[Dict[str, Any]], vectors: List[Optional[Any]]):
+        """
+        Write records to the store and indexes. Caller holds the write lock.
+        """
+        record_ids = await asyncio.to_thread(self.store.append_many, user_id, records, vectors)
+        for record_id, record, vector in zip(record_ids, records, vectors):
+            if vector is not None:
+                self.index.add_normalized(user_id, record_id, vector)
+            self.lexical.add(user_id, record_id, record["content"])
+        if self.shared is not None and records:
+            await asyncio.to_thread(self.shared.publish, [user_id])
+
+    @staticmethod
+    def _ingest_stats(saved: int, failed: int, duplicates: int, batches: int, started: float) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - started
+        stats = {
+            "saved": saved,
+            "failed": failed,
+            "duplicates": duplicates,
+            "batches": batches,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(saved / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        logger.info(f"Batch saved {saved} memories ({failed} failed) at {stats['chunks_per_sec']} chunks/sec.")
+        return stats
+
+    async def save_stream(self, user_id: str, items: AsyncIterator[Tuple[str, Dict[str, Any]]], batch_size: int = None, concurrency: int = None, max_retries: int = None) -> Dict[str, Any]:
+        """
+        Embed (content, metadata) pairs pulled from an async iterator in
+        batches, so embedding starts before the source is exhausted. At most
+        `concurrency` batches are in flight (the iterator is not read further
+        until one finishes), and each batch is committed as soon as it is
+        embedded. A batch that fails to embed after retries, or to commit,
+        is dropped and counted as failed.
+        """
+        batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        concurrency = concurrency or settings.INGEST_CONCURRENCY
+        max_retries = settings.INGEST_MAX_RETRIES if max_retries is None else max_retries
+        started = time.perf_counter()
+        user_id = str(user_id)
+        totals = {"saved": 0, "failed": 0, "duplicates": 0, "batches": 0}
+        in_flight: Set[asyncio.Task] = set()
+        seen: Set[str] = set()
+        await self._ensure_hashes(user_id)
+
+        async def process(batch: List[Tuple[str, Dict[str, Any]]]):
+            try:
+                embeddings = await self._embed_batch(batch, max_retries)
+                if embeddings is None:
+                    totals["failed"] += len(batch)
+                    return
+                saved = await self._commit(user_id, batch, embeddings)
+            except Exception as e:
+                logger.error(f"Ingest batch of {len(batch)} failed: {e}")
+                totals["failed"] += len(batch)
+                return
+            totals["saved"] += saved
+            totals["duplicates"] += len(batch) - saved
+
+        async def submit(batch: List[Tuple[str, Dict[str, Any]]]):
+            nonlocal in_flight
+            if len(in_flight) >= concurrency:
+                _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            in_flight.add(asyncio.create_task(process(batch)))
+            totals["batches"] += 1
+
+        try:
+            batch: List[Tuple[str, Dict[str, Any]]] = []
+            async for item in items:
+                if not self._unseen(user_id, [item], seen):
+                    totals["duplicates"] += 1
+                    continue
+                batch.append(item)
+                if len(batch) == batch_size:
+                    await submit(batch)
+                    batch = []
+            if batch:
+                await submit(batch)
+        finally:
+            # Whatever was already read still gets committed
+            if in_flight:
+                await asyncio.gather(*in_flight)
+
+        return self._ingest_stats(totals["saved"], totals["failed"], totals["duplicates"], totals["batches"], started)
+
     async def search(self, user_id: str, query: str, limit: int = 3) -> List[str]:
         """
-        Retrieve relevant memories using cosine similarity.
+        Retrieve the user's most relevant memories. Vector and BM25 rankings
+        are fused with reciprocal rank fusion; if the query can't be embedded
+        (e.g. Ollama is down) only the lexical ranking is used.
         """
+        user_id = str(user_id)
         query_embedding = await self.get_embedding(query)
-        if not query_embedding:
-            return []
-            
-        # Calculate cosine similarity
-        # Sim(A, B) = (A . B) / (||A|| * ||B||)
-        
-        scored_memories = []
-        vec_a = np.array(query_embedding)
-        norm_a = np.linalg.norm(vec_a)
-        
-        if norm_a == 0:
+        depth = limit * settings.HYBRID_SEARCH_DEPTH
+        rankings = []
+
+        if query_embedding:
+            # Cosine similarity against the user's pre-normalized partition
+            self._maintain_index()
+            rankings.append([record_id for record_id, _ in self.index.search(user_id, query_embedding, depth)])
+
+        if settings.HYBRID_SEARCH or not query_embedding:
+            build = self._schedule_lexical(user_id)
+            if build is not None and not query_embedding:
+                # Nothing else to rank by, so wait for the index; otherwise
+                # search dense-only until it is ready
+                await asyncio.shield(build)
+            if self.lexical.has_user(user_id):
+                rankings.append([record_id for record_id, _ in self.lexical.search(user_id, query, depth)])
+
+        if not rankings:
             return []
-            
-        for mem in self.memories:
-            if not mem.get("embedding"):
-                continue
-                
-            vec_b = np.array(mem["embedding"])
-            norm_b = np.linalg.norm(vec_b)
-            
-            if norm_b == 0:
-                continue
-                
-            similarity = np.dot(vec_a, vec_b) / (norm_a * norm_b)
-            scored_memories.append((similarity, mem["content"]))
-            
-        # Sort by similarity desc
-        scored_memories.sort(key=lambda x: x[0], reverse=True)
-        
-        return [m[1] for m in scored_memories[:limit]]
+        if len(rankings) == 1:
+            record_ids = rankings[0][:limit]
+        else:
+            record_ids = reciprocal_rank_fusion(rankings)[:limit]
+        return [self.store.get(user_id, record_id)["content"] for record_id in record_ids]
+
+    def _schedule_lexical(self, user_id: str) -> Optional[asyncio.Task]:
+        """
+        Start building the user's BM25 partition in the background unless it
+        is ready. Returns the build in progress, if any.
+        """
+        if self.lexical.has_user(user_id) or self.store.count(user_id) == 0:
+            return None
+        task = self._lexical_builds.get(user_id)
+        if task is None:
+            task = self._lexical_builds[user_id] = asyncio.create_task(self._build_lexical(user_id))
+            task.add_done_callback(lambda done: self._lexical_builds.pop(user_id, None))
+        return task
 
-    def _save_to_disk(self):
+    async def _build_lexical(self, user_id: str):
+        """
+        Index the records on disk without holding the write lock, then take
+        it only to add records saved meanwhile and swap the partition in.
+        """
         try:
-            with open(self.memory_file, "w") as f:
-                json.dump(self.memories, f)
+            while not self.lexical.has_user(user_id):
+                epoch, upto = self._epochs.get(user_id, 0), self.store.count(user_id)
+                partition = await asyncio.to_thread(BM25Index.prepare, self._contents(user_id, 0, upto))
+                async with self._write_lock:
+                    if self._epochs.get(user_id, 0) != epoch:
+                        continue
+                    missing = await asyncio.to_thread(list, self._contents(user_id, upto))
+                    self.lexical.install(user_id, partition, missing)
         except Exception as e:
-            logger.error(f"Failed to save memory to disk: {e}")
+            logger.error(f"BM25 index build failed for user {user_id}: {e}")
+
+    def _contents(self, user_id: str, start: int, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        return ((record_id, record["content"]) for record_id, record in self.store.scan(user_id, start, stop))
+
+    async def load_indexes(self):
+        """
+        Background job: load every user's content digests and (with hybrid
+        search) BM25 partition ahead of their first request, one user at a
+        time.
+        """
+        for user_id in self.store.users():
+            try:
+                await self._ensure_hashes(user_id)
+            except Exception as e:
+                logger.error(f"Loading content hashes failed for user {user_id}: {e}")
+            build = self._schedule_lexical(user_id) if settings.HYBRID_SEARCH else None
+            if build is not None:
+                await build
+
+    async def compact(self, user_id: str) -> Dict[str, Any]:
+        """
+        Merge near-duplicate memories (MinHash over content) for one user,
+        keeping the oldest record and recording the others' metadata under
+        `merged_from`. Rewrites the user's files and reloads their indexes.
+
+        The new files are written without the write lock, from the records
+        stored when compaction started; it is taken only to carry over
+        records saved meanwhile and swap the files in.
+        """
+        user_id = str(user_id)
+        if not self.writable:
+            raise RuntimeError("Memory compaction runs in the writer process.")
+        started = time.perf_counter()
+        async with self._compaction_lock:
+            while True:
+                epoch, upto = self._epochs.get(user_id, 0), self.store.count(user_id)
+                prepared = await asyncio.to_thread(self._prepare_compaction, user_id, upto)
+                async with self._write_lock:
+                    if self._epochs.get(user_id, 0) != epoch:
+                        continue
+                    before, bytes_before = self.store.count(user_id), self.store.size_on_disk(user_id)
+                    if prepared is not None:
+                        staging, hashes = prepared
+                        if before > upto:
+                            await asyncio.to_thread(self.store.extend_rewrite, user_id, staging, upto)
+                            hashes.update(await asyncio.to_thread(self.store.hashes, user_id, upto))
+                        # Swap files and indexes without yielding to other coroutines
+                        self.store.install_rewrite(user_id, staging)
+                        self._reset_user(user_id)
+                        self._hashes[user_id] = hashes
+                        if self.shared is not None:
+                            await asyncio.to_thread(self.shared.publish, [user_id], True)
+                    after, bytes_after = self.store.count(user_id), self.store.size_on_disk(user_id)
+                    self._compacted[user_id] = after
+                    break
+
+        report = {
+            "user_id": user_id,
+            "records_before": before,
+            "records_after": after,
+            "merged": before - after,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+        logger.info(f"Compacted memories for user {user_id}: {before} -> {after} records, {bytes_before} -> {bytes_after} bytes.")
+        return report
+
+    def _prepare_compaction(self, user_id: str, upto: int) -> Optional[Tuple[str, Set[str]]]:
+        record_ids, records = [], []
+        for record_id, record in self.store.scan(user_id, 0, upto):
+            record_ids.append(record_id)
+            records.append(record)
+        groups = near_duplicate_groups([record["content"] for record in records], settings.MEMORY_DEDUP_THRESHOLD)
+        if not groups:
+            return None
+
+        merged, dropped = {}, set()
+        for group in groups:
+            merged[group[0]] = merge_records([records[i] for i in group])
+            dropped.update(group[1:])
+        keep = [i for i in range(len(records)) if i not in dropped]
+
+        # Merged-away content stays "seen" so re-ingesting it is still skipped
+        retired = {records[i].get("hash") or content_hash(records[i]["content"]) for i in dropped}
+        hashes = {*self.store.retired_hashes(user_id), *retired}
+        survivors = []
+        for i in keep:
+            record = merged.get(i, records[i])
+            record["hash"] = record.get("hash") or content_hash(record["content"])
+            hashes.add(record["hash"])
+            survivors.append(record)
+
+        positions = self.store.vector_positions(user_id)
+        staging = self.store.prepare_rewrite(user_id, survivors, lambda j: positions.get(record_ids[keep[j]]), retired)
+        return staging, hashes
+
+    async def compact_all(self) -> List[Dict[str, Any]]:
+        """
+        Compact every user who saved memories since their last compaction.
+        """
+        return [
+            await self.compact(user_id) for user_id in self.store.users()
+            if self.store.count(user_id) != self._compacted.get(user_id)
+        ]
+
+    async def run_compaction(self, interval: float):
+        """
+        Background job: compact every user's memories every `interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if not self.writable:
+                continue
+            try:
+                await self.compact_all()
+            except Exception as e:
+                logger.error(f"Memory compaction failed: {e}")
+
+    async def sync(self):
+        """
+        Multi-worker mode: the writer applies writes spooled by other workers;
+        a reader reloads users the writer has changed, and takes over as
+        writer if the previous one has gone away.
+        """
+        if self.shared is None:
+            return
+        if self.shared.try_become_writer() and self.store.read_only:
+            async with self._write_lock:
+                await asyncio.to_thread(self.store.make_writable)
+                for user_id in self.store.users():
+                    self._reset_user(user_id)
+        if not self.shared.is_writer:
+            for user_id, rewritten in (await asyncio.to_thread(self.shared.changed_users)).items():
+                async with self._write_lock:
+                    known = self.store.count(user_id)
+                    await asyncio.to_thread(self.store.reload, user_id)
+                    if rewritten or self.store.count(user_id) < known:
+                        self._reset_user(user_id)
+                    else:
+                        await self._catch_up_user(user_id, known)
+            return
+
+        for path, user_id, records, vectors in await asyncio.to_thread(lambda: list(self.shared.pending())):
+            await self._ensure_hashes(user_id)
+            async with self._write_lock:
+                hashes = self._hashes[user_id]
+                fresh = [(record, vector) for record, vector in zip(records, vectors) if record["hash"] not in hashes]
+                await self._append(user_id, [record for record, _ in fresh], [normalize(vector) for _, vector in fresh])
+                hashes.update(record["hash"] for record, _ in fresh)
+            os.remove(path)
+        self._maintain_index()
+
+    async def _catch_up_user(self, user_id: str, start: int):
+        """
+        Index records from `start` on after the writer appended them, keeping
+        what is already indexed for the user. Caller holds the write lock.
+        """
+        self.index.reattach(user_id, *self.store.vectors(user_id))
+        if self.lexical.has_user(user_id):
+            for record_id, content in await asyncio.to_thread(list, self._contents(user_id, start)):
+                self.lexical.add(user_id, record_id, content)
+        if user_id in self._hashes:
+            self._hashes[user_id].update(await asyncio.to_thread(self.store.hashes, user_id, start))
+
+    def _reset_user(self, user_id: str):
+        """
+        Point the user's indexes at the store's current files.
+        """
+        self.index.drop(user_id)
+        self.index.attach(user_id, *self.store.vectors(user_id))
+        self._epochs[user_id] = self._epochs.get(user_id, 0) + 1
+        rebuild = self.lexical.has_user(user_id)
+        self.lexical.drop(user_id)
+        self._hashes.pop(user_id, None)
+        if rebuild:
+            self._schedule_lexical(user_id)
+
+    async def run_sync(self, interval: float):
+        """
+        Background job: call `sync` every `interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Memory worker sync failed: {e}")
+
+    def _maintain_index(self):
+        """
+        (Re)build ANN indexes for partitions that crossed the size threshold,
+        in the background so requests keep using the previous index.
+        """
+        if self._index_task is not None and not self._index_task.done():
+            return
+        stale = self.index.stale_partitions()
+        if stale:
+            self._index_task = asyncio.create_task(self._rebuild_ann(stale))
+
+    async def _rebuild_ann(self, user_ids: List[str]):
+        for user_id in user_ids:
+            try:
+                ann = await asyncio.to_thread(self.index.build_ann, user_id)
+                if ann is not None:
+                    self.index.install_ann(user_id, ann)
+            except Exception as e:
+                logger.error(f"ANN index build failed for user {user_id}: {e}")
+
+
+_shared_memory: Optional[LongTermMemory] = None
+
+def get_long_term_memory() -> LongTermMemory:
+    """
+    Return the process-wide LongTermMemory, loading it on first use.
+    """
+    global _shared_memory
+    if _shared_memory is None:
+        _shared_memory = LongTermMemory()
+    return _shared_memory
+
+
+async def close_long_term_memory():
+    """
+    Flush the embedding cache of the process-wide LongTermMemory, if any.
+    """
+    global _shared_memory
+    if _shared_memory is not None:
+        await _shared_memory.close()
+        _shared_memory = None
@@ -1,32 +1,47 @@
 from typing import List, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
-from backend.memory.short_term import ShortTermMemory
-from backend.memory.long_term import LongTermMemory
+from backend.memory.short_term import get_short_term_memory
+from backend.memory.long_term import get_long_term_memory
 from backend.memory.profile import ProfileMemory
-from backend.memory.extractor import MemoryExtractor
+from backend.memory.extractor import get_memory_extractor
+from backend.memory.context import ContextAssembler, RequestContext
+from backend.config.settings import settings
 
 class MemoryController:
     def __init__(self, db: AsyncSession):
-        self.short_term = ShortTermMemory()
-        self.long_term = LongTermMemory()
+        self.short_term = get_short_term_memory()
+        self.long_term = get_long_term_memory()
         self.profile = ProfileMemory(db)
-        # self.extractor = MemoryExtractor(...) 
+        self.extractor = get_memory_extractor() if settings.SUMMARY_ENABLED else None
 
-    async def get_context(self, user_id: int, session_id: str, query: str) -> str:
-        """
-        Aggregates context from all memory sources.
-        """
-        # 1. Get recent history
-        history = await self.short_term.get_history(session_id)
-        
-        # 2. Get relevant long-term memories
-        relevant_memories = await self.long_term.search(str(user_id), query)
-        
-        # 3. Get profile/preferences
-        prefs = await self.profile.get_preferences(user_id)
-        
-        context = f"User Persona: {prefs.persona_name}\n"
-        context += "Relevant Memories:\n" + "\n".join(relevant_memories) + "\n"
-        context += "Recent Conversation:\n" + "\n".join([f"{m['role']}: {m['content']}" for m in history])
-        
-        return context
+    async def assemble_context(self, user_id: int, session_id: str, query: str) -> RequestContext:
+        """
+        Memories, history and preferences for one request, fetched concurrently.
+        """
+        return await ContextAssembler(self, user_id, session_id, query).assemble()
+
+    async def get_history(self, session_id: str, limit: int = 10) -> List[Dict[str, str]]:
+        """
+        Recent turns, preceded by the running summary of older ones if any.
+        """
+        summary, history = await self.short_term.get_conversation(session_id, limit)
+        if summary:
+            history = [{"role": "system", "content": f"Summary of the earlier conversation: {summary}"}] + history
+        return history
+
+    async def save_turn(self, session_id: str, user_input: str, reply: str):
+        """
+        Store a user turn and its reply, then let the summarizer fold older
+        turns in the background once the session grows long.
+        """
+        await self.short_term.add_messages(session_id, [("user", user_input), ("assistant", reply)])
+        if self.extractor is not None:
+            self.extractor.schedule_summary(session_id)
+
+    async def get_context(self, user_id: int, session_id: str, query: str) -> List[str]:
+        """
+        Relevant long-term memories for the query, best first. The persona is
+        part of the system prompt and history is sent as messages, so neither
+        is repeated here; the orchestrator trims this list to its token budget.
+        """
+        return await self.long_term.search(str(user_id), query, limit=settings.PROMPT_MEMORY_CANDIDATES)
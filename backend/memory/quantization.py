@@ -0,0 +1,81 @@
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+# Storage dtype name -> (numpy dtype, file suffix)
+VECTOR_DTYPES = {
+    "float32": (np.float32, "f32"),
+    "float16": (np.float16, "f16"),
+    "int8": (np.int8, "i8"),
+}
+
+BLOCK_ROWS = 65536
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Convert float rows to the storage dtype. int8 uses a symmetric per-row
+    scale, returned alongside the codes; float dtypes return no scales.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "int8":
+        peak = np.abs(vectors).max(axis=-1, keepdims=True)
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+        return codes, scales[..., 0]
+    return vectors.astype(VECTOR_DTYPES[dtype][0]), None
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    vectors = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales, dtype=np.float32)[..., None]
+    return vectors
+
+
+def score(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+    """
+    Dot products of quantized rows with a float32 query. Work is done in
+    blocks so the float32 upcast never materializes the whole matrix.
+    """
+    if codes.dtype == np.float32:
+        return codes @ query
+
+    out = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), BLOCK_ROWS):
+        block = np.asarray(codes[start:start + BLOCK_ROWS], dtype=np.float32)
+        out[start:start + len(block)] = block @ query
+    if scales is not None:
+        out *= scales
+    return out
+
+
+def quantization_report(vectors: np.ndarray, queries: np.ndarray, k: int = 10, rerank: int = 4) -> List[Dict[str, Any]]:
+    """
+    Measure bytes per vector and recall@k against exact float32 search for
+    each storage dtype, with and without exact re-ranking of the top
+    `rerank * k` candidates. `vectors` and `queries` must be unit-norm.
+    """
+    from backend.memory.vector_index import top_k
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    ids = np.arange(len(vectors))
+    exact = [{i for i, _ in top_k(vectors @ q, ids, k)} for q in queries]
+
+    report = []
+    for dtype in VECTOR_DTYPES:
+        codes, scales = quantize(vectors, dtype)
+        nbytes = codes.nbytes + (scales.nbytes if scales is not None else 0)
+        row = {"dtype": dtype, "bytes_per_vector": nbytes / len(vectors), "memory_saved": 1 - nbytes / vectors.nbytes}
+
+        for label, depth in (("recall", k), ("recall_reranked", k * rerank)):
+            hits = 0
+            for q, truth in zip(queries, exact):
+                candidates = np.array([i for i, _ in top_k(score(codes, scales, q), ids, depth)])
+                if depth > k:
+                    found = {int(candidates[i]) for i, _ in top_k(vectors[candidates] @ q, np.arange(len(candidates)), k)}
+                else:
+                    found = set(candidates.tolist())
+                hits += len(found & truth)
+            row[label] = hits / (k * len(queries))
+        report.append(row)
+    return report
@@ -0,0 +1,126 @@
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from backend.utils.logger import logger
+from backend.memory.store import INBOX_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LOCK_FILE = ".writer.lock"
+GENERATIONS_FILE = "generations.json"
+
+
+class WorkerCoordinator:
+    """
+    Lets several worker processes share one memory store directory.
+
+    Exactly one process (whoever holds an exclusive lock on `.writer.lock`)
+    writes to the store. Other workers map the same files read-only, so the
+    OS page cache holds one copy of the vectors for all of them, and hand
+    their writes to the writer through spool files in `.inbox/`. After each
+    write the writer bumps the user's generation in `generations.json`,
+    along with a rewrite counter when the files were replaced rather than
+    appended to; readers poll that file and reload the users whose
+    generation moved.
+    If the writer exits, the lock is released and the next reader to poll
+    takes over.
+    """
+
+    def __init__(self, root: str):
+        if fcntl is None:
+            raise RuntimeError("Shared memory index requires fcntl (POSIX).")
+        self.root = root
+        self.inbox = os.path.join(root, INBOX_DIR)
+        os.makedirs(self.inbox, exist_ok=True)
+        self._lock_file = open(os.path.join(root, LOCK_FILE), "a")
+        self.is_writer = False
+        # user -> [generation, rewrites]
+        self.generations: Dict[str, List[int]] = {}
+        self.try_become_writer()
+        self.generations = self._read_generations()
+
+    def try_become_writer(self) -> bool:
+        if self.is_writer:
+            return True
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self.is_writer = True
+        logger.info(f"Process {os.getpid()} is the memory store writer.")
+        return True
+
+    def _generations_path(self) -> str:
+        return os.path.join(self.root, GENERATIONS_FILE)
+
+    def _read_generations(self) -> Dict[str, List[int]]:
+        try:
+            with open(self._generations_path(), "r") as f:
+                generations = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Files written before rewrites were tracked hold bare generations
+        return {user_id: value if isinstance(value, list) else [value, 0] for user_id, value in generations.items()}
+
+    def publish(self, user_ids: List[str], rewritten: bool = False):
+        """
+        Writer: bump the generation of users whose files changed, and their
+        rewrite counter if the files were replaced (e.g. by compaction)
+        rather than appended to.
+        """
+        for user_id in user_ids:
+            generation, rewrites = self.generations.get(user_id, [0, 0])
+            self.generations[user_id] = [generation + 1, rewrites + int(rewritten)]
+        tmp = f"{self._generations_path()}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.generations, f)
+        os.replace(tmp, self._generations_path())
+
+    def changed_users(self) -> Dict[str, bool]:
+        """
+        Reader: users whose generation moved since the last call, mapped to
+        whether their files were rewritten meanwhile. Users that were only
+        appended to keep their existing record ids.
+        """
+        latest = self._read_generations()
+        changed = {}
+        for user_id, (generation, rewrites) in latest.items():
+            known = self.generations.get(user_id)
+            if known is None or known[0] != generation:
+                changed[user_id] = known is None or known[1] != rewrites
+        self.generations = latest
+        return changed
+
+    def submit(self, user_id: str, records: List[Dict[str, Any]], vectors: List[Optional[List[float]]]):
+        """
+        Reader: spool records (and their normalized vectors) for the writer.
+        The file only appears under its final name once fully written.
+        """
+        name = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+        tmp = os.path.join(self.inbox, name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"user_id": user_id, "records": records, "vectors": vectors}, f)
+        os.replace(tmp, os.path.join(self.inbox, name))
+
+    def pending(self) -> Iterator[Tuple[str, str, List[Dict[str, Any]], List[Optional[List[float]]]]]:
+        """
+        Writer: yield (path, user_id, records, vectors) for spooled writes,
+        oldest first. The caller deletes each file once it is applied.
+        """
+        for name in sorted(os.listdir(self.inbox)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.inbox, name)
+            try:
+                with open(path, "r") as f:
+                    spooled = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Discarding unreadable spooled memory write {path}: {e}")
+                os.remove(path)
+                continue
+            yield path, str(spooled["user_id"]), spooled["records"], spooled["vectors"]
@@ -1,30 +1,314 @@
 import json
-from typing import List, Dict
+import sys
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from backend.config.settings import settings
+from backend.utils.logger import logger
+
+
+class _Session:
+    __slots__ = ("messages", "summary", "last_access", "nbytes")
+
+    def __init__(self, max_messages: int):
+        self.messages: Deque[Dict[str, str]] = deque(maxlen=max_messages)
+        self.summary: Optional[str] = None
+        self.last_access = time.monotonic()
+        self.nbytes = 0
+
+
+def _message_size(message: Dict[str, str]) -> int:
+    return sys.getsizeof(message) + sys.getsizeof(message["content"])
+
+
+class SessionStore:
+    """
+    Process-wide conversation history, bounded in every direction: each
+    session is a ring buffer of the last `max_messages` messages, at most
+    `max_sessions` sessions are kept (least recently used evicted first),
+    and sessions idle for longer than `ttl` seconds expire.
+    """
+
+    def __init__(self, max_sessions: int = 10000, max_messages: int = 50, ttl: float = 3600):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.nbytes = 0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self, now: float):
+        # Sessions are ordered by last access, so expired ones are at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access < self.ttl:
+                break
+            self._drop(session_id)
+            self.evicted_ttl += 1
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self.nbytes -= session.nbytes
+
+    def _touch(self, session_id: str, create: bool) -> Optional[_Session]:
+        now = time.monotonic()
+        self._expire(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            while len(self._sessions) >= self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+                self.evicted_lru += 1
+            session = self._sessions[session_id] = _Session(self.max_messages)
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_access = now
+        return session
+
+    def append(self, session_id: str, message: Dict[str, str]):
+        session = self._touch(session_id, create=True)
+        size = _message_size(message)
+        if len(session.messages) == session.messages.maxlen:
+            # The deque drops its oldest message on append
+            dropped = _message_size(session.messages[0])
+            session.nbytes -= dropped
+            self.nbytes -= dropped
+        session.messages.append(message)
+        session.nbytes += size
+        self.nbytes += size
+
+    def history(self, session_id: str, limit: int) -> List[Dict[str, str]]:
+        session = self._touch(session_id, create=False)
+        if session is None or limit <= 0:
+            return []
+        messages = session.messages
+        return list(islice(messages, max(0, len(messages) - limit), None))
+
+    def summary(self, session_id: str) -> Optional[str]:
+        session = self._sessions.get(session_id)
+        return session.summary if session is not None else None
+
+    def length(self, session_id: str) -> int:
+        session = self._sessions.get(session_id)
+        return len(session.messages) if session is not None else 0
+
+    def fold(self, session_id: str, count: int, summary: str, head: Optional[List[Dict[str, str]]] = None) -> bool:
+        """
+        Replace the `count` oldest messages with a summary of them. With
+        `head`, only if the oldest messages are still those; returns whether
+        the session was folded.
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            return False
+        if head is not None and list(islice(session.messages, len(head))) != head:
+            return False
+        for _ in range(min(count, len(session.messages))):
+            dropped = _message_size(session.messages.popleft())
+            session.nbytes -= dropped
+            self.nbytes -= dropped
+        size = sys.getsizeof(summary) - (sys.getsizeof(session.summary) if session.summary is not None else 0)
+        session.summary = summary
+        session.nbytes += size
+        self.nbytes += size
+        return True
+
+    def clear(self, session_id: str):
+        if session_id in self._sessions:
+            self._drop(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire(time.monotonic())
+        return {
+            "sessions": len(self._sessions),
+            "messages": sum(len(session.messages) for session in self._sessions.values()),
+            "bytes": self.nbytes,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl
+        }
+
+
+_session_store: Optional[SessionStore] = None
+
+def get_session_store() -> SessionStore:
+    """
+    Return the process-wide SessionStore, creating it on first use.
+    """
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore(
+            max_sessions=settings.SHORT_TERM_MAX_SESSIONS,
+            max_messages=settings.SHORT_TERM_MAX_MESSAGES,
+            ttl=settings.SHORT_TERM_SESSION_TTL
+        )
+        logger.info("ShortTermMemory: Using in-memory session store (no Redis)")
+    return _session_store
+
 
 class ShortTermMemory:
     """In-memory short-term conversation storage (no Redis required)"""
-    
-    def __init__(self):
-        self._memory_store = {}  # session_id -> list of messages
-        print("ShortTermMemory: Using in-memory storage (no Redis)")
+
+    def __init__(self, store: SessionStore = None):
+        # Shared by every request in the process unless a store is given
+        self._memory_store = store if store is not None else get_session_store()
 
     async def add_message(self, session_id: str, role: str, content: str):
-        message = {"role": role, "content": content}
-        
-        if session_id not in self._memory_store:
-            self._memory_store[session_id] = []
-        
-        self._memory_store[session_id].append(message)
-        
-        # Keep only last 50 messages per session
-        if len(self._memory_store[session_id]) > 50:
-            self._memory_store[session_id] = self._memory_store[session_id][-50:]
+        self._memory_store.append(session_id, {"role": role, "content": content})
+
+    async def add_messages(self, session_id: str, messages: List[Tuple[str, str]]):
+        for role, content in messages:
+            self._memory_store.append(session_id, {"role": role, "content": content})
+
+    async def get_history(self, session_id: str, limit: int = 10) -> List[Dict[str, str]]:
+        return self._memory_store.history(session_id, limit)
+
+    async def get_conversation(self, session_id: str, limit: int = 10) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """
+        Running summary of folded turns (if any) and the last `limit` messages.
+        """
+        return self._memory_store.summary(session_id), self._memory_store.history(session_id, limit)
+
+    async def length(self, session_id: str) -> int:
+        return self._memory_store.length(session_id)
+
+    async def fold(self, session_id: str, count: int, summary: str, head: Optional[List[Dict[str, str]]] = None) -> bool:
+        return self._memory_store.fold(session_id, count, summary, head)
+
+    async def clear(self, session_id: str):
+        self._memory_store.clear(session_id)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", **self._memory_store.stats()}
+
+
+class RedisShortTermMemory:
+    """
+    Short-term conversation storage in Redis, shared by every worker and
+    node. Each session is a list trimmed to the last `max_messages` entries
+    and expiring after `ttl` idle seconds; every call is a single pipelined
+    round trip. Eviction across sessions is left to Redis' maxmemory policy.
+    """
+
+    def __init__(self, client=None, prefix: str = "session:", max_messages: int = 50, ttl: int = 3600):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.Redis.from_url(settings.REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.round_trips = 0
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def _summary_key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}:summary"
+
+    async def add_message(self, session_id: str, role: str, content: str):
+        await self.add_messages(session_id, [(role, content)])
+
+    async def add_messages(self, session_id: str, messages: List[Tuple[str, str]]):
+        """
+        Append several messages (e.g. a user turn and its reply) atomically.
+        """
+        if not messages:
+            return
+        key = self._key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *[json.dumps({"role": role, "content": content}) for role, content in messages])
+            pipe.ltrim(key, -self.max_messages, -1)
+            pipe.expire(key, self.ttl)
+            pipe.expire(self._summary_key(session_id), self.ttl)
+            await pipe.execute()
+        self.round_trips += 1
 
     async def get_history(self, session_id: str, limit: int = 10) -> List[Dict[str, str]]:
-        messages = self._memory_store.get(session_id, [])
-        return messages[-limit:] if messages else []
+        if limit <= 0:
+            return []
+        key = self._key(session_id)
+        # Reading a session also counts as activity for its TTL
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.lrange(key, -limit, -1)
+            pipe.expire(key, self.ttl)
+            messages, _ = await pipe.execute()
+        self.round_trips += 1
+        return [json.loads(message) for message in messages]
+
+    async def get_conversation(self, session_id: str, limit: int = 10) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        key, summary_key = self._key(session_id), self._summary_key(session_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(summary_key)
+            pipe.lrange(key, -max(limit, 1), -1)
+            pipe.expire(key, self.ttl)
+            pipe.expire(summary_key, self.ttl)
+            summary, messages, _, _ = await pipe.execute()
+        self.round_trips += 1
+        summary = summary.decode("utf-8") if isinstance(summary, bytes) else summary
+        return summary, [json.loads(message) for message in messages] if limit > 0 else []
+
+    async def length(self, session_id: str) -> int:
+        self.round_trips += 1
+        return await self.client.llen(self._key(session_id))
+
+    async def fold(self, session_id: str, count: int, summary: str, head: Optional[List[Dict[str, str]]] = None) -> bool:
+        """
+        Replace the `count` oldest messages with a summary of them. With
+        `head`, only if the oldest messages are still those when the trim
+        runs (checked under WATCH); returns whether the session was folded.
+        """
+        from redis.exceptions import WatchError
+
+        key = self._key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            try:
+                if head is not None:
+                    await pipe.watch(key)
+                    current = await pipe.lrange(key, 0, len(head) - 1)
+                    self.round_trips += 2
+                    if [json.loads(message) for message in current] != head:
+                        return False
+                    pipe.multi()
+                pipe.ltrim(key, count, -1)
+                pipe.set(self._summary_key(session_id), summary, ex=self.ttl)
+                await pipe.execute()
+                self.round_trips += 1
+            except WatchError:
+                self.round_trips += 1
+                return False
+        return True
 
     async def clear(self, session_id: str):
-        if session_id in self._memory_store:
-            del self._memory_store[session_id]
+        await self.client.delete(self._key(session_id), self._summary_key(session_id))
+        self.round_trips += 1
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "round_trips": self.round_trips}
+
+
+_short_term: Optional[Any] = None
 
+def get_short_term_memory():
+    """
+    Return the process-wide short-term memory for `SHORT_TERM_BACKEND`
+    ("memory" or "redis").
+    """
+    global _short_term
+    if _short_term is None:
+        if settings.SHORT_TERM_BACKEND == "redis":
+            _short_term = RedisShortTermMemory(
+                max_messages=settings.SHORT_TERM_MAX_MESSAGES,
+                ttl=settings.SHORT_TERM_SESSION_TTL
+            )
+            logger.info("ShortTermMemory: Using Redis")
+        elif settings.SHORT_TERM_BACKEND == "memory":
+            _short_term = ShortTermMemory()
+        else:
+            raise ValueError(f"Unknown short-term memory backend: {settings.SHORT_TERM_BACKEND}")
+    return _short_term
@@ -0,0 +1,554 @@
+import json
+import os
+import shutil
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+import numpy as np
+from backend.utils.logger import logger
+from backend.memory.vector_index import normalize
+from backend.memory.compaction import content_hash
+from backend.memory.quantization import BLOCK_ROWS, VECTOR_DTYPES, quantize
+
+RECORDS_FILE = "records.jsonl"
+OFFSETS_FILE = "offsets.i64"
+VECTORS_FILE = "vectors.f32"
+SCALES_FILE = "scales.f32"
+ROWS_FILE = "rows.i64"
+# sha256 content digest of each record, and of records merged away by compaction
+HASHES_FILE = "hashes.sha256"
+RETIRED_FILE = "retired.sha256"
+DIGEST_BYTES = 32
+META_FILE = "meta.json"
+# Spool directory for writes handed over by read-only workers (see shared.py)
+INBOX_DIR = ".inbox"
+
+
+def _map(path: str, dtype, width: int = 1) -> np.ndarray:
+    """
+    Memory-map a fixed-width binary file read-only. Missing or empty files
+    map to an empty array (np.memmap refuses zero-length files).
+    """
+    itemsize = np.dtype(dtype).itemsize * width
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    count = size // itemsize
+    if count == 0:
+        shape = (0, width) if width > 1 else (0,)
+        return np.empty(shape, dtype=dtype)
+    shape = (count, width) if width > 1 else (count,)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _rows_in(path: str, row_bytes: int) -> int:
+    return os.path.getsize(path) // row_bytes if row_bytes and os.path.exists(path) else 0
+
+
+def _truncate(path: str, size: int):
+    if os.path.exists(path) and os.path.getsize(path) != size:
+        logger.warning(f"Truncating torn tail of {path}")
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+
+def _hex_digests(rows: np.ndarray) -> List[str]:
+    text = rows.tobytes().hex()
+    width = 2 * DIGEST_BYTES
+    return [text[i:i + width] for i in range(0, len(text), width)]
+
+
+class _UserLog:
+    """
+    Files backing one user's partition of the store.
+
+    `vectors.f32` holds the full-precision rows. When a smaller vector dtype
+    is configured, a quantized copy (plus per-row scales for int8) is kept
+    next to it; that copy is what gets mapped for scoring, while the float32
+    file is only touched to re-rank candidates.
+
+    `hashes.sha256` holds each record's content digest, so de-duplication
+    never has to parse the record log; logs written before it existed are
+    backfilled when opened for writing.
+
+    A read-only log never modifies its files; it only exposes the records
+    and vectors that were committed when it was opened, so another process
+    may be appending to them. The record log is read through a handle held
+    open from then on, which keeps working if the directory is swapped out
+    by a rewrite.
+    """
+
+    def __init__(self, path: str, vector_dtype: str = "float32", read_only: bool = False):
+        self.path = path
+        self.vector_dtype = vector_dtype
+        self.read_only = read_only
+        self.dim: Optional[int] = None
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                self.dim = json.load(f).get("dim")
+
+        self.offsets = _map(self._file(OFFSETS_FILE), np.int64)
+        self.count = len(self.offsets)
+        self.n_vectors = 0
+        self._records = None
+        self._read_lock = threading.Lock()
+        self._repair()
+
+        self._open_records()
+        self._exact = _map(self._file(VECTORS_FILE), np.float32, self.dim) if self.dim else None
+
+    def _open_records(self):
+        if self._records is None and os.path.exists(self._file(RECORDS_FILE)):
+            self._records = open(self._file(RECORDS_FILE), "rb")
+
+    def close(self):
+        if self._records is not None:
+            self._records.close()
+            self._records = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @property
+    def quantized(self) -> bool:
+        return self.vector_dtype != "float32"
+
+    def _codes_file(self) -> str:
+        return self._file(f"vectors.{VECTOR_DTYPES[self.vector_dtype][1]}")
+
+    def _codes_row_bytes(self) -> int:
+        return np.dtype(VECTOR_DTYPES[self.vector_dtype][0]).itemsize * (self.dim or 0)
+
+    def _repair(self):
+        """
+        Drop any partially written tail left by an interrupted append so every
+        vector row points at a committed record, then bring the quantized copy
+        in line with the float32 rows.
+        """
+        rows_path, vectors_path = self._file(ROWS_FILE), self._file(VECTORS_FILE)
+        n_rows = _rows_in(rows_path, 8)
+        n_vectors = _rows_in(vectors_path, 4 * (self.dim or 0))
+
+        rows = _map(rows_path, np.int64)
+        n_valid = min(n_rows, n_vectors)
+        if self.read_only and self.quantized and self.dim:
+            # Another process may still be writing the quantized copy
+            n_valid = min(n_valid, _rows_in(self._codes_file(), self._codes_row_bytes()))
+            if self.vector_dtype == "int8":
+                n_valid = min(n_valid, _rows_in(self._file(SCALES_FILE), 4))
+        while n_valid > 0 and rows[n_valid - 1] >= self.count:
+            n_valid -= 1
+        del rows
+
+        self.n_vectors = n_valid
+        if self.read_only:
+            return
+        _truncate(rows_path, n_valid * 8)
+        _truncate(vectors_path, n_valid * 4 * (self.dim or 0))
+        if self.quantized and self.dim:
+            self._sync_codes(n_valid)
+        self._sync_hashes()
+
+    def _sync_hashes(self):
+        hashes_path = self._file(HASHES_FILE)
+        n_hashes = min(self.count, _rows_in(hashes_path, DIGEST_BYTES))
+        _truncate(hashes_path, n_hashes * DIGEST_BYTES)
+        if n_hashes == self.count:
+            return
+
+        logger.info(f"Hashing {self.count - n_hashes} records in {self.path}")
+        self._open_records()
+        with open(hashes_path, "ab") as f:
+            for _, record in self.scan(n_hashes):
+                f.write(bytes.fromhex(record.get("hash") or content_hash(record["content"])))
+
+    def _sync_codes(self, n_valid: int):
+        codes_path, scales_path = self._codes_file(), self._file(SCALES_FILE)
+        n_codes = min(n_valid, _rows_in(codes_path, self._codes_row_bytes()))
+        if self.vector_dtype == "int8":
+            n_codes = min(n_codes, _rows_in(scales_path, 4))
+            _truncate(scales_path, n_codes * 4)
+        _truncate(codes_path, n_codes * self._codes_row_bytes())
+        if n_codes == n_valid:
+            return
+
+        # Quantize rows missing from the copy (e.g. after switching dtype)
+        logger.info(f"Quantizing {n_valid - n_codes} vectors in {self.path} to {self.vector_dtype}")
+        source = _map(self._file(VECTORS_FILE), np.float32, self.dim)
+        for start in range(n_codes, n_valid, BLOCK_ROWS):
+            self._append_codes(source[start:min(start + BLOCK_ROWS, n_valid)])
+
+    def _append_codes(self, vectors: np.ndarray):
+        codes, scales = quantize(vectors, self.vector_dtype)
+        with open(self._codes_file(), "ab") as f:
+            f.write(codes.tobytes())
+        if scales is not None:
+            with open(self._file(SCALES_FILE), "ab") as f:
+                f.write(scales.tobytes())
+
+    def vectors(self) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+        """
+        Return the mapped (scoring codes, int8 scales or None, record ids).
+        """
+        if not self.dim:
+            return np.empty((0, 0), dtype=np.float32), None, np.empty(0, dtype=np.int64)
+        n = self.n_vectors
+        rows = _map(self._file(ROWS_FILE), np.int64)[:n]
+        if not self.quantized:
+            return _map(self._file(VECTORS_FILE), np.float32, self.dim)[:n], None, rows
+        dtype = VECTOR_DTYPES[self.vector_dtype][0]
+        scales = _map(self._file(SCALES_FILE), np.float32)[:n] if self.vector_dtype == "int8" else None
+        return _map(self._codes_file(), dtype, self.dim)[:n], scales, rows
+
+    def exact_vectors(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Full-precision rows at the given vector positions.
+        """
+        # An append in another thread may drop the mapping meanwhile
+        exact = self._exact
+        if exact is None:
+            exact = self._exact = _map(self._file(VECTORS_FILE), np.float32, self.dim)
+        return np.asarray(exact[positions])
+
+    def hashes(self, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """
+        Content digests of the records with ids in [start, stop). Records
+        the digest file doesn't cover yet (a legacy log opened read-only)
+        are hashed from the log.
+        """
+        stop = self.count if stop is None else stop
+        stored = _map(self._file(HASHES_FILE), np.uint8, DIGEST_BYTES)[:stop]
+        digests = _hex_digests(stored[start:])
+        for _, record in self.scan(max(start, len(stored)), stop):
+            digests.append(record.get("hash") or content_hash(record["content"]))
+        return digests
+
+    def retired_hashes(self) -> List[str]:
+        return _hex_digests(_map(self._file(RETIRED_FILE), np.uint8, DIGEST_BYTES))
+
+    def retire(self, digests: Iterable[str]):
+        """
+        Keep digests of records that no longer exist, so their content
+        still counts as seen.
+        """
+        with open(self._file(RETIRED_FILE), "ab") as f:
+            f.write(b"".join(bytes.fromhex(digest) for digest in digests))
+
+    def append(self, records: List[Dict[str, Any]], vectors: List[Optional[np.ndarray]]) -> List[int]:
+        if self.read_only:
+            raise RuntimeError(f"Memory log {self.path} is read-only")
+        os.makedirs(self.path, exist_ok=True)
+        first = self.count
+        lines, offsets = [], []
+
+        with open(self._file(RECORDS_FILE), "ab") as f:
+            position = f.tell()
+            for record in records:
+                line = (json.dumps(record) + "\n").encode("utf-8")
+                offsets.append(position)
+                lines.append(line)
+                position += len(line)
+            f.write(b"".join(lines))
+
+        rows, blocks = [], []
+        for i, vec in enumerate(vectors):
+            if vec is None:
+                continue
+            if self.dim is None:
+                self.dim = len(vec)
+                with open(self._file(META_FILE), "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            if len(vec) != self.dim:
+                logger.warning(f"Not persisting embedding with dim {len(vec)} (store dim {self.dim}).")
+                continue
+            rows.append(first + i)
+            blocks.append(np.asarray(vec, dtype=np.float32))
+
+        # Vectors and digests are written before the offsets that commit their
+        # records, so a crash never leaves a committed record without them.
+        with open(self._file(HASHES_FILE), "ab") as f:
+            f.write(b"".join(bytes.fromhex(record.get("hash") or content_hash(record["content"])) for record in records))
+        if rows:
+            matrix = np.stack(blocks)
+            with open(self._file(VECTORS_FILE), "ab") as f:
+                f.write(matrix.tobytes())
+            if self.quantized:
+                self._append_codes(matrix)
+            with open(self._file(ROWS_FILE), "ab") as f:
+                f.write(np.asarray(rows, dtype=np.int64).tobytes())
+        with open(self._file(OFFSETS_FILE), "ab") as f:
+            f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+
+        self.count += len(records)
+        self.n_vectors += len(rows)
+        self._exact = None
+        self.offsets = _map(self._file(OFFSETS_FILE), np.int64)
+        self._open_records()
+        return list(range(first, self.count))
+
+    def get(self, record_id: int) -> Dict[str, Any]:
+        with self._read_lock:
+            self._records.seek(int(self.offsets[record_id]))
+            return json.loads(self._records.readline())
+
+    def scan(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        for record_id in range(start, self.count if stop is None else stop):
+            yield record_id, self.get(record_id)
+
+
+class MemoryStore:
+    """
+    Append-only on-disk storage for long-term memory.
+
+    Each user gets a directory holding a JSON-lines record log, a fixed-width
+    table of record offsets, and a binary file of unit-norm float32 embeddings
+    with the record id owning each row (plus an optional float16/int8 copy for
+    scoring). Binary files are memory-mapped on load, so opening the store
+    costs O(users) and each write costs O(1).
+
+    A `read_only` store leaves the files to a writer in another process and
+    picks up its changes through `reload`.
+    """
+
+    def __init__(self, root: str, vector_dtype: str = "float32", read_only: bool = False):
+        if vector_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {vector_dtype}")
+        self.root = root
+        self.vector_dtype = vector_dtype
+        self.read_only = read_only
+        os.makedirs(root, exist_ok=True)
+        self._users: Dict[str, _UserLog] = {}
+        self._open()
+
+    def _open(self):
+        if not self.read_only:
+            self._recover_rewrites()
+        for log in self._users.values():
+            log.close()
+        self._users = {}
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            # Skip staging/retired generations left behind by a crashed rewrite,
+            # and coordination files
+            if os.path.isdir(path) and name != INBOX_DIR and not name.endswith((".rewrite", ".old")):
+                self._users[unquote(name)] = _UserLog(path, self.vector_dtype, self.read_only)
+
+    def reload(self, user_id: str):
+        """
+        Re-open a user's files to see what another process wrote since.
+        """
+        old = self._users.pop(user_id, None)
+        if old is not None:
+            old.close()
+        path = os.path.join(self.root, quote(user_id, safe=""))
+        if os.path.isdir(path):
+            self._users[user_id] = _UserLog(path, self.vector_dtype, self.read_only)
+
+    def make_writable(self):
+        """
+        Take over as the writer: repair and re-open every user's files.
+        """
+        self.read_only = False
+        self._open()
+
+    def __len__(self) -> int:
+        return sum(log.count for log in self._users.values())
+
+    def _recover_rewrites(self):
+        """
+        Finish or roll back a rewrite interrupted by a crash: a retired
+        generation without a live one is restored, staging copies are dropped.
+        """
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".old"):
+                live = path[:-len(".old")]
+                if os.path.isdir(live):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.replace(path, live)
+            elif name.endswith(".rewrite"):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _log(self, user_id: str) -> _UserLog:
+        log = self._users.get(user_id)
+        if log is None:
+            log = self._users[user_id] = _UserLog(os.path.join(self.root, quote(user_id, safe="")), self.vector_dtype, self.read_only)
+        return log
+
+    def users(self) -> List[str]:
+        return list(self._users.keys())
+
+    def count(self, user_id: str) -> int:
+        log = self._users.get(user_id)
+        return log.count if log else 0
+
+    def vectors(self, user_id: str) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+        """
+        Return the user's memory-mapped (embedding codes, int8 scales, record ids).
+        """
+        return self._log(user_id).vectors()
+
+    def exact_vectors(self, user_id: str, positions: np.ndarray) -> np.ndarray:
+        return self._users[user_id].exact_vectors(positions)
+
+    def append(self, user_id: str, record: Dict[str, Any], vector: Optional[np.ndarray] = None) -> int:
+        return self.append_many(user_id, [record], [vector])[0]
+
+    def append_many(self, user_id: str, records: List[Dict[str, Any]], vectors: List[Optional[np.ndarray]]) -> List[int]:
+        """
+        Append records (and their normalized vectors) in one write per file.
+        Returns the assigned record ids.
+        """
+        if not records:
+            return []
+        return self._log(user_id).append(records, vectors)
+
+    def get(self, user_id: str, record_id: int) -> Dict[str, Any]:
+        return self._users[user_id].get(record_id)
+
+    def scan(self, user_id: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yield the user's (record_id, record) pairs with ids in [start, stop).
+        """
+        log = self._users.get(user_id)
+        if log is None:
+            return iter(())
+        return log.scan(start, stop)
+
+    def hashes(self, user_id: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """
+        Content digests of the user's records with ids in [start, stop).
+        """
+        log = self._users.get(user_id)
+        return log.hashes(start, stop) if log else []
+
+    def retired_hashes(self, user_id: str) -> List[str]:
+        """
+        Content digests of the user's records merged away by compaction.
+        """
+        log = self._users.get(user_id)
+        return log.retired_hashes() if log else []
+
+    def vector_positions(self, user_id: str) -> Dict[int, int]:
+        """
+        Map record id -> row in the user's vector file.
+        """
+        log = self._users.get(user_id)
+        if log is None or not log.dim:
+            return {}
+        rows = _map(log._file(ROWS_FILE), np.int64)
+        return {int(record_id): position for position, record_id in enumerate(rows)}
+
+    def size_on_disk(self, user_id: str) -> int:
+        log = self._users.get(user_id)
+        if log is None or not os.path.isdir(log.path):
+            return 0
+        return sum(os.path.getsize(os.path.join(log.path, name)) for name in os.listdir(log.path))
+
+    def prepare_rewrite(self, user_id: str, records: Iterable[Dict[str, Any]], vector_of: Callable[[int], Optional[int]], retired: Iterable[str] = (), block_size: int = 4096) -> str:
+        """
+        Write a fresh generation of the user's files next to the live ones
+        and return its path. `vector_of(i)` gives the live vector row to carry
+        over for the i-th record, or None; digests in `retired` are kept as
+        seen along with those already retired. Nothing is visible until
+        `install_rewrite`.
+        """
+        live = self._log(user_id)
+        staging = live.path + ".rewrite"
+        if os.path.isdir(staging):
+            shutil.rmtree(staging)
+        log = _UserLog(staging, self.vector_dtype)
+        self._carry_over(live, log, records, vector_of, block_size)
+        os.makedirs(staging, exist_ok=True)
+        log.retire([*live.retired_hashes(), *retired])
+        log.close()
+        return staging
+
+    def extend_rewrite(self, user_id: str, staging: str, start: int, block_size: int = 4096):
+        """
+        Copy the user's live records from `start` on, with their vectors, to
+        the end of a prepared generation, for records appended while it was
+        being written.
+        """
+        live = self._log(user_id)
+        positions = {}
+        if live.dim:
+            rows = _map(live._file(ROWS_FILE), np.int64)[:live.n_vectors]
+            # Vector rows are appended in record order
+            first = int(np.searchsorted(rows, start))
+            positions = {int(record_id): first + i for i, record_id in enumerate(rows[first:])}
+        log = _UserLog(staging, self.vector_dtype)
+        records = (record for _, record in live.scan(start))
+        self._carry_over(live, log, records, lambda i: positions.get(start + i), block_size)
+        log.close()
+
+    @staticmethod
+    def _carry_over(live: _UserLog, log: _UserLog, records: Iterable[Dict[str, Any]], vector_of: Callable[[int], Optional[int]], block_size: int):
+        """
+        Append records to `log`, each with the live vector row `vector_of(i)`
+        (or none), a block at a time.
+        """
+        def write(block: List[Dict[str, Any]], positions: List[Optional[int]]):
+            present = [p for p in positions if p is not None]
+            rows = iter(live.exact_vectors(np.asarray(present, dtype=np.int64))) if present else iter(())
+            log.append(block, [next(rows) if p is not None else None for p in positions])
+
+        block, positions = [], []
+        for i, record in enumerate(records):
+            block.append(record)
+            positions.append(vector_of(i))
+            if len(block) == block_size:
+                write(block, positions)
+                block, positions = [], []
+        if block:
+            write(block, positions)
+
+    def install_rewrite(self, user_id: str, staging: str):
+        """
+        Swap a prepared generation in place of the user's live files.
+        """
+        live = self._log(user_id).path
+        retired = live + ".old"
+        if os.path.isdir(retired):
+            shutil.rmtree(retired)
+        if os.path.isdir(live):
+            os.replace(live, retired)
+        os.replace(staging, live)
+        self._users.pop(user_id).close()
+        self._users[user_id] = _UserLog(live, self.vector_dtype)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    def migrate_json(self, legacy_file: str) -> int:
+        """
+        One-shot import of the legacy `local_memory.json` list. The file is
+        renamed afterwards so the migration never runs twice.
+        """
+        if not os.path.exists(legacy_file):
+            return 0
+        if len(self) > 0:
+            logger.warning(f"Store at {self.root} is not empty; skipping migration of {legacy_file}.")
+            return 0
+
+        try:
+            with open(legacy_file, "r") as f:
+                memories = json.load(f)
+        except Exception as e:
+            logger.error(f"Could not read legacy memory file {legacy_file}: {e}")
+            return 0
+
+        by_user: Dict[str, Tuple[List[Dict[str, Any]], List[Optional[np.ndarray]]]] = {}
+        for mem in memories:
+            records, vectors = by_user.setdefault(str(mem.get("user_id")), ([], []))
+            records.append({
+                "content": mem.get("content", ""),
+                "metadata": mem.get("metadata") or {},
+                "timestamp": mem.get("timestamp", 0)
+            })
+            vectors.append(normalize(mem.get("embedding")))
+
+        for user_id, (records, vectors) in by_user.items():
+            self.append_many(user_id, records, vectors)
+
+        os.replace(legacy_file, legacy_file + ".migrated")
+        logger.info(f"Migrated {len(memories)} memories from {legacy_file} to {self.root}.")
+        return len(memories)
@@ -0,0 +1,323 @@
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from backend.utils.logger import logger
+from backend.memory.ann import IVFIndex
+from backend.memory.quantization import VECTOR_DTYPES, dequantize, quantize, score
+
+
+class _Partition:
+    """
+    Pre-normalized embeddings for a single user, stored as float32, float16
+    or int8 codes with a per-row scale.
+    An optional read-only base segment (e.g. memory-mapped from disk) is
+    followed by an in-memory tail that rows are appended to in place;
+    the tail's capacity doubles when full. A row's position is its offset
+    across base + tail, which matches its row in the store's vector file.
+    """
+
+    def __init__(self, dim: int, dtype: str = "float32", base: Optional[np.ndarray] = None, base_scales: Optional[np.ndarray] = None, base_ids: Optional[np.ndarray] = None, capacity: int = 64):
+        self.dim = dim
+        self.dtype = dtype
+        np_dtype = VECTOR_DTYPES[dtype][0]
+        quantized_scales = dtype == "int8"
+        self.base = base if base is not None else np.empty((0, dim), dtype=np_dtype)
+        self.base_scales = base_scales if base_scales is not None or not quantized_scales else np.empty(0, dtype=np.float32)
+        self.base_ids = base_ids if base_ids is not None else np.empty(0, dtype=np.int64)
+        self.size = 0
+        self.matrix = np.empty((capacity, dim), dtype=np_dtype)
+        self.scales = np.empty(capacity, dtype=np.float32) if quantized_scales else None
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.ann: Optional[IVFIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.base_ids) + self.size
+
+    def append(self, row_id: int, vector: np.ndarray):
+        if self.size == len(self.ids):
+            capacity = len(self.ids) * 2
+            matrix = np.empty((capacity, self.dim), dtype=self.matrix.dtype)
+            matrix[:self.size] = self.matrix[:self.size]
+            ids = np.empty(capacity, dtype=np.int64)
+            ids[:self.size] = self.ids[:self.size]
+            if self.scales is not None:
+                scales = np.empty(capacity, dtype=np.float32)
+                scales[:self.size] = self.scales[:self.size]
+                self.scales = scales
+            self.matrix, self.ids = matrix, ids
+
+        # Write the row before publishing it by bumping size
+        codes, scale = quantize(vector, self.dtype)
+        self.matrix[self.size] = codes
+        if scale is not None:
+            self.scales[self.size] = scale
+        self.ids[self.size] = row_id
+        self.size += 1
+        if self.ann is not None:
+            self.ann.add(len(self) - 1, vector)
+
+    def _tail_scales(self, size: int) -> Optional[np.ndarray]:
+        return self.scales[:size] if self.scales is not None else None
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        Scores for every position, in position order.
+        """
+        size = self.size
+        tail_scores = score(self.matrix[:size], self._tail_scales(size), query)
+        if len(self.base_ids) == 0:
+            return tail_scores
+        base_scores = score(self.base, self.base_scales, query)
+        if size == 0:
+            return base_scores
+        return np.concatenate([base_scores, tail_scores])
+
+    def ids_at(self, positions: np.ndarray) -> np.ndarray:
+        n_base = len(self.base_ids)
+        in_base = positions < n_base
+        ids = np.empty(len(positions), dtype=np.int64)
+        ids[in_base] = self.base_ids[positions[in_base]]
+        ids[~in_base] = self.ids[positions[~in_base] - n_base]
+        return ids
+
+    def rows(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Gather (dequantized) vectors at positions across the base and tail.
+        """
+        n_base = len(self.base_ids)
+        in_base = positions < n_base
+        base_pos, tail_pos = positions[in_base], positions[~in_base] - n_base
+        vectors = np.empty((len(positions), self.dim), dtype=np.float32)
+        vectors[in_base] = dequantize(self.base[base_pos], self.base_scales[base_pos] if self.base_scales is not None else None)
+        vectors[~in_base] = dequantize(self.matrix[tail_pos], self.scales[tail_pos] if self.scales is not None else None)
+        return vectors
+
+    def block(self, start: int, stop: int) -> np.ndarray:
+        """
+        Dequantized vectors for the contiguous positions [start, stop).
+        Only this block is upcast; float32 rows within one segment are
+        returned as a view.
+        """
+        n_base = len(self.base_ids)
+        parts = []
+        if start < n_base:
+            end = min(stop, n_base)
+            parts.append(dequantize(self.base[start:end], self.base_scales[start:end] if self.base_scales is not None else None))
+        if stop > n_base:
+            begin = max(start, n_base) - n_base
+            end = stop - n_base
+            parts.append(dequantize(self.matrix[begin:end], self.scales[begin:end] if self.scales is not None else None))
+        if not parts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+class _RowView:
+    """
+    Read-only float32 view of a partition's first `size` rows. Rows are
+    gathered only when sliced or indexed, so an index can be built block
+    by block without copying the whole partition into memory.
+    """
+
+    def __init__(self, partition: _Partition, size: int):
+        self.partition = partition
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, key) -> np.ndarray:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step == 1:
+                return self.partition.block(start, max(start, stop))
+            positions = np.arange(start, stop, step)
+        else:
+            positions = np.asarray(key, dtype=np.int64)
+        return self.partition.rows(positions)
+
+
+def normalize(embedding: Sequence[float]) -> Optional[np.ndarray]:
+    """
+    Return the L2-normalized float32 vector, or None for empty/zero vectors.
+    """
+    if embedding is None or len(embedding) == 0:
+        return None
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    if norm == 0 or not np.isfinite(norm):
+        return None
+    return vec / norm
+
+
+def top_k(scores: np.ndarray, ids: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+    """
+    Select the `limit` best (id, score) pairs, highest score first.
+    Ties keep insertion order (lowest id first), like a stable sort.
+    """
+    if limit <= 0 or len(scores) == 0:
+        return []
+
+    if limit < len(scores):
+        # argpartition only guarantees the k-th element, so widen the candidate
+        # set to every row tied with it to keep tie-breaking deterministic.
+        kth = np.argpartition(-scores, limit - 1)[limit - 1]
+        candidates = np.flatnonzero(scores >= scores[kth])
+    else:
+        candidates = np.arange(len(scores))
+
+    order = np.lexsort((ids[candidates], -scores[candidates]))[:limit]
+    picked = candidates[order]
+    return [(int(ids[i]), float(scores[i])) for i in picked]
+
+
+class VectorIndex:
+    """
+    In-process similarity index partitioned by user.
+    Each user's embeddings live in contiguous matrices with unit-norm rows,
+    so a query is a matrix-vector product per segment.
+
+    With a float16/int8 `dtype`, scoring runs on the quantized rows. If an
+    `exact_source(user_id, positions)` callback is given, the best
+    `rerank_factor * limit` candidates are re-scored at full precision.
+
+    Partitions with at least `ann_min_rows` rows can additionally be served
+    from an IVF index when `ann_enabled` is set; smaller ones are always
+    searched exactly.
+    """
+
+    def __init__(self, dtype: str = "float32", exact_source: Optional[Callable[[str, np.ndarray], np.ndarray]] = None, rerank_factor: int = 4, ann_enabled: bool = False, ann_min_rows: int = 50000, ann_nlist: int = 0, ann_nprobe: int = 8, ann_rebuild_ratio: float = 0.5):
+        self._partitions: Dict[str, _Partition] = {}
+        self.dtype = dtype
+        self.exact_source = exact_source
+        self.rerank_factor = rerank_factor
+        self.ann_enabled = ann_enabled
+        self.ann_min_rows = ann_min_rows
+        self.ann_nlist = ann_nlist
+        self.ann_nprobe = ann_nprobe
+        self.ann_rebuild_ratio = ann_rebuild_ratio
+
+    def __len__(self) -> int:
+        return sum(len(p) for p in self._partitions.values())
+
+    def attach(self, user_id: str, matrix: np.ndarray, scales: Optional[np.ndarray], ids: np.ndarray):
+        """
+        Use an existing matrix of unit-norm rows in the index dtype (typically
+        memory-mapped) as the base of the user's partition without copying it.
+        """
+        if len(ids) == 0:
+            return
+        self._partitions[user_id] = _Partition(matrix.shape[1], self.dtype, matrix, scales, ids)
+
+    def reattach(self, user_id: str, matrix: np.ndarray, scales: Optional[np.ndarray], ids: np.ndarray):
+        """
+        Like `attach`, for a longer mapping of the same rows after another
+        process appended to them. The user's ANN index is kept and caught up
+        with the new rows instead of being rebuilt.
+        """
+        previous = self._partitions.get(user_id)
+        self.attach(user_id, matrix, scales, ids)
+        partition = self._partitions.get(user_id)
+        if previous is None or previous.ann is None or partition is None or previous.ann.size > len(partition):
+            return
+        self._catch_up(partition, previous.ann)
+        partition.ann = previous.ann
+
+    def drop(self, user_id: str):
+        self._partitions.pop(user_id, None)
+
+    def add(self, user_id: str, row_id: int, embedding: Sequence[float]) -> bool:
+        """
+        Index an embedding under `row_id`. Returns False if it was skipped.
+        """
+        vec = normalize(embedding)
+        if vec is None:
+            return False
+        return self.add_normalized(user_id, row_id, vec)
+
+    def add_normalized(self, user_id: str, row_id: int, vec: np.ndarray) -> bool:
+        partition = self._partitions.get(user_id)
+        if partition is None:
+            partition = self._partitions[user_id] = _Partition(len(vec), self.dtype)
+        elif len(vec) != partition.dim:
+            logger.warning(f"Skipping embedding with dim {len(vec)} for user {user_id} (index dim {partition.dim}).")
+            return False
+
+        partition.append(row_id, vec)
+        return True
+
+    def stale_partitions(self) -> List[str]:
+        """
+        Users whose partition needs an ANN index built or rebuilt.
+        """
+        if not self.ann_enabled:
+            return []
+        stale = []
+        for user_id, partition in self._partitions.items():
+            if len(partition) < self.ann_min_rows:
+                continue
+            ann = partition.ann
+            if ann is None or len(partition) - ann.trained_size > self.ann_rebuild_ratio * ann.trained_size:
+                stale.append(user_id)
+        return stale
+
+    def build_ann(self, user_id: str) -> Optional[IVFIndex]:
+        """
+        Train an IVF index over the user's current rows. Safe to run in a
+        worker thread; install the result with `install_ann`.
+        """
+        partition = self._partitions.get(user_id)
+        if partition is None:
+            return None
+        # Rows appended during the build are caught up by install_ann
+        return IVFIndex.build(_RowView(partition, len(partition)), nlist=self.ann_nlist, nprobe=self.ann_nprobe)
+
+    def install_ann(self, user_id: str, ann: IVFIndex):
+        """
+        Catch the index up with rows appended while it was being built, then
+        swap it in.
+        """
+        partition = self._partitions[user_id]
+        self._catch_up(partition, ann)
+        partition.ann = ann
+        logger.info(f"Built IVF index for user {user_id}: {ann.size} rows in {ann.nlist} lists.")
+
+    @staticmethod
+    def _catch_up(partition: _Partition, ann: IVFIndex):
+        missing = np.arange(ann.size, len(partition))
+        if len(missing):
+            vectors = partition.rows(missing)
+            for position, vector in zip(missing, vectors):
+                ann.add(int(position), vector)
+
+    def search(self, user_id: str, query: Sequence[float], limit: int = 3, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Return up to `limit` (row_id, cosine similarity) pairs for the user.
+        `nprobe` overrides how many IVF lists are scanned when ANN is in use.
+        """
+        partition = self._partitions.get(user_id)
+        if partition is None or len(partition) == 0:
+            return []
+
+        vec = normalize(query)
+        if vec is None or len(vec) != partition.dim:
+            return []
+
+        # Positions follow insertion order, so ranking by position breaks ties
+        # the same way as ranking by row id.
+        ann = partition.ann
+        if self.ann_enabled and ann is not None and len(partition) >= self.ann_min_rows:
+            # Rows not yet bucketed by the IVF index are scanned exactly
+            positions = np.concatenate([ann.probe(vec, nprobe), np.arange(ann.size, len(partition))])
+            scores = partition.rows(positions) @ vec
+        else:
+            scores = partition.scores(vec)
+            positions = np.arange(len(scores))
+
+        if self.exact_source is not None and partition.dtype != "float32":
+            candidates = top_k(scores, positions, limit * self.rerank_factor)
+            positions = np.array([position for position, _ in candidates], dtype=np.int64)
+            scores = self.exact_source(user_id, positions) @ vec
+
+        hits = top_k(scores, positions, limit)
+        ids = partition.ids_at(np.array([position for position, _ in hits], dtype=np.int64))
+        return [(int(row_id), s) for row_id, (_, s) in zip(ids, hits)]
@@ -1,9 +1,14 @@
+import json
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 
 class BaseSkill(ABC):
     name: str = "base_skill"
     description: str = "Base class for skills"
+    # JSON schema of the params `execute` accepts
+    parameters: Dict[str, Any] = {"type": "object", "properties": {}}
+    # Seconds a result is reused for the same cache key; 0 never caches
+    cache_ttl: float = 0
     
     @abstractmethod
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -12,6 +17,22 @@ class BaseSkill(ABC):
         """
         pass
 
+    def cache_key(self, params: Dict[str, Any]) -> Optional[str]:
+        """
+        Identifies params that produce the same result; None bypasses the cache.
+        """
+        return json.dumps(params, sort_keys=True, default=str)
+
+    async def run(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the skill, through the shared result cache if it opts in.
+        """
+        from backend.config.settings import settings
+        if self.cache_ttl <= 0 or not settings.SKILL_CACHE_ENABLED:
+            return await self.execute(params)
+        from backend.skills.cache import get_skill_cache
+        return await get_skill_cache().run(self, params)
+
     @property
     def definition(self) -> Dict[str, Any]:
         """
@@ -19,5 +40,6 @@ class BaseSkill(ABC):
         """
         return {
             "name": self.name,
-            "description": self.description
+            "description": self.description,
+            "parameters": self.parameters
         }
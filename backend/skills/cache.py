@@ -0,0 +1,104 @@
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from backend.config.settings import settings
+
+
+class SkillResultCache:
+    """
+    Results of skills that opt in with a `cache_ttl`, keyed by skill name
+    and the skill's `cache_key(params)`. Entries expire after the skill's
+    TTL and the least recently used are evicted beyond `max_entries`.
+    Identical calls already in flight are coalesced onto one execution.
+    Only successful results are stored.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _count(self, skill_name: str, field: str):
+        stats = self._stats.setdefault(skill_name, {"hits": 0, "coalesced": 0, "misses": 0, "stores": 0})
+        stats[field] += 1
+
+    async def run(self, skill, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        `skill.execute(params)`, served from the cache or an identical
+        call in flight when possible.
+        """
+        cache_key = skill.cache_key(params)
+        if cache_key is None:
+            return await skill.execute(params)
+
+        key = (skill.name, cache_key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, result = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self._count(skill.name, "hits")
+                return copy.deepcopy(result)
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count(skill.name, "coalesced")
+        else:
+            self._count(skill.name, "misses")
+            task = self._inflight[key] = asyncio.create_task(self._execute(skill, params, key))
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # A caller that gives up (e.g. a skill timeout) leaves the call running for the others
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def _execute(self, skill, params: Dict[str, Any], key: Tuple[str, str]) -> Dict[str, Any]:
+        result = await skill.execute(params)
+        if isinstance(result, dict) and result.get("status") == "success":
+            self._entries[key] = (time.monotonic() + skill.cache_ttl, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            self._count(skill.name, "stores")
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def _finished(self, key: Tuple[str, str], task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Waiters re-raise the exception themselves; retrieving it here keeps
+        # asyncio from reporting it when every waiter has already given up
+        if not task.cancelled():
+            task.exception()
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        skills = {}
+        for name, counts in self._stats.items():
+            lookups = counts["hits"] + counts["coalesced"] + counts["misses"]
+            skills[name] = {
+                **counts,
+                "entries": sum(1 for skill_name, _ in self._entries if skill_name == name),
+                "hit_rate": round((counts["hits"] + counts["coalesced"]) / lookups, 3) if lookups else 0.0
+            }
+        return {"entries": len(self._entries), "evictions": self.evictions, "skills": skills}
+
+
+_skill_cache: Optional[SkillResultCache] = None
+
+def get_skill_cache() -> SkillResultCache:
+    """
+    Return the process-wide skill result cache, shared by all users.
+    """
+    global _skill_cache
+    if _skill_cache is None:
+        _skill_cache = SkillResultCache(max_entries=settings.SKILL_CACHE_MAX_ENTRIES)
+    return _skill_cache
@@ -6,6 +6,25 @@ from backend.skills.registry import SkillRegistry
 class CalendarSkill(BaseSkill):
     name = "calendar"
     description = "Manage calendar events."
+    parameters = {
+        "type": "object",
+        "properties": {
+            "action": {
+                "type": "string",
+                "description": "What to do with the calendar.",
+                "enum": ["view", "add", "delete"],
+                "default": "view"
+            },
+            "title": {
+                "type": "string",
+                "description": "Title of the event to add or delete."
+            },
+            "time": {
+                "type": "string",
+                "description": "Date and time of the event in natural language (e.g., 'tomorrow at 3pm')."
+            }
+        }
+    }
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         action = params.get("action", "view") # view, add, delete
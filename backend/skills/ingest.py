@@ -1,7 +1,8 @@
-import httpx
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Tuple
 from backend.skills.base import BaseSkill
-from backend.memory.long_term import LongTermMemory
+from backend.memory.long_term import get_long_term_memory
+from backend.utils.chunking import chunk_stream, detect_format
+from backend.utils.http import get_http_client
 
 class IngestSkill(BaseSkill):
     name = "ingest"
@@ -25,6 +26,11 @@ class IngestSkill(BaseSkill):
                 "type": "integer",
                 "description": "Number of characters per chunk.",
                 "default": 500
+            },
+            "chunk_overlap": {
+                "type": "integer",
+                "description": "Number of characters repeated between consecutive chunks.",
+                "default": 50
             }
         },
         "oneOf": [
@@ -35,7 +41,7 @@ class IngestSkill(BaseSkill):
     }
 
     def __init__(self):
-        self.long_term_memory = LongTermMemory()
+        self.long_term_memory = get_long_term_memory()
         self.presets = {
             "prompts": "https://raw.githubusercontent.com/f/awesome-chatgpt-prompts/main/prompts.csv",
             "linux": "https://raw.githubusercontent.com/tldr-pages/tldr/main/pages/linux/ls.md", # Example
@@ -54,37 +60,46 @@ class IngestSkill(BaseSkill):
              url = self.presets[url.lower()]
             
         chunk_size = params.get("chunk_size", 500)
+        overlap = params.get("chunk_overlap", 50)
         user_id = "1" # Default user
 
-        content = ""
-        source = "direct_text"
-
         if url:
             source = url
             try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(url, follow_redirects=True)
+                async with get_http_client().stream("GET", url, follow_redirects=True) as response:
                     response.raise_for_status()
-                    content = response.text
+                    fmt = detect_format(url, response.headers.get("content-type"))
+                    # Chunks are embedded while the body is still downloading
+                    stats = await self.long_term_memory.save_stream(
+                        user_id, self._items(response.aiter_text(), fmt, chunk_size, overlap, source)
+                    )
             except Exception as e:
                 return {"error": f"Failed to fetch URL: {e}"}
         elif text:
-            content = text
+            source = "direct_text"
+            stats = await self.long_term_memory.save_stream(
+                user_id, self._items(self._single(text), "text", chunk_size, overlap, source)
+            )
         else:
             return {"error": "No URL or text provided."}
 
-        # Simple chunking strategy
-        chunks = [content[i:i+chunk_size] for i in range(0, len(content), chunk_size)]
-        
-        count = 0
-        for chunk in chunks:
-            if not chunk.strip():
-                continue
-            await self.long_term_memory.save(user_id, chunk, {"source": source, "type": "ingested"})
-            count += 1
+        count = stats["saved"]
+
+        message = f"Successfully ingested {count} chunks from {source} ({stats['chunks_per_sec']} chunks/sec)."
+        if stats["failed"]:
+            message += f" {stats['failed']} chunks could not be embedded and were skipped."
 
         return {
             "status": "success",
-            "message": f"Successfully ingested {count} chunks from {source}.",
-            "data": {"chunks_count": count, "source": source}
+            "message": message,
+            "data": {"chunks_count": count, "source": source, **stats}
         }
+
+    async def _items(self, pieces: AsyncIterator[str], fmt: str, chunk_size: int, overlap: int, source: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        async for chunk in chunk_stream(pieces, fmt, chunk_size, overlap):
+            if chunk.strip():
+                yield chunk, {"source": source, "type": "ingested", "format": fmt}
+
+    @staticmethod
+    async def _single(text: str) -> AsyncIterator[str]:
+        yield text
@@ -1,6 +1,6 @@
 from typing import Dict, Any
 from backend.skills.base import BaseSkill
-from backend.memory.long_term import LongTermMemory
+from backend.memory.long_term import get_long_term_memory
 
 class LearnSkill(BaseSkill):
     name = "learn"
@@ -22,7 +22,7 @@ class LearnSkill(BaseSkill):
     }
 
     def __init__(self):
-        self.long_term_memory = LongTermMemory()
+        self.long_term_memory = get_long_term_memory()
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         fact = params.get("fact")
@@ -6,6 +6,17 @@ from backend.skills.registry import SkillRegistry
 class MediaSkill(BaseSkill):
     name = "media"
     description = "Control media playback."
+    parameters = {
+        "type": "object",
+        "properties": {
+            "command": {
+                "type": "string",
+                "description": "Playback command.",
+                "enum": ["play", "pause", "next", "previous"]
+            }
+        },
+        "required": ["command"]
+    }
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         command = params.get("command") # play, pause, next, previous
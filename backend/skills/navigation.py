@@ -6,6 +6,16 @@ from backend.skills.registry import SkillRegistry
 class NavigationSkill(BaseSkill):
     name = "navigation"
     description = "Navigate to a destination."
+    parameters = {
+        "type": "object",
+        "properties": {
+            "destination": {
+                "type": "string",
+                "description": "Address or place to navigate to."
+            }
+        },
+        "required": ["destination"]
+    }
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         destination = params.get("destination")
@@ -6,6 +6,16 @@ from backend.skills.registry import SkillRegistry
 class PhoneSkill(BaseSkill):
     name = "call"
     description = "Initiate a phone call to a contact or number."
+    parameters = {
+        "type": "object",
+        "properties": {
+            "target": {
+                "type": "string",
+                "description": "Contact name or phone number to call."
+            }
+        },
+        "required": ["target"]
+    }
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         target = params.get("target")
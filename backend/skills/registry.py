@@ -1,6 +1,14 @@
-from typing import Dict, Type, List
+import copy
+from typing import Any, Dict, Type, List
 from backend.skills.base import BaseSkill
 from backend.utils.logger import logger
+
+# Added to every tool schema; split back out of the params by ActionRouter
+CONFIRMATION_PARAMETER = {
+    "type": "boolean",
+    "description": "True if the user should confirm before the action is carried out."
+}
+
 class SkillRegistry:
     _skills: Dict[str, BaseSkill] = {}
 
@@ -48,3 +56,19 @@ class SkillRegistry:
     @classmethod
     def get_skill_names(cls) -> List[str]:
         return [s.name for s in cls._skills.values()]
+
+    @classmethod
+    def get_tools(cls, names: List[str] = None) -> List[Dict[str, Any]]:
+        """
+        Definitions of the named skills (all by default) for native tool
+        calling: name, description and JSON-schema parameters.
+        """
+        tools = []
+        for name in cls.get_skill_names() if names is None else names:
+            skill = cls._skills.get(name)
+            if skill is None:
+                continue
+            definition = copy.deepcopy(skill.definition)
+            definition["parameters"].setdefault("properties", {})["needs_confirmation"] = CONFIRMATION_PARAMETER
+            tools.append(definition)
+        return tools
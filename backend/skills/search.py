@@ -1,4 +1,5 @@
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, Optional
 from backend.skills.base import BaseSkill
 from backend.skills.registry import SkillRegistry
 from googlesearch import search
@@ -7,12 +8,28 @@ from googlesearch import search
 class SearchSkill(BaseSkill):
     name = "search"
     description = "Search the web for information using Google."
+    parameters = {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "The search query."
+            }
+        },
+        "required": ["query"]
+    }
+    cache_ttl = 300
+
+    def cache_key(self, params: Dict[str, Any]) -> Optional[str]:
+        query = " ".join(str(params.get("query") or "").lower().split())
+        return query or None
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         query = params.get("query")
         try:
-            # Perform search, get top 3 results
-            results = list(search(query, num_results=3, advanced=True))
+            # Perform search, get top 3 results; the client blocks, so it
+            # runs in a worker thread to keep the event loop free
+            results = await asyncio.to_thread(lambda: list(search(query, num_results=3, advanced=True)))
             formatted_results = []
             for res in results:
                 formatted_results.append(f"Title: {res.title}\nURL: {res.url}\nDescription: {res.description}")
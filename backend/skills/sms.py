@@ -6,6 +6,20 @@ from backend.skills.registry import SkillRegistry
 class SMSSkill(BaseSkill):
     name = "sms"
     description = "Send an SMS message."
+    parameters = {
+        "type": "object",
+        "properties": {
+            "target": {
+                "type": "string",
+                "description": "Contact name or phone number to text."
+            },
+            "message": {
+                "type": "string",
+                "description": "The text of the message."
+            }
+        },
+        "required": ["target", "message"]
+    }
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         target = params.get("target")
@@ -6,6 +6,20 @@ from backend.skills.registry import SkillRegistry
 class SystemSkill(BaseSkill):
     name = "system"
     description = "System level controls (volume, brightness, etc)."
+    parameters = {
+        "type": "object",
+        "properties": {
+            "setting": {
+                "type": "string",
+                "description": "The setting to change (e.g., 'volume', 'brightness')."
+            },
+            "value": {
+                "type": "string",
+                "description": "The new value (e.g., '50%', 'up', 'off')."
+            }
+        },
+        "required": ["setting", "value"]
+    }
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         setting = params.get("setting")
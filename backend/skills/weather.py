@@ -1,6 +1,6 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from backend.skills.base import BaseSkill
-import requests
+from backend.utils.http import get_http_client
 
 class WeatherSkill(BaseSkill):
     name = "weather"
@@ -15,6 +15,12 @@ class WeatherSkill(BaseSkill):
         },
         "required": ["location"]
     }
+    # Conditions change slowly, so repeated lookups (from any user) reuse the result
+    cache_ttl = 600
+
+    def cache_key(self, params: Dict[str, Any]) -> Optional[str]:
+        location = " ".join(str(params.get("location") or "").lower().split())
+        return location or None
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         location = params.get("location", "")
@@ -25,7 +31,7 @@ class WeatherSkill(BaseSkill):
         try:
             # Using wttr.in for simple weather data (no API key needed)
             url = f"https://wttr.in/{location}?format=%C+%t+%h+%w"
-            response = requests.get(url, timeout=5)
+            response = await get_http_client().get(url, timeout=5.0)
             
             if response.status_code == 200:
                 weather_data = response.text.strip()
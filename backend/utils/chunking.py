@@ -0,0 +1,216 @@
+import re
+from typing import AsyncIterable, AsyncIterator, Iterator, List, Optional
+
+HEADING_PATTERN = re.compile(r"^#{1,6}\s")
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+MAX_LINE = 65536
+
+
+async def iter_lines(pieces: AsyncIterable[str]) -> AsyncIterator[str]:
+    """
+    Re-split arbitrary text pieces (e.g. HTTP body chunks) into lines,
+    keeping only the current partial line in memory. Lines longer than
+    MAX_LINE are cut so a file without newlines can't grow the buffer.
+    """
+    buffer = ""
+    async for piece in pieces:
+        buffer += piece
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        while len(buffer) > MAX_LINE:
+            yield buffer[:MAX_LINE]
+            buffer = buffer[MAX_LINE:]
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+class _Packer:
+    """
+    Packs structural units into chunks of at most `chunk_size` characters.
+    Units are never split unless a single unit is larger than a chunk, in
+    which case it is cut on whitespace. Up to `overlap` characters of
+    trailing units are repeated at the start of the next chunk.
+    """
+
+    def __init__(self, chunk_size: int, overlap: int = 0, separator: str = "\n"):
+        self.chunk_size = max(1, chunk_size)
+        self.overlap = max(0, min(overlap, self.chunk_size // 2))
+        self.separator = separator
+        self.units: List[str] = []
+        self.length = 0
+        self.fresh = 0
+        self.prefix = ""
+
+    def _size_with(self, unit: str) -> int:
+        if not self.units:
+            return len(unit)
+        return self.length + len(self.separator) + len(unit)
+
+    def add(self, unit: str) -> Iterator[str]:
+        budget = self.chunk_size - (len(self.prefix) + len(self.separator) if self.prefix else 0)
+        for piece in _split_oversized(unit, max(1, budget)):
+            if self.units and self._size_with(piece) > budget and self.fresh:
+                yield from self._emit(keep_overlap=True)
+            if self.units and self._size_with(piece) > budget:
+                # The carried overlap doesn't fit next to this unit; drop it
+                self.units, self.length = [], 0
+            self.length = self._size_with(piece)
+            self.units.append(piece)
+            self.fresh += 1
+
+    def flush(self) -> Iterator[str]:
+        """
+        Emit what is buffered and start the next chunk from scratch.
+        """
+        yield from self._emit(keep_overlap=False)
+
+    def _emit(self, keep_overlap: bool) -> Iterator[str]:
+        if self.fresh:
+            body = self.separator.join(self.units)
+            if body.strip():
+                yield f"{self.prefix}{self.separator}{body}" if self.prefix else body
+
+        carried: List[str] = []
+        if keep_overlap and self.overlap:
+            size = 0
+            for unit in reversed(self.units):
+                size += len(unit) + len(self.separator)
+                if size > self.overlap:
+                    break
+                carried.insert(0, unit)
+        self.units = carried
+        self.length = len(self.separator.join(carried))
+        self.fresh = 0
+
+
+def _split_oversized(unit: str, limit: int) -> Iterator[str]:
+    while len(unit) > limit:
+        cut = unit.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        yield unit[:cut].rstrip()
+        unit = unit[cut:].lstrip()
+    if unit:
+        yield unit
+
+
+async def chunk_text(lines: AsyncIterable[str], chunk_size: int, overlap: int = 0) -> AsyncIterator[str]:
+    """
+    Plain text: units are paragraphs separated by blank lines.
+    """
+    packer = _Packer(chunk_size, overlap, separator="\n\n")
+    paragraph: List[str] = []
+    async for line in lines:
+        if line.strip():
+            paragraph.append(line)
+            continue
+        if paragraph:
+            for chunk in packer.add("\n".join(paragraph)):
+                yield chunk
+            paragraph = []
+    if paragraph:
+        for chunk in packer.add("\n".join(paragraph)):
+            yield chunk
+    for chunk in packer.flush():
+        yield chunk
+
+
+async def chunk_csv(lines: AsyncIterable[str], chunk_size: int, overlap: int = 0) -> AsyncIterator[str]:
+    """
+    CSV: units are whole rows (quoted fields may span lines). The header row
+    is repeated at the top of every chunk.
+    """
+    packer = _Packer(chunk_size, overlap)
+    row: List[str] = []
+    quotes = 0
+    async for line in lines:
+        row.append(line)
+        quotes += line.count('"')
+        # An unbalanced quote would otherwise swallow the rest of the file
+        if quotes % 2 and sum(len(part) for part in row) <= chunk_size:
+            continue
+        text = "\n".join(row)
+        row, quotes = [], 0
+        if not text.strip():
+            continue
+        if not packer.prefix:
+            packer.prefix = text
+            continue
+        for chunk in packer.add(text):
+            yield chunk
+    if row:
+        for chunk in packer.add("\n".join(row)):
+            yield chunk
+    for chunk in packer.flush():
+        yield chunk
+
+
+async def chunk_markdown(lines: AsyncIterable[str], chunk_size: int, overlap: int = 0) -> AsyncIterator[str]:
+    """
+    Markdown: a heading starts a new chunk and is repeated on every chunk of
+    its section; sections are packed by paragraph. Code fences are kept
+    together, and `#` lines inside them are not treated as headings.
+    """
+    packer = _Packer(chunk_size, overlap, separator="\n\n")
+    block: List[str] = []
+    in_fence = False
+
+    async for line in lines:
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+            block.append(line)
+            continue
+        if in_fence:
+            block.append(line)
+            # Very long code blocks are handed over in pieces to bound memory
+            if sum(len(part) for part in block) > chunk_size:
+                for chunk in packer.add("\n".join(block)):
+                    yield chunk
+                block = []
+            continue
+
+        if HEADING_PATTERN.match(line):
+            if block:
+                for chunk in packer.add("\n".join(block)):
+                    yield chunk
+                block = []
+            for chunk in packer.flush():
+                yield chunk
+            packer.prefix = line.strip()
+        elif line.strip():
+            block.append(line)
+        elif block:
+            for chunk in packer.add("\n".join(block)):
+                yield chunk
+            block = []
+
+    if block:
+        for chunk in packer.add("\n".join(block)):
+            yield chunk
+    for chunk in packer.flush():
+        yield chunk
+
+
+CHUNKERS = {
+    "text": chunk_text,
+    "csv": chunk_csv,
+    "markdown": chunk_markdown,
+}
+
+
+def detect_format(source: str, content_type: Optional[str] = None) -> str:
+    """
+    Pick a chunker from the URL extension, falling back to the content type.
+    """
+    path = source.lower().split("?", 1)[0]
+    if path.endswith(".csv") or (content_type and "csv" in content_type):
+        return "csv"
+    if path.endswith((".md", ".markdown")) or (content_type and "markdown" in content_type):
+        return "markdown"
+    return "text"
+
+
+async def chunk_stream(pieces: AsyncIterable[str], fmt: str, chunk_size: int, overlap: int = 0) -> AsyncIterator[str]:
+    async for chunk in CHUNKERS.get(fmt, chunk_text)(iter_lines(pieces), chunk_size, overlap):
+        yield chunk
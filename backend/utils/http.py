@@ -0,0 +1,29 @@
+import httpx
+from typing import Optional
+from backend.config.settings import settings
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the application-wide pooled HTTP client. Connections are kept
+    alive between calls, so repeat requests to the same host (Ollama, data
+    sources) skip TCP/TLS setup. Pass per-call timeouts as needed.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
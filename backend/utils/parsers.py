@@ -1,6 +1,6 @@
 import json
 import re
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from backend.utils.logger import logger
 
 def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
@@ -35,3 +35,187 @@ def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
         logger.error(f"Failed to parse JSON via fallback: {e}")
         
     return None
+
+
+def _complete_escapes(raw: str) -> int:
+    """
+    Length of the longest prefix of a JSON string body that does not end
+    inside an escape sequence (or between the halves of a surrogate pair).
+    """
+    i, n = 0, len(raw)
+    while i < n:
+        if raw[i] != "\\":
+            i += 1
+        elif i + 1 >= n:
+            break
+        elif raw[i + 1] != "u":
+            i += 2
+        elif i + 6 > n:
+            break
+        elif raw[i + 2:i + 4].lower() in ("d8", "d9", "da", "db"):
+            if i + 12 > n:
+                break
+            i += 12
+        else:
+            i += 6
+    return i
+
+
+# Where streamed plain text may turn into an action: a brace or a backtick run
+_TEXT_STOP = re.compile(r"\{|`+")
+
+
+class StreamingActionParser:
+    """
+    Incremental parser for LLM replies that are either plain text or an
+    action object like {"message": "...", "action": {...}} (possibly in a
+    ```json fence). Fed chunk by chunk, it returns events as soon as they
+    can be known:
+
+        ("message", text)  - more characters of the spoken message
+        ("action", dict)   - the complete `action` object, which may arrive
+                             before the rest of the reply
+
+    Plain text is streamed as it comes until a "{" or a ``` fence shows up;
+    anything from there on is left for `parse_action` on the full `text`.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.actions: List[Dict[str, Any]] = []
+        self._pos = 0
+        self._mode: Optional[str] = None  # "text", "json" or "rest"
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expecting_key = False
+        self._key: Optional[str] = None
+        self._field: Optional[str] = None
+        self._action_start = -1
+        self._message_start = -1
+        self._message_sent = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.text += chunk
+        events: List[Tuple[str, Any]] = []
+        if self._mode is None and not self._detect():
+            return events
+        if self._mode == "text":
+            self._feed_text(events)
+        elif self._mode == "json":
+            self._feed_json(events)
+        return events
+
+    def _detect(self) -> bool:
+        stripped = self.text.lstrip()
+        if not stripped:
+            return False
+        if stripped.startswith("```"):
+            newline = stripped.find("\n")
+            if newline == -1:
+                return False
+            self._pos = len(self.text) - len(stripped) + newline + 1
+            self._mode = "json"
+        elif stripped.startswith("{"):
+            self._pos = len(self.text) - len(stripped)
+            self._mode = "json"
+        elif stripped[0] == "`" and len(stripped) < 3:
+            return False
+        else:
+            self._pos = len(self.text) - len(stripped)
+            self._mode = "text"
+        return True
+
+    def _feed_text(self, events: List[Tuple[str, Any]]):
+        end, rest = len(self.text), False
+        for match in _TEXT_STOP.finditer(self.text, self._pos):
+            if match.group() == "{" or len(match.group()) >= 3:
+                end, rest = match.start(), True
+                break
+            if match.end() == len(self.text):
+                # Hold back a trailing backtick run until it can't grow into a fence
+                end = match.start()
+                break
+        if end > self._pos:
+            events.append(("message", self.text[self._pos:end]))
+        self._pos = end
+        if rest:
+            self._mode = "rest"
+
+    def _feed_json(self, events: List[Tuple[str, Any]]):
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._end_string(i, events)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._depth == 1 and not self._expecting_key and self._field == "message":
+                    self._message_start = i + 1
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expecting_key = True
+                elif c == "{" and (self._depth, self._field) in ((2, "action"), (3, "actions")):
+                    self._action_start = i
+            elif c in "}]":
+                if c == "}" and self._action_start >= 0 and (self._depth, self._field) in ((2, "action"), (3, "actions")):
+                    self._end_action(i, events)
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pos = len(text)
+                    self._mode = "rest"
+                    return
+            elif self._depth == 1 and c == ":":
+                self._field = self._key
+            elif self._depth == 1 and c == ",":
+                self._expecting_key = True
+                self._field = None
+        self._pos = len(text)
+        if self._in_string and self._message_start >= 0:
+            self._send_message(len(text), events)
+
+    def _end_string(self, i: int, events: List[Tuple[str, Any]]):
+        if self._depth != 1:
+            return
+        if self._expecting_key:
+            try:
+                self._key = json.loads(self.text[self._string_start:i + 1])
+            except json.JSONDecodeError:
+                self._key = None
+            self._expecting_key = False
+        elif self._message_start >= 0:
+            self._send_message(i, events)
+            self._message_start = -1
+
+    def _send_message(self, end: int, events: List[Tuple[str, Any]]):
+        start = self._message_start + self._message_sent
+        raw = self.text[start:end]
+        raw = raw[:_complete_escapes(raw)]
+        if not raw:
+            return
+        try:
+            events.append(("message", json.loads(f'"{raw}"')))
+        except json.JSONDecodeError:
+            return
+        self._message_sent += len(raw)
+
+    def _end_action(self, i: int, events: List[Tuple[str, Any]]):
+        try:
+            action = json.loads(self.text[self._action_start:i + 1])
+        except json.JSONDecodeError:
+            action = None
+        self._action_start = -1
+        if isinstance(action, dict) and action.get("name"):
+            self.actions.append(action)
+            events.append(("action", action))
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Run from a checkout without installing the backend package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings require an API key at import time; tests never call the provider
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
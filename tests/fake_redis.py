@@ -0,0 +1,235 @@
+import asyncio
+import fnmatch
+import time
+from typing import Any, Dict, List, Optional
+
+WRITES = {"SET", "DEL", "EXPIRE", "RPUSH", "LTRIM"}
+
+
+class FakeRedisServer:
+    """
+    Minimal in-process Redis server speaking RESP2 over TCP, for exercising
+    Redis-backed code (real client, real pipelining) without a live service.
+    Supports strings, lists, key expiry and MULTI/EXEC with WATCH — only
+    what the app uses. `commands` counts commands received, by name.
+
+        server = FakeRedisServer()
+        await server.start()
+        client = redis.asyncio.Redis.from_url(server.url)
+        ...
+        await server.stop()
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.data: Dict[bytes, Any] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.commands: Dict[str, int] = {}
+        # Bumped on every write to a key, for WATCH
+        self.versions: Dict[bytes, int] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        queued: Optional[List[List[bytes]]] = None
+        watched: Dict[bytes, int] = {}
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                name = args[0].decode().upper()
+                self.commands[name] = self.commands.get(name, 0) + 1
+
+                if name == "MULTI":
+                    queued = []
+                    reply = "OK"
+                elif name == "EXEC":
+                    if queued is None:
+                        reply = RuntimeError("EXEC without MULTI")
+                    elif any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                        reply = None
+                    else:
+                        reply = [self._execute(command) for command in queued]
+                    queued = None
+                    watched = {}
+                elif name == "DISCARD":
+                    queued = None
+                    watched = {}
+                    reply = "OK"
+                elif name == "WATCH":
+                    watched.update((key, self.versions.get(key, 0)) for key in args[1:])
+                    reply = "OK"
+                elif name == "UNWATCH":
+                    watched = {}
+                    reply = "OK"
+                elif queued is not None:
+                    queued.append(args)
+                    reply = "QUEUED"
+                else:
+                    reply = self._execute(args)
+                writer.write(self._encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _encode(self, value: Any) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, Exception):
+            return f"-ERR {value}\r\n".encode()
+        if isinstance(value, str):
+            return f"+{value}\r\n".encode()
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, bytes):
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        return b"*%d\r\n" % len(value) + b"".join(self._encode(item) for item in value)
+
+    def advance(self, seconds: float):
+        """
+        Bring every key's expiry `seconds` closer, as if that much time passed.
+        """
+        for key in self.expires:
+            self.expires[key] -= seconds
+
+    def _live(self, key: bytes) -> Any:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _list(self, key: bytes, create: bool = False) -> Optional[list]:
+        value = self._live(key)
+        if value is None and create:
+            value = self.data[key] = []
+        if value is not None and not isinstance(value, list):
+            raise TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _execute(self, args: List[bytes]) -> Any:
+        name, args = args[0].decode().upper(), args[1:]
+        handler = getattr(self, f"_cmd_{name.lower()}", None)
+        if handler is None:
+            return RuntimeError(f"unknown command '{name}'")
+        if name in WRITES:
+            for key in args if name == "DEL" else args[:1]:
+                self.versions[key] = self.versions.get(key, 0) + 1
+        try:
+            return handler(*args)
+        except (TypeError, ValueError) as e:
+            return RuntimeError(str(e))
+
+    def _cmd_ping(self, message: bytes = None) -> Any:
+        return message if message is not None else "PONG"
+
+    def _cmd_client(self, *args: bytes) -> str:
+        return "OK"
+
+    def _cmd_select(self, db: bytes) -> str:
+        return "OK"
+
+    def _cmd_flushdb(self, *args: bytes) -> str:
+        self.data.clear()
+        self.expires.clear()
+        return "OK"
+
+    def _cmd_dbsize(self) -> int:
+        return sum(1 for key in list(self.data) if self._live(key) is not None)
+
+    def _cmd_keys(self, pattern: bytes) -> List[bytes]:
+        return [key for key in list(self.data) if self._live(key) is not None and fnmatch.fnmatchcase(key.decode(), pattern.decode())]
+
+    def _cmd_get(self, key: bytes) -> Optional[bytes]:
+        return self._live(key)
+
+    def _cmd_set(self, key: bytes, value: bytes, *options: bytes) -> str:
+        self.data[key] = value
+        self.expires.pop(key, None)
+        options = [option.upper() for option in options]
+        if b"EX" in options:
+            self.expires[key] = time.monotonic() + int(options[options.index(b"EX") + 1])
+        return "OK"
+
+    def _cmd_del(self, *keys: bytes) -> int:
+        removed = 0
+        for key in keys:
+            if self._live(key) is not None:
+                removed += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    def _cmd_exists(self, *keys: bytes) -> int:
+        return sum(1 for key in keys if self._live(key) is not None)
+
+    def _cmd_expire(self, key: bytes, seconds: bytes) -> int:
+        if self._live(key) is None:
+            return 0
+        self.expires[key] = time.monotonic() + int(seconds)
+        return 1
+
+    def _cmd_ttl(self, key: bytes) -> int:
+        if self._live(key) is None:
+            return -2
+        deadline = self.expires.get(key)
+        return -1 if deadline is None else int(round(deadline - time.monotonic()))
+
+    def _cmd_rpush(self, key: bytes, *values: bytes) -> int:
+        items = self._list(key, create=True)
+        items.extend(values)
+        return len(items)
+
+    def _cmd_llen(self, key: bytes) -> int:
+        return len(self._list(key) or [])
+
+    @staticmethod
+    def _range(length: int, start: bytes, stop: bytes) -> slice:
+        start, stop = int(start), int(stop)
+        start = max(0, start + length if start < 0 else start)
+        stop = stop + length if stop < 0 else min(stop, length - 1)
+        if stop < start:
+            return slice(0, 0)
+        return slice(start, stop + 1)
+
+    def _cmd_lrange(self, key: bytes, start: bytes, stop: bytes) -> List[bytes]:
+        items = self._list(key) or []
+        return items[self._range(len(items), start, stop)]
+
+    def _cmd_ltrim(self, key: bytes, start: bytes, stop: bytes) -> str:
+        items = self._list(key)
+        if items is not None:
+            items[:] = items[self._range(len(items), start, stop)]
+            if not items:
+                self._cmd_del(key)
+        return "OK"
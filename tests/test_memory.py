@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import threading
+from typing import Dict, List
+import numpy as np
+import pytest
+from backend.config.settings import settings
+from backend.llm.providers.base import LLMProvider
+from backend.memory.compaction import content_hash, merge_records, near_duplicate_groups
+from backend.memory.extractor import MemoryExtractor
+from backend.memory.long_term import LongTermMemory
+from backend.memory.short_term import SessionStore, ShortTermMemory
+from backend.memory.vector_index import normalize
+
+
+NOTES = [
+    "the quick brown fox jumps over the lazy dog in the park today",
+    "my sister lives in Lisbon and works as a nurse at the hospital",
+    "the quick brown fox jumps over the lazy dog in the park today!",
+    "remind me to water the plants on the balcony every sunday morning",
+    "the quick brown fox jumps over the lazy dog in the park today again",
+]
+
+
+def embedding_of(text: str) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    return np.random.default_rng(seed).standard_normal(8).tolist()
+
+
+async def fake_embedding(self, text: str) -> List[float]:
+    return embedding_of(text)
+
+
+@pytest.fixture
+def memory_factory(monkeypatch, tmp_path):
+    """
+    Open LongTermMemory instances over one temporary store, with embeddings
+    derived from the text instead of fetched from Ollama.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "MEMORY_STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_PATH", str(tmp_path / "embeddings.sqlite3"))
+    monkeypatch.setattr(settings, "MEMORY_DEDUP_THRESHOLD", 0.5)
+    monkeypatch.setattr(settings, "MEMORY_SHARED_INDEX", False)
+    monkeypatch.setattr(LongTermMemory, "_fetch_embedding", fake_embedding)
+    return LongTermMemory
+
+
+def stored_vectors(memory: LongTermMemory, user_id: str) -> Dict[str, np.ndarray]:
+    codes, _, rows = memory.store.vectors(user_id)
+    return {memory.store.get(user_id, int(record_id))["content"]: np.asarray(codes[i]) for i, record_id in enumerate(rows)}
+
+
+def test_near_duplicates_are_grouped_and_merged():
+    groups = near_duplicate_groups(NOTES, threshold=0.5)
+    assert groups == [[0, 2, 4]]
+
+    records = [{"content": NOTES[i], "metadata": {"source": f"chat-{i}"}, "timestamp": i} for i in groups[0]]
+    merged = merge_records(records)
+    assert merged["content"] == NOTES[0]
+    assert merged["metadata"]["source"] == "chat-0"
+    assert merged["metadata"]["merged_from"] == [
+        {"metadata": {"source": "chat-2"}, "timestamp": 2},
+        {"metadata": {"source": "chat-4"}, "timestamp": 4}
+    ]
+
+
+def test_compaction_keeps_vectors_and_retires_merged_content(memory_factory):
+    async def scenario():
+        memory = memory_factory()
+        for note in NOTES:
+            await memory.save("u1", note)
+        report = await memory.compact("u1")
+        assert (report["records_before"], report["records_after"]) == (5, 3)
+        await memory.close()
+
+    asyncio.run(scenario())
+
+    async def reopened():
+        memory = memory_factory()
+        survivors = [NOTES[0], NOTES[1], NOTES[3]]
+        assert [record["content"] for _, record in memory.store.scan("u1")] == survivors
+        vectors = stored_vectors(memory, "u1")
+        for note in survivors:
+            np.testing.assert_allclose(vectors[note], normalize(embedding_of(note)), rtol=1e-6)
+        assert set(memory.store.retired_hashes("u1")) == {content_hash(NOTES[2]), content_hash(NOTES[4])}
+
+        # Merged-away content is still a duplicate after a restart
+        await memory.save("u1", NOTES[4])
+        assert memory.store.count("u1") == 3
+        assert await memory.search("u1", NOTES[3], limit=1) == [NOTES[3]]
+        await memory.close()
+
+    asyncio.run(reopened())
+
+
+def test_saves_during_compaction_are_kept(memory_factory):
+    memory = memory_factory()
+    preparing, release = threading.Event(), threading.Event()
+    prepare = memory._prepare_compaction
+
+    def paused_prepare(user_id: str, upto: int):
+        preparing.set()
+        release.wait(5)
+        return prepare(user_id, upto)
+
+    memory._prepare_compaction = paused_prepare
+    late = ["a note saved while compaction was running", "another note saved while compaction was running"]
+
+    async def scenario():
+        for note in NOTES:
+            await memory.save("u1", note)
+        compaction = asyncio.create_task(memory.compact("u1"))
+        await asyncio.to_thread(preparing.wait, 5)
+
+        # Writes are not held up by the compaction being prepared
+        for note in late:
+            await asyncio.wait_for(memory.save("u1", note), 2)
+        release.set()
+        report = await compaction
+        assert report["records_before"] == 7 and report["records_after"] == 5
+
+        contents = [record["content"] for _, record in memory.store.scan("u1")]
+        assert contents == [NOTES[0], NOTES[1], NOTES[3], *late]
+        vectors = stored_vectors(memory, "u1")
+        for note in late:
+            np.testing.assert_allclose(vectors[note], normalize(embedding_of(note)), rtol=1e-6)
+        assert await memory.search("u1", late[1], limit=1) == [late[1]]
+
+        # Content saved during the compaction still counts as seen
+        await memory.save("u1", late[0])
+        assert memory.store.count("u1") == 5
+        assert await memory.compact_all() == []
+        await memory.close()
+
+    asyncio.run(scenario())
+
+
+class ChattySummarizer(LLMProvider):
+    """
+    Summarizes, while `arriving` turns are appended to the session
+    mid-call.
+    """
+
+    def __init__(self, short_term: ShortTermMemory, session_id: str, arriving: List[str]):
+        self.short_term = short_term
+        self.session_id = session_id
+        self.arriving = arriving
+
+    async def generate_response(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None) -> str:
+        await self.short_term.add_messages(self.session_id, [("user", content) for content in self.arriving])
+        return "summary"
+
+    async def generate_stream(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None):
+        yield await self.generate_response(prompt, system_prompt, history)
+
+
+@pytest.mark.parametrize("arriving, folded", [([], True), (["m6"], True), (["m6", "m7", "m8"], False)])
+def test_summary_fold_never_drops_unsummarized_turns(monkeypatch, arriving, folded):
+    monkeypatch.setattr(settings, "SUMMARY_TRIGGER_MESSAGES", 4)
+    monkeypatch.setattr(settings, "SUMMARY_KEEP_RECENT", 2)
+    short_term = ShortTermMemory(SessionStore(max_messages=8))
+    extractor = MemoryExtractor(ChattySummarizer(short_term, "s1", arriving), short_term)
+
+    async def scenario():
+        await short_term.add_messages("s1", [("user", f"m{i}") for i in range(6)])
+        assert await extractor.summarize_session("s1") == folded
+        return await short_term.get_conversation("s1", limit=20)
+
+    summary, messages = asyncio.run(scenario())
+    contents = [m["content"] for m in messages]
+    if folded:
+        # m0-m3 are in the summary
+        assert (summary, contents) == ("summary", ["m4", "m5", *arriving])
+    else:
+        # The ring buffer dropped m0 during the call, so nothing was folded
+        assert (summary, contents) == (None, ["m1", "m2", "m3", "m4", "m5", *arriving])
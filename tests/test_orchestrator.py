@@ -0,0 +1,187 @@
+import asyncio
+import json
+import sys
+import time
+import types
+from typing import Dict, List
+import httpx
+import pytest
+from backend.db.models.preferences import Preferences
+from backend.db.models.user import User  # noqa: F401 (registers the mapper Preferences refers to)
+from backend.db.models.memory_item import MemoryItem  # noqa: F401
+from backend.llm.orchestrator import Orchestrator
+from backend.llm.providers.base import LLMProvider
+from backend.llm.response_cache import ResponseCache
+from backend.llm.router import ProviderRouter
+from backend.skills.registry import SkillRegistry
+from backend.skills.timer import TimerSkill
+from backend.skills.weather import WeatherSkill
+from backend.config.settings import settings
+
+
+class ScriptedProvider(LLMProvider):
+    """
+    Replies with `replies` in order, repeating the last one.
+    """
+
+    def __init__(self, *replies: str):
+        self.replies = list(replies)
+        self.calls = 0
+
+    async def generate_response(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None) -> str:
+        self.calls += 1
+        return self.replies[min(self.calls, len(self.replies)) - 1]
+
+    async def generate_stream(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None):
+        yield await self.generate_response(prompt, system_prompt, history)
+
+
+def make_orchestrator(provider: LLMProvider) -> Orchestrator:
+    orchestrator = Orchestrator()
+    orchestrator.providers = {"local": provider}
+    orchestrator.router = ProviderRouter({"local": provider}, explore_rate=0.0)
+    orchestrator.response_cache = ResponseCache()
+    return orchestrator
+
+
+def preferences(user_id: int = 1) -> Preferences:
+    return Preferences(user_id=user_id, persona_name="Max", persona_style="witty")
+
+
+@pytest.fixture
+def skills():
+    """
+    Register skills for one test and restore the registry afterwards.
+    """
+    saved = dict(SkillRegistry._skills)
+    yield SkillRegistry.register
+    SkillRegistry._skills.clear()
+    SkillRegistry._skills.update(saved)
+
+
+def ask(orchestrator: Orchestrator, user_input: str, history: List[Dict[str, str]] = None, user_id: int = 1, available_skills: List[str] = None) -> Dict:
+    return asyncio.run(orchestrator.process(user_input, list(history or []), preferences(user_id), [], available_skills or []))
+
+
+def test_cached_replies_are_scoped_to_the_user():
+    provider = ScriptedProvider("Hello!")
+    orchestrator = make_orchestrator(provider)
+    ask(orchestrator, "hi", user_id=1)
+    ask(orchestrator, "hi", user_id=1)
+    assert provider.calls == 1
+    ask(orchestrator, "hi", user_id=2)
+    assert provider.calls == 2
+
+
+def test_replies_are_cached_per_conversation():
+    provider = ScriptedProvider("Yes, it is.")
+    orchestrator = make_orchestrator(provider)
+    history = [{"role": "user", "content": "Is Paris in France?"}, {"role": "assistant", "content": "Yes."}]
+    ask(orchestrator, "and is it big?", history)
+    ask(orchestrator, "and is it big?", history)
+    assert provider.calls == 1
+
+    # A fresh conversation is not served a reply from the middle of one
+    ask(orchestrator, "and is it big?")
+    assert provider.calls == 2
+
+
+def test_replies_with_client_actions_are_cached(skills):
+    skills(TimerSkill())
+    provider = ScriptedProvider(json.dumps({"message": "Timer set.", "action": {"name": "timer", "params": {"duration": "5 minutes"}}}))
+    orchestrator = make_orchestrator(provider)
+    first = ask(orchestrator, "set a timer for 5 minutes", available_skills=["timer"])
+    second = ask(orchestrator, "set a timer for 5 minutes", available_skills=["timer"])
+    # The client sets the timer again from the cached action
+    assert first["action"] == second["action"] == {"name": "timer", "params": {"duration": "5 minutes"}}
+    assert provider.calls == 1
+
+
+def slow_weather(monkeypatch, delay: float):
+    """
+    Serve weather lookups from a mock transport that answers after `delay`.
+    """
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        return httpx.Response(200, text="Sunny +20C")
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr("backend.skills.weather.get_http_client", lambda: client)
+
+
+def blocking_search(monkeypatch, delay: float):
+    """
+    Import the search skill against a stand-in for the blocking googlesearch
+    client that takes `delay` seconds.
+    """
+    def search(query: str, num_results: int = 3, advanced: bool = False):
+        time.sleep(delay)
+        return [types.SimpleNamespace(title="Result", url="https://example.com", description=query)]
+
+    monkeypatch.setitem(sys.modules, "googlesearch", types.SimpleNamespace(search=search))
+    monkeypatch.delitem(sys.modules, "backend.skills.search", raising=False)
+    from backend.skills.search import SearchSkill
+    return SearchSkill()
+
+
+def test_replies_using_server_skills_are_not_cached(monkeypatch, skills):
+    monkeypatch.setattr(settings, "SKILL_CACHE_ENABLED", False)
+    slow_weather(monkeypatch, 0.0)
+    skills(WeatherSkill())
+    provider = ScriptedProvider(json.dumps({"message": "Checking.", "action": {"name": "weather", "params": {"location": "Paris"}}}), "Sunny.")
+    orchestrator = make_orchestrator(provider)
+    for _ in range(2):
+        provider.calls = 0
+        assert ask(orchestrator, "weather in Paris?", available_skills=["weather"])["message"] == "Sunny."
+        assert provider.calls == 2
+    assert len(orchestrator.response_cache) == 0
+
+    async def streamed():
+        return [event async for event in orchestrator.process_stream("weather in Paris?", [], preferences(), [], ["weather"])]
+
+    provider.calls = 0
+    assert asyncio.run(streamed())[-1]["message"] == "Sunny."
+    assert provider.calls == 2
+    assert len(orchestrator.response_cache) == 0
+
+
+def test_slow_server_skills_run_concurrently(monkeypatch, skills):
+    monkeypatch.setattr(settings, "SKILL_CACHE_ENABLED", False)
+    slow_weather(monkeypatch, 0.3)
+    skills(WeatherSkill())
+    skills(blocking_search(monkeypatch, 0.3))
+    provider = ScriptedProvider(
+        json.dumps({"message": "Checking.", "actions": [
+            {"name": "search", "params": {"query": "picnic spots"}},
+            {"name": "weather", "params": {"location": "Paris"}}
+        ]}),
+        "Sunny, and here are some spots."
+    )
+    orchestrator = make_orchestrator(provider)
+
+    started = time.perf_counter()
+    result = ask(orchestrator, "where should we picnic in Paris?", available_skills=["search", "weather"])
+    elapsed = time.perf_counter() - started
+
+    assert result["message"] == "Sunny, and here are some spots."
+    assert provider.calls == 2
+    # About the slower skill's time, not the sum of both
+    assert elapsed < 0.5
+
+
+def test_skill_timeout_fires(monkeypatch):
+    monkeypatch.setattr(settings, "SKILL_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "SKILL_TIMEOUT_SECONDS", 0.1)
+    slow_weather(monkeypatch, 5.0)
+    orchestrator = make_orchestrator(ScriptedProvider("unused"))
+
+    started = time.perf_counter()
+    observation = asyncio.run(orchestrator._observe(WeatherSkill(), {"location": "Paris"}))
+    assert observation == "SYSTEM OBSERVATION (weather): no result, the skill timed out."
+    assert time.perf_counter() - started < 1.0
+
+
+def test_error_shaped_skill_result_becomes_an_observation():
+    orchestrator = make_orchestrator(ScriptedProvider("unused"))
+    observation = asyncio.run(orchestrator._observe(WeatherSkill(), {}))
+    assert observation == "SYSTEM OBSERVATION (weather): No location provided"
@@ -0,0 +1,35 @@
+from typing import Any, List, Tuple
+import pytest
+from backend.utils.parsers import StreamingActionParser
+
+
+def feed_all(chunks: List[str]) -> Tuple[StreamingActionParser, List[Tuple[str, Any]]]:
+    parser = StreamingActionParser()
+    events = [event for chunk in chunks for event in parser.feed(chunk)]
+    return parser, events
+
+
+def spoken(events: List[Tuple[str, Any]]) -> str:
+    return "".join(value for kind, value in events if kind == "message")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1000])
+def test_fence_after_prose_is_not_spoken(chunk_size):
+    reply = 'Sure.\n```json\n{"message": "Sure.", "action": {"name": "timer", "params": {}}}\n```'
+    parser, events = feed_all([reply[i:i + chunk_size] for i in range(0, len(reply), chunk_size)])
+    assert spoken(events) == "Sure.\n"
+    assert parser.text == reply
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+def test_inline_code_is_streamed(chunk_size):
+    reply = "Run `ls` or ``ls -a`` to list files."
+    _, events = feed_all([reply[i:i + chunk_size] for i in range(0, len(reply), chunk_size)])
+    assert spoken(events) == reply
+
+
+def test_trailing_backticks_wait_for_the_next_chunk():
+    parser = StreamingActionParser()
+    assert parser.feed("Try ``") == [("message", "Try ")]
+    assert parser.feed("`") == []
+    assert parser.feed("json\n{") == []
@@ -0,0 +1,117 @@
+import asyncio
+from typing import Dict, List
+from backend.llm.providers.base import LLMProvider
+from backend.llm.router import COMPLETION, STREAM, ProviderRouter
+
+
+class FakeProvider(LLMProvider):
+    """
+    Answers after `reply_delay` seconds, or streams its first chunk after
+    `first_chunk_delay` (and once `gate` is set, if given). Records streams
+    that were closed.
+    """
+
+    def __init__(self, name: str, reply_delay: float = 0.0, first_chunk_delay: float = 0.0, gate: asyncio.Event = None):
+        self.name = name
+        self.reply_delay = reply_delay
+        self.first_chunk_delay = first_chunk_delay
+        self.gate = gate
+        self.closed_streams = 0
+
+    async def generate_response(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None) -> str:
+        await asyncio.sleep(self.reply_delay)
+        return f"{self.name}: {prompt}"
+
+    async def generate_stream(self, prompt: str, system_prompt: str = None, history: List[Dict[str, str]] = None):
+        try:
+            await asyncio.sleep(self.first_chunk_delay)
+            if self.gate is not None:
+                await self.gate.wait()
+            yield f"{self.name}: "
+            yield prompt
+        finally:
+            self.closed_streams += 1
+
+
+def make_router(*providers: FakeProvider, **options) -> ProviderRouter:
+    return ProviderRouter({provider.name: provider for provider in providers}, explore_rate=0.0, **options)
+
+
+def test_modes_are_ranked_by_their_own_window():
+    # "slow" takes longest to finish a reply but is first to start streaming
+    router = make_router(FakeProvider("slow", reply_delay=0.05), FakeProvider("local", reply_delay=0.01, first_chunk_delay=0.03))
+
+    async def scenario():
+        for name in ("slow", "local"):
+            await router.call(name, "hi")
+            await router._open_stream(name, "hi")
+
+    asyncio.run(scenario())
+    assert router.ranked(COMPLETION)[0] == "local"
+    assert router.ranked(STREAM)[0] == "slow"
+    stats = router.stats()["providers"]["slow"]["latency"]
+    assert stats[COMPLETION]["p50_ms"] > stats[STREAM]["p50_ms"]
+
+
+def test_stream_failures_only_penalize_streams():
+    router = make_router(FakeProvider("a"), FakeProvider("local"))
+    for _ in range(5):
+        router.record("a", 0.01, True, COMPLETION)
+        router.record("local", 0.01, True, COMPLETION)
+        router.record("local", 0.01, True, STREAM)
+    router.record("a", 0.01, False, STREAM)
+    router.record("a", 0.01, True, STREAM)
+
+    assert router.health["a"].error_rate(COMPLETION) == 0.0
+    assert router.health["a"].error_rate(STREAM) == 0.5
+    assert router.ranked(STREAM)[0] == "local"
+
+
+def test_hedge_delay_uses_the_mode_window():
+    router = make_router(FakeProvider("a"), FakeProvider("local"), hedge_min_delay=0.0)
+    for _ in range(10):
+        router.record("a", 0.01, True, COMPLETION)
+        router.record("a", 0.2, True, STREAM)
+    assert router.hedge_delay("a", COMPLETION) == 0.01
+    assert router.hedge_delay("a", STREAM) == 0.2
+
+
+def test_losing_stream_opened_in_the_same_round_is_closed():
+    gate = asyncio.Event()
+    primary = FakeProvider("a", gate=gate)
+    backup = FakeProvider("local", gate=gate)
+    router = make_router(primary, backup, hedge_default_delay=0.01, hedge_min_delay=0.0)
+
+    async def release():
+        await asyncio.sleep(0.05)
+        gate.set()
+
+    async def scenario():
+        opener = asyncio.create_task(release())
+        chunks = [chunk async for chunk in router.generate_stream("hi", order=["a", "local"], hedge=True)]
+        await opener
+        # Checked before the loop shuts down and finalizes leftover generators:
+        # the winner closes when exhausted, the loser as soon as it lost
+        assert primary.closed_streams == 1 and backup.closed_streams == 1
+        return chunks
+
+    chunks = asyncio.run(scenario())
+    assert router.hedges == 1
+    assert chunks in (["a: ", "hi"], ["local: ", "hi"])
+
+
+def test_slow_primary_stream_is_closed_when_the_backup_wins():
+    primary = FakeProvider("a", first_chunk_delay=1.0)
+    backup = FakeProvider("local")
+    router = make_router(primary, backup, hedge_default_delay=0.01, hedge_min_delay=0.0)
+    chunks = []
+
+    async def scenario():
+        async for chunk in router.generate_stream("hi", order=["a", "local"], hedge=True):
+            # The primary is cleaned up before the winner's first chunk is yielded
+            assert primary.closed_streams == 1
+            chunks.append(chunk)
+
+    asyncio.run(scenario())
+    assert chunks == ["local: ", "hi"]
+    assert router.hedge_wins == 1
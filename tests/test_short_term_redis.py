@@ -0,0 +1,110 @@
+import asyncio
+import redis.asyncio as redis
+from backend.memory.short_term import RedisShortTermMemory
+from tests.fake_redis import FakeRedisServer
+
+
+def run(scenario, **options):
+    """
+    Run `scenario(memory, server)` against a RedisShortTermMemory backed by
+    a fresh FakeRedisServer.
+    """
+    async def main():
+        server = FakeRedisServer()
+        await server.start()
+        client = redis.Redis.from_url(server.url)
+        try:
+            return await scenario(RedisShortTermMemory(client, **options), server)
+        finally:
+            await client.aclose()
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_append_keeps_order_in_one_round_trip():
+    async def scenario(memory, server):
+        await memory.add_messages("s1", [("user", "hi"), ("assistant", "hello")])
+        await memory.add_message("s1", "user", "how are you?")
+        assert memory.round_trips == 2
+        assert server.commands["RPUSH"] == 2
+        assert await memory.get_history("s1") == [
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "hello"},
+            {"role": "user", "content": "how are you?"}
+        ]
+        assert await memory.get_history("s1", limit=1) == [{"role": "user", "content": "how are you?"}]
+        assert await memory.get_history("s1", limit=0) == []
+        assert await memory.get_history("other") == []
+
+    run(scenario)
+
+
+def test_append_trims_to_max_messages():
+    async def scenario(memory, server):
+        for i in range(5):
+            await memory.add_messages("s1", [("user", f"q{i}"), ("assistant", f"a{i}")])
+        assert await memory.length("s1") == 4
+        assert [m["content"] for m in await memory.get_history("s1", limit=10)] == ["q3", "a3", "q4", "a4"]
+
+    run(scenario, max_messages=4)
+
+
+def test_sessions_expire_after_idle_ttl():
+    async def scenario(memory, server):
+        await memory.add_message("s1", "user", "remember me")
+        await memory.fold("s1", 0, "earlier chat")
+        assert await server_ttl(memory, "s1") == 60
+        assert await server_ttl(memory, "s1:summary") == 60
+
+        # Reading counts as activity and pushes the expiry back
+        server.advance(50)
+        await memory.get_conversation("s1")
+        assert await server_ttl(memory, "s1") == 60
+        assert await server_ttl(memory, "s1:summary") == 60
+
+        server.advance(61)
+        assert await memory.get_conversation("s1") == (None, [])
+        assert await memory.length("s1") == 0
+
+    run(scenario, ttl=60)
+
+
+def test_fold_replaces_oldest_messages_with_summary():
+    async def scenario(memory, server):
+        await memory.add_messages("s1", [("user", f"m{i}") for i in range(6)])
+        await memory.fold("s1", 4, "the user counted to three")
+        summary, messages = await memory.get_conversation("s1", limit=10)
+        assert summary == "the user counted to three"
+        assert [m["content"] for m in messages] == ["m4", "m5"]
+
+        # A later fold replaces the summary rather than appending to it
+        await memory.add_message("s1", "user", "m6")
+        await memory.fold("s1", 2, "the user counted to five")
+        assert await memory.get_conversation("s1") == ("the user counted to five", [{"role": "user", "content": "m6"}])
+
+        await memory.clear("s1")
+        assert await memory.get_conversation("s1") == (None, [])
+
+    run(scenario)
+
+
+def test_fold_checks_the_head_is_unchanged():
+    async def scenario(memory, server):
+        await memory.add_messages("s1", [("user", f"m{i}") for i in range(4)])
+        _, messages = await memory.get_conversation("s1", limit=4)
+
+        # The oldest messages were trimmed after they were read
+        await memory.add_messages("s1", [("user", "m4"), ("user", "m5")])
+        assert not await memory.fold("s1", 2, "stale summary", head=messages[:2])
+        assert await memory.get_conversation("s1", limit=10) == (None, [{"role": "user", "content": f"m{i}"} for i in range(2, 6)])
+
+        _, messages = await memory.get_conversation("s1", limit=4)
+        assert await memory.fold("s1", 2, "the user counted to three", head=messages[:2])
+        assert [m["content"] for m in (await memory.get_conversation("s1"))[1]] == ["m4", "m5"]
+        assert server.commands["WATCH"] == 2
+
+    run(scenario, max_messages=4)
+
+
+async def server_ttl(memory: RedisShortTermMemory, suffix: str) -> int:
+    return await memory.client.ttl(f"{memory.prefix}{suffix}")